@@ -7,9 +7,73 @@ import time
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 
-from file_ops import copy_with_progress, delete_path, write_text, list_files
+from device_inventory import DeviceInventory
+from disk_usage import analyze_usage
+from file_index import FileIndexer
+from file_ops import (
+    ChunkTuner,
+    FileListing,
+    copy_tree,
+    copy_with_progress,
+    delete_path,
+    duplicate_file,
+    invalidate_listing,
+    pack_tree,
+    quick_wipe,
+    sync_tree,
+    write_text,
+)
 from storage_monitor import WmiDriveEventWatcher, get_removable_drives
-from usb_info import list_usb_devices
+from transfer_scheduler import CANCELLED, DONE, RUNNING, TransferScheduler
+from usb_bench import BENCH_TESTS, format_results, load_reports, run_benchmark, save_report
+from tree_diff import TreeviewSync, as_row
+from usb_info import device_cache, get_drive_usb_device, list_usb_devices
+
+# 新任务优先级：数值越大越先执行
+JOB_PRIORITIES = {"高": 10, "普通": 0, "低": -10}
+
+# 写入策略：定期落盘时进度只按已 fsync 的字节推进，"完成"即可安全拔出
+WRITE_POLICIES = {"缓冲": "buffered", "定期落盘": "periodic", "直写": "write_through"}
+# 达到该大小的文件才记录断点：断点日志要计算 CRC，数据必须经过用户态，小文件走内核零拷贝更快
+RESUME_MIN_BYTES = 512 * 1024 * 1024
+# 定期落盘的间隔：U 盘上 fsync 32 MiB 可能要好几秒，间隔小一些进度条才不会长时间停住
+SYNC_INTERVAL = 4 * 1024 * 1024
+
+JOB_STATUS_TEXT = {
+    "queued": "排队中",
+    "running": "进行中",
+    "done": "完成",
+    "failed": "失败",
+    "cancelled": "已取消",
+}
+
+
+# 文件名搜索最多显示的结果数
+SEARCH_LIMIT = 1000
+
+# 文件列表每页的行数，表格中最多只有这么多行
+FILE_PAGE_SIZE = 500
+
+# USB 表格中"加载中"占位行的 iid，不会与实例 ID 冲突
+USB_LOADING_IID = "__loading__"
+
+
+def _format_size(size_val):
+    if size_val < 1024:
+        return f"{size_val} B"
+    if size_val < 1024 * 1024:
+        return f"{size_val / 1024:.1f} KB"
+    if size_val < 1024 ** 3:
+        return f"{size_val / (1024 * 1024):.1f} MB"
+    return f"{size_val / 1024 ** 3:.2f} GB"
+
+
+def _format_eta(sec):
+    if sec is None:
+        return "--"
+    if sec < 60:
+        return f"{sec:.0f}秒"
+    return f"{sec / 60:.1f}分"
 
 
 class App(tk.Tk):
@@ -22,14 +86,35 @@ class App(tk.Tk):
         # 默认只显示存储设备
         self.only_storage_var = tk.BooleanVar(value=True)
         self.show_hidden_var = tk.BooleanVar(value=True)
+        # 拷贝时边拷边算 SHA-256，结束后绕过缓存回读校验
+        self.verify_copy_var = tk.BooleanVar(value=False)
+        self.write_policy_var = tk.StringVar(value="定期落盘")
 
         self._refresh_timer_id = None
         self._usb_refresh_thread = None
+        # 每个 U 盘一个任务队列，不同 U 盘之间并行
+        self.scheduler = TransferScheduler(default_concurrency=1)
+        # 各 U 盘的文件名索引：插入时在后台建立，拔出时丢弃
+        self.indexer = FileIndexer(
+            on_ready=lambda idx: self.after(
+                0, lambda: self._log(f"文件索引已建立：{idx.root}，{len(idx)} 项，用时 {idx.build_sec:.1f} s")
+            )
+        )
+        # 当前目录的后台流式列表与所在页
+        self._listing = None
+        self._file_page = 0
+        # 持久化的设备清单：启动时先显示上次已知的设备，每次采集完成后写回
+        try:
+            self.inventory = DeviceInventory()
+            device_cache.on_refresh = self.inventory.record
+        except Exception:
+            self.inventory = None
 
         self._build_ui()
         self._refresh_user()
 
-        # 初始刷新
+        # 初始刷新：先显示上次记录的设备，再在后台重新采集，只更新有变化的行
+        self._show_inventory()
         self._refresh_usb_devices()
         self._refresh_mounts()
         self._refresh_file_list()
@@ -40,6 +125,8 @@ class App(tk.Tk):
         self.watcher = WmiDriveEventWatcher(on_event=self._on_drive_event_from_worker)
         self.watcher.start()
 
+        self._poll_jobs()
+
         self.protocol("WM_DELETE_WINDOW", self._on_close)
 
     def _on_close(self):
@@ -47,6 +134,7 @@ class App(tk.Tk):
             self.watcher.stop(join_timeout_sec=2.0)
         except Exception:
             pass
+        self.indexer.close()
         self.destroy()
 
     def _build_ui(self):
@@ -57,7 +145,9 @@ class App(tk.Tk):
         self.user_label = ttk.Label(top, text="(unknown)")
         self.user_label.pack(side="left")
 
-        self.btn_refresh_usb = ttk.Button(top, text="刷新USB设备", command=self._refresh_usb_devices)
+        self.btn_refresh_usb = ttk.Button(
+            top, text="刷新USB设备", command=lambda: self._refresh_usb_devices(force=True)
+        )
         self.btn_refresh_usb.pack(side="right")
         ttk.Button(top, text="刷新U盘列表", command=self._refresh_mounts).pack(side="right", padx=(0, 8))
 
@@ -71,6 +161,7 @@ class App(tk.Tk):
         header = ttk.Frame(left)
         header.pack(fill="x")
         ttk.Label(header, text="USB 设备列表").pack(side="left")
+        ttk.Button(header, text="设备历史", command=self._show_device_history).pack(side="left", padx=(8, 0))
 
         ttk.Checkbutton(
             header,
@@ -99,6 +190,7 @@ class App(tk.Tk):
         # 添加滚动条给左侧列表
         usb_scroll = ttk.Scrollbar(left, orient="vertical", command=self.usb_tree.yview)
         self.usb_tree.configure(yscrollcommand=usb_scroll.set)
+        self.usb_sync = TreeviewSync(self.usb_tree)
         usb_scroll.pack(side="right", fill="y")
         self.usb_tree.pack(side="left", fill="both", expand=True, pady=(4, 8))
 
@@ -130,6 +222,8 @@ class App(tk.Tk):
         self.file_tree.column('modified', width=130)
         self.file_tree.column('hidden', width=40, anchor="center")
 
+        self.file_sync = TreeviewSync(self.file_tree)
+
         tree_scroll = ttk.Scrollbar(file_list_frame, orient='vertical', command=self.file_tree.yview)
         self.file_tree.configure(yscrollcommand=tree_scroll.set)
         tree_scroll.pack(side='right', fill='y')
@@ -138,38 +232,104 @@ class App(tk.Tk):
         file_controls = ttk.Frame(file_list_frame)
         file_controls.pack(fill='x', padx=5, pady=5)
 
-        ttk.Button(file_controls, text="刷新列表", command=self._refresh_file_list).pack(side='left', padx=2)
+        ttk.Button(file_controls, text="刷新列表", command=lambda: self._refresh_file_list(force=True)).pack(side='left', padx=2)
         ttk.Checkbutton(
             file_controls,
             text='显示隐藏文件',
             variable=self.show_hidden_var,
             command=self._refresh_file_list
         ).pack(side='left', padx=10)
-
-        # 2. 进度条区域
-        progress_frame = ttk.LabelFrame(right, text="文件传输进度")
-        progress_frame.pack(fill="x", pady=(0, 8))
-
-        self.progress_var = tk.DoubleVar()
-        self.progress_bar = ttk.Progressbar(
-            progress_frame,
-            variable=self.progress_var,
-            maximum=100,
-            mode='determinate'
+        ttk.Button(file_controls, text="空间分析", command=self._show_disk_usage).pack(side='left', padx=2)
+        self.btn_next_page = ttk.Button(file_controls, text="下一页", width=6, command=lambda: self._goto_file_page(1))
+        self.btn_next_page.pack(side='right', padx=2)
+        self.btn_prev_page = ttk.Button(file_controls, text="上一页", width=6, command=lambda: self._goto_file_page(-1))
+        self.btn_prev_page.pack(side='right', padx=2)
+        self.file_page_label = ttk.Label(file_controls, text="")
+        self.file_page_label.pack(side='right', padx=6)
+
+        search_row = ttk.Frame(file_list_frame)
+        search_row.pack(fill='x', padx=5, pady=(0, 5))
+        ttk.Label(search_row, text="查找文件名：").pack(side='left')
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_row, textvariable=self.search_var)
+        search_entry.pack(side='left', fill='x', expand=True, padx=4)
+        search_entry.bind("<Return>", lambda _e: self._search_files())
+        ttk.Button(search_row, text="搜索", command=self._search_files).pack(side='left', padx=2)
+
+        # 2. 传输队列区域
+        queue_frame = ttk.LabelFrame(right, text="传输队列")
+        queue_frame.pack(fill="x", pady=(0, 8))
+
+        job_cols = ("id", "device", "title", "status", "progress", "speed", "remaining")
+        self.job_tree = ttk.Treeview(queue_frame, columns=job_cols, show="headings", height=5)
+        job_headings = {
+            "id": "#",
+            "device": "盘符",
+            "title": "任务",
+            "status": "状态",
+            "progress": "进度",
+            "speed": "速率",
+            "remaining": "剩余",
+        }
+        for c in job_cols:
+            self.job_tree.heading(c, text=job_headings[c])
+            width = 200 if c == "title" else (40 if c == "id" else 70)
+            self.job_tree.column(c, width=width, anchor="w")
+        self.job_tree.pack(fill="x", padx=10, pady=(8, 4))
+
+        queue_controls = ttk.Frame(queue_frame)
+        queue_controls.pack(fill="x", padx=10, pady=(0, 8))
+
+        ttk.Label(queue_controls, text="新任务优先级：").pack(side="left")
+        self.priority_combo = ttk.Combobox(
+            queue_controls, values=list(JOB_PRIORITIES), state="readonly", width=5
         )
-        self.progress_bar.pack(fill='x', padx=10, pady=(10, 5))
-
-        progress_info_frame = ttk.Frame(progress_frame)
-        progress_info_frame.pack(fill='x', padx=10, pady=(0, 10))
-
-        self.progress_text = ttk.Label(progress_info_frame, text="等待操作...")
-        self.progress_text.pack(side='left')
-
-        self.speed_label = ttk.Label(progress_info_frame, text="")
-        self.speed_label.pack(side='left', padx=(10, 0))
+        self.priority_combo.set("普通")
+        self.priority_combo.pack(side="left")
+
+        ttk.Label(queue_controls, text="每盘并发：").pack(side="left", padx=(10, 0))
+        self.concurrency_var = tk.IntVar(value=1)
+        ttk.Spinbox(
+            queue_controls,
+            from_=1,
+            to=4,
+            width=3,
+            textvariable=self.concurrency_var,
+            command=self._apply_concurrency,
+        ).pack(side="left")
+
+        ttk.Button(queue_controls, text="清除已完成", command=self._clear_finished_jobs).pack(side="right")
+        ttk.Button(queue_controls, text="取消并丢弃", command=lambda: self._cancel_selected_jobs(discard=True)).pack(
+            side="right", padx=(0, 8)
+        )
+        ttk.Button(queue_controls, text="取消所选", command=self._cancel_selected_jobs).pack(side="right", padx=(0, 8))
+        ttk.Button(queue_controls, text="继续", command=self._resume_selected_jobs).pack(side="right", padx=(0, 8))
+        ttk.Button(queue_controls, text="暂停", command=self._pause_selected_jobs).pack(side="right", padx=(0, 8))
+
+        # 限速 (MB/s)，0 表示不限；运行中修改立即生效
+        limit_controls = ttk.Frame(queue_frame)
+        limit_controls.pack(fill="x", padx=10, pady=(0, 8))
+
+        ttk.Label(limit_controls, text="全局限速(MB/s)：").pack(side="left")
+        self.global_rate_var = tk.DoubleVar(value=0)
+        global_rate_spin = ttk.Spinbox(
+            limit_controls,
+            from_=0,
+            to=1000,
+            increment=5,
+            width=6,
+            textvariable=self.global_rate_var,
+            command=self._apply_global_rate,
+        )
+        global_rate_spin.pack(side="left")
+        global_rate_spin.bind("<Return>", lambda e: self._apply_global_rate())
 
-        self.remaining_label = ttk.Label(progress_info_frame, text="")
-        self.remaining_label.pack(side='left', padx=(10, 0))
+        ttk.Label(limit_controls, text="所选任务限速(MB/s)：").pack(side="left", padx=(10, 0))
+        self.job_rate_var = tk.DoubleVar(value=0)
+        ttk.Spinbox(
+            limit_controls, from_=0, to=1000, increment=5, width=6, textvariable=self.job_rate_var
+        ).pack(side="left")
+        ttk.Button(limit_controls, text="应用到所选", command=self._apply_job_rate).pack(side="left", padx=(8, 0))
 
         # 3. 操作区域
         ttk.Label(right, text="U 盘操作").pack(anchor="w")
@@ -198,6 +358,48 @@ class App(tk.Tk):
         copy_frame = ttk.Frame(ops)
         copy_frame.pack(fill="x", padx=8, pady=6)
         ttk.Button(copy_frame, text="选择源文件并拷入U盘…", command=self._copy_file).pack(side="left")
+        ttk.Button(copy_frame, text="选择文件夹并拷入U盘…", command=self._copy_folder).pack(side="left", padx=(8, 0))
+        ttk.Button(copy_frame, text="镜像到多个U盘…", command=self._duplicate_file).pack(side="left", padx=(8, 0))
+        ttk.Checkbutton(copy_frame, text="拷贝后校验(SHA-256)", variable=self.verify_copy_var).pack(side="left", padx=(8, 0))
+        ttk.Label(copy_frame, text="写入策略：").pack(side="left", padx=(8, 0))
+        ttk.Combobox(
+            copy_frame, textvariable=self.write_policy_var, values=list(WRITE_POLICIES), state="readonly", width=8
+        ).pack(side="left")
+
+        # 增量同步
+        sync_frame = ttk.Frame(ops)
+        sync_frame.pack(fill="x", padx=8, pady=6)
+        ttk.Button(sync_frame, text="增量同步文件夹到U盘…", command=self._sync_folder).pack(side="left")
+        self.sync_by_hash_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(sync_frame, text="按内容摘要比较", variable=self.sync_by_hash_var).pack(side="left", padx=(8, 0))
+        # 不依据 U 盘上的同步清单，重新扫描目标目录比较（清单与实际内容可能不一致时使用）
+        self.sync_full_compare_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(sync_frame, text="完整比对", variable=self.sync_full_compare_var).pack(side="left", padx=(8, 0))
+
+        # 小文件打包
+        pack_frame = ttk.Frame(ops)
+        pack_frame.pack(fill="x", padx=8, pady=6)
+        ttk.Button(pack_frame, text="打包文件夹到U盘…", command=self._pack_folder).pack(side="left")
+        self.pack_compress_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(pack_frame, text="压缩(.tar.gz)", variable=self.pack_compress_var).pack(side="left", padx=(8, 0))
+        # 抽样逐个拷贝一部分文件来估算加速比，会额外写入 U 盘，默认关闭
+        self.pack_measure_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(pack_frame, text="估算加速比", variable=self.pack_measure_var).pack(side="left", padx=(8, 0))
+
+        # 测速
+        bench_frame = ttk.Frame(ops)
+        bench_frame.pack(fill="x", padx=8, pady=6)
+        ttk.Button(bench_frame, text="U盘测速", command=self._run_benchmark).pack(side="left")
+        ttk.Label(bench_frame, text="测试文件(MB)：").pack(side="left", padx=(8, 0))
+        self.bench_size_var = tk.StringVar(value="256")
+        ttk.Combobox(
+            bench_frame, textvariable=self.bench_size_var, values=("64", "256", "1024"), width=6, state="readonly"
+        ).pack(side="left")
+        ttk.Label(bench_frame, text="队列深度：").pack(side="left", padx=(8, 0))
+        self.bench_qd_var = tk.StringVar(value="1")
+        ttk.Combobox(
+            bench_frame, textvariable=self.bench_qd_var, values=("1", "4", "8", "32"), width=4, state="readonly"
+        ).pack(side="left")
 
         # 删除
         del_frame = ttk.Frame(ops)
@@ -206,6 +408,7 @@ class App(tk.Tk):
         self.del_rel = ttk.Entry(del_frame)
         self.del_rel.insert(0, "hello.txt")
         self.del_rel.pack(side="left", fill="x", expand=True, padx=(8, 8))
+        ttk.Button(del_frame, text="快速清空U盘", command=self._quick_wipe).pack(side="right", padx=(4, 0))
         ttk.Button(del_frame, text="删除", command=self._delete_path).pack(side="right")
 
         # 日志
@@ -220,54 +423,117 @@ class App(tk.Tk):
     def _refresh_user(self):
         self.user_label.config(text=getpass.getuser())
 
-    def _refresh_usb_devices(self):
+    def _refresh_usb_devices(self, force=False):
         """Start refreshing USB devices in a background thread."""
+        if force:
+            # 手动刷新时丢弃缓存；切换筛选只在缓存上做过滤
+            device_cache.invalidate()
         self.btn_refresh_usb.config(state="disabled")
 
-        # UI feedback
-        for item in self.usb_tree.get_children():
-            self.usb_tree.delete(item)
-        self.usb_tree.insert("", "end", values=("加载中...", "", "", "", "", "", "", ""))
+        # UI feedback：表格已有内容时保留，等结果回来后只更新差异
+        if not self.usb_tree.get_children():
+            self.usb_tree.insert("", "end", iid=USB_LOADING_IID, values=("加载中...", "", "", "", "", "", "", ""))
 
         thread = threading.Thread(target=self._refresh_usb_devices_thread, daemon=True)
         thread.start()
 
     def _refresh_usb_devices_thread(self):
         try:
-            devs = list_usb_devices(only_storage=self.only_storage_var.get())
+            # WMI 先返回时先显示不含总线/地址的部分结果，pnputil 数据到齐后再刷新一次
+            devs = list_usb_devices(
+                only_storage=self.only_storage_var.get(),
+                on_partial=lambda partial: self.after(0, lambda: self._update_usb_tree(partial, final=False)),
+            )
             self.after(0, lambda: self._update_usb_tree(devs))
         except Exception as e:
-            self.after(0, lambda: self._on_usb_refresh_error(str(e)))
-
-    def _update_usb_tree(self, devs):
-        self.btn_refresh_usb.config(state="normal")
-        for item in self.usb_tree.get_children():
-            self.usb_tree.delete(item)
+            msg = str(e)
+            self.after(0, lambda: self._on_usb_refresh_error(msg))
 
+    def _show_inventory(self):
+        if self.inventory is None:
+            return
+        try:
+            devs = self.inventory.load(only_storage=self.only_storage_var.get())
+        except Exception:
+            return
+        if devs:
+            self._update_usb_tree(devs, final=False)
+            self._log(f"已显示上次记录的 {len(devs)} 个设备，正在后台重新检测…")
+
+    def _update_usb_tree(self, devs, final=True):
+        """
+        按 PNP 实例 ID 生成行，由 usb_sync 在空闲时只应用有变化的行
+        """
+        if final:
+            self.btn_refresh_usb.config(state="normal")
+
+        rows = {}
         for d in devs:
-            self.usb_tree.insert(
-                "",
-                "end",
-                values=(
-                    d.get("vendor_id"),
-                    d.get("product_id"),
-                    d.get("manufacturer"),
-                    d.get("product"),
-                    d.get("serial_number"),
-                    d.get("usb_version_bcd"),
-                    d.get("bus"),
-                    d.get("address"),
-                ),
-            )
+            iid = d.get("pnp_device_id") or f"{d.get('vendor_id')}:{d.get('product_id')}:{d.get('serial_number')}"
+            rows[iid] = as_row((
+                d.get("vendor_id"),
+                d.get("product_id"),
+                d.get("manufacturer"),
+                d.get("product"),
+                d.get("serial_number"),
+                d.get("usb_version_bcd"),
+                d.get("bus"),
+                d.get("address"),
+            ))
+        self.usb_sync.update(rows)
+        if not final:
+            return
         filter_status = " (仅存储)" if self.only_storage_var.get() else " (全部)"
-        self._log(f"USB设备刷新完成：{len(devs)} 个设备{filter_status}")
+        st = device_cache.stats()
+        latency = f"，上次采集 {st.last_refresh_sec * 1000:.0f} ms" if st.last_refresh_sec is not None else ""
+        self._log(
+            f"USB设备刷新完成：{len(devs)} 个设备{filter_status}"
+            f"（缓存命中 {st.hits} / 未命中 {st.misses}{latency}）"
+        )
 
     def _on_usb_refresh_error(self, error_msg):
         self.btn_refresh_usb.config(state="normal")
-        for item in self.usb_tree.get_children():
-            self.usb_tree.delete(item)
+        if self.usb_tree.exists(USB_LOADING_IID):
+            self.usb_tree.delete(USB_LOADING_IID)
         self._log(f"USB设备刷新失败：{error_msg}")
 
+    def _show_device_history(self):
+        if self.inventory is None:
+            messagebox.showinfo("设备历史", "设备清单不可用。", parent=self)
+            return
+        win = tk.Toplevel(self)
+        win.title("设备历史（按序列号）")
+        win.geometry("760x320")
+        cols = ("serial", "vidpid", "product", "first", "last", "count", "state")
+        headings = {
+            "serial": "序列号",
+            "vidpid": "VID:PID",
+            "product": "产品",
+            "first": "首次出现",
+            "last": "最近出现",
+            "count": "接入次数",
+            "state": "状态",
+        }
+        tree = ttk.Treeview(win, columns=cols, show="headings")
+        for c in cols:
+            tree.heading(c, text=headings[c])
+            tree.column(c, width=140 if c in ("serial", "product", "first", "last") else 70, anchor="w")
+        tree.pack(fill="both", expand=True, padx=10, pady=10)
+
+        def fmt(ts):
+            return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+        for h in self.inventory.history():
+            tree.insert("", "end", values=(
+                h.serial,
+                f"{h.vendor_id}:{h.product_id}",
+                h.product or "",
+                fmt(h.first_seen),
+                fmt(h.last_seen),
+                h.connections,
+                "已连接" if h.connected else "未连接",
+            ))
+
     def _refresh_mounts(self):
         drives = get_removable_drives()
         values = [d + "\\" for d in drives]
@@ -280,47 +546,222 @@ class App(tk.Tk):
         else:
             self.selected_usb_mount.set("")
 
+        self.indexer.sync(values)
+
         self._log(f"U盘盘符刷新完成：{len(values)} 个")
         # 刷新文件列表
         self._refresh_file_list()
 
-    def _refresh_file_list(self, event=None):
-        """刷新文件列表"""
-        for item in self.file_tree.get_children():
-            self.file_tree.delete(item)
-
+    def _refresh_file_list(self, event=None, force=False):
+        """
+        在后台线程中流式列出当前盘符，首批条目到达即显示首页；
+        表格只保存当前页，按路径对比只更新有变化的行
+        """
         mount = self.selected_usb_mount.get()
+        if force and mount:
+            # 手动刷新时丢弃列表缓存，以便看到其它程序做的修改
+            invalidate_listing(mount)
+        previous = self._listing
+        if previous is not None:
+            previous.cancel()
+            if previous.path != mount:
+                self._file_page = 0
         if not mount or not os.path.isdir(mount):
+            self._listing = None
+            self.file_sync.update({})
+            self.file_page_label.config(text="")
             return
 
-        try:
-            files = list_files(mount, self.show_hidden_var.get())
-            for f in files:
-                f_type = '文件夹' if f['is_dir'] else '文件'
-
-                # 转换大小显示
-                size_val = f['size']
-                if not f['is_dir']:
-                    if size_val < 1024:
-                        size_str = f"{size_val} B"
-                    elif size_val < 1024 * 1024:
-                        size_str = f"{size_val / 1024:.1f} KB"
-                    else:
-                        size_str = f"{size_val / (1024 * 1024):.1f} MB"
-                else:
-                    size_str = ""
+        self._listing = FileListing(
+            mount,
+            self.show_hidden_var.get(),
+            page_size=FILE_PAGE_SIZE,
+            on_update=lambda listing: self.after(0, lambda: self._on_file_listing_update(listing)),
+        ).start()
 
-                f_hidden = '√' if f['is_hidden'] else ''
+    def _on_file_listing_update(self, listing):
+        if listing is not self._listing:
+            return
+        if listing.error:
+            self._log(f"刷新文件列表失败：{listing.error}")
+        if listing.done:
+            self._file_page = min(self._file_page, listing.page_count - 1)
+        self._render_file_page()
+
+    def _goto_file_page(self, step):
+        listing = self._listing
+        if listing is None or not listing.done:
+            return
+        page = min(max(self._file_page + step, 0), listing.page_count - 1)
+        if page != self._file_page:
+            self._file_page = page
+            self._render_file_page()
+            self.file_tree.yview_moveto(0)
 
-                self.file_tree.insert(
-                    '',
-                    'end',
-                    values=(f['name'], size_str, f_type, f['modified'], f_hidden)
-                )
+    def _render_file_page(self):
+        listing = self._listing
+        rows = {}
+        for f in listing.page(self._file_page):
+            f_type = '文件夹' if f.is_dir else '文件'
+
+            # 转换大小显示
+            size_str = "" if f.is_dir else _format_size(f.size)
+
+            f_hidden = '√' if f.is_hidden else ''
+
+            # 只有当前页的条目会格式化时间
+            rows[f.path] = as_row((f.name, size_str, f_type, f.modified, f_hidden))
+        self.file_sync.update(rows)
+
+        if listing.done:
+            text = f"第 {self._file_page + 1}/{listing.page_count} 页，共 {listing.count} 项"
+        else:
+            text = f"已加载 {listing.count} 项…"
+        self.file_page_label.config(text=text)
+        nav = "normal" if listing.done else "disabled"
+        self.btn_prev_page.config(state=nav if self._file_page > 0 else "disabled")
+        self.btn_next_page.config(state=nav if self._file_page < listing.page_count - 1 else "disabled")
+
+    def _show_disk_usage(self):
+        """
+        递归统计当前 U 盘各目录的占用：后台并发扫描，过程中刷新部分合计；
+        双击目录进入下一级。同一卷再次打开时复用缓存，只增量更新本程序改动过的部分
+        """
+        try:
+            mp = self._require_mount()
         except Exception as e:
-            self._log(f"刷新文件列表失败：{e}")
+            messagebox.showerror("错误", str(e), parent=self)
+            return
+
+        win = tk.Toplevel(self)
+        win.title(f"空间分析 - {mp}")
+        win.geometry("640x420")
+        top = ttk.Frame(win)
+        top.pack(fill="x", padx=10, pady=(10, 0))
+        status = ttk.Label(top, text="正在扫描…")
+        status.pack(side="left")
+
+        cols = ("name", "size", "files", "share")
+        tree = ttk.Treeview(win, columns=cols, show="headings")
+        for c, text, width, anchor in (
+                ("name", "名称", 260, "w"),
+                ("size", "大小", 100, "e"),
+                ("files", "文件数", 80, "e"),
+                ("share", "占比", 70, "e"),
+        ):
+            tree.heading(c, text=text)
+            tree.column(c, width=width, anchor=anchor)
+        tree.pack(fill="both", expand=True, padx=10, pady=10)
+        sync = TreeviewSync(tree)
+        state = {"report": None, "cwd": mp, "dirs": set()}
+
+        def render(report):
+            if not win.winfo_exists():
+                return
+            state["report"] = report
+            total_bytes, total_files = report.total(state["cwd"])
+            rows = {}
+            dirs = set()
+            for item in report.items(state["cwd"]):
+                key = item.path if item.is_dir else "__files__:" + item.path
+                share = f"{item.bytes * 100 / total_bytes:.1f}%" if total_bytes else ""
+                name = item.name + ("\\" if item.is_dir else "")
+                rows[key] = as_row((name, _format_size(item.bytes), item.files, share))
+                if item.is_dir:
+                    dirs.add(key)
+            state["dirs"] = dirs
+            sync.update(rows)
+            phase = f"完成，用时 {report.elapsed_sec:.1f} s" if report.done else "扫描中…"
+            status.config(
+                text=f"{state['cwd']}  {_format_size(total_bytes)}，{total_files} 个文件"
+                     f"（已扫描 {report.scanned_dirs} 个目录，{phase}）"
+            )
+
+        def run(rescan=False):
+            status.config(text="正在扫描…")
+
+            def worker():
+                try:
+                    analyze_usage(
+                        mp,
+                        on_progress=lambda r: self.after(0, lambda: render(r)),
+                        rescan=rescan,
+                    )
+                except Exception as e:
+                    msg = f"空间分析失败：{e}"
+                    self.after(0, lambda: self._log(msg))
+
+            threading.Thread(target=worker, daemon=True).start()
+
+        def enter(path):
+            state["cwd"] = path
+            if state["report"] is not None:
+                render(state["report"])
+                tree.yview_moveto(0)
+
+        def on_double_click(event):
+            iid = tree.identify_row(event.y)
+            if iid in state["dirs"]:
+                enter(iid)
+
+        def go_up():
+            cwd = state["cwd"]
+            if os.path.normcase(os.path.abspath(cwd)) != os.path.normcase(os.path.abspath(mp)):
+                enter(os.path.dirname(cwd.rstrip("\\/")))
+
+        tree.bind("<Double-1>", on_double_click)
+        ttk.Button(top, text="重新扫描", command=lambda: run(rescan=True)).pack(side="right")
+        ttk.Button(top, text="上一级", command=go_up).pack(side="right", padx=4)
+        run()
+
+    def _search_files(self):
+        """
+        在所有已插入 U 盘的文件名索引中查找：普通文本按子串匹配，含 * ? 时按通配符匹配
+        """
+        query = self.search_var.get().strip()
+        if not query:
+            return
+        result = self.indexer.search(query, limit=SEARCH_LIMIT)
+
+        win = tk.Toplevel(self)
+        win.title(f"查找：{query}")
+        win.geometry("680x360")
+        more = f"（只显示前 {SEARCH_LIMIT} 项）" if result.truncated else ""
+        pending = f"；{', '.join(result.indexing)} 仍在建立索引，结果可能不全" if result.indexing else ""
+        ttk.Label(
+            win, text=f"找到 {len(result.hits)} 项{more}，用时 {result.elapsed_ms:.1f} ms{pending}"
+        ).pack(anchor="w", padx=10, pady=(10, 0))
+
+        tree = ttk.Treeview(win, columns=("path", "type"), show="headings")
+        tree.heading("path", text="路径")
+        tree.heading("type", text="类型")
+        tree.column("path", width=540)
+        tree.column("type", width=70)
+        scroll = ttk.Scrollbar(win, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scroll.set)
+        scroll.pack(side="right", fill="y", pady=10)
+        tree.pack(fill="both", expand=True, padx=(10, 0), pady=10)
+        for hit in result.hits:
+            full = os.path.join(hit.root, hit.path)
+            tree.insert("", "end", iid=full, values=(full, "文件夹" if hit.is_dir else "文件"))
+
+        def open_location(_event):
+            sel = tree.selection()
+            if sel and os.name == "nt":
+                target = sel[0] if os.path.isdir(sel[0]) else os.path.dirname(sel[0])
+                try:
+                    os.startfile(target)
+                except OSError as e:
+                    self._log(f"打开位置失败：{e}")
+
+        tree.bind("<Double-1>", open_location)
 
     def _on_drive_event_from_worker(self, evt):
+        # 插拔后设备列表已变，立即让缓存失效，随后的刷新会重新采集
+        device_cache.invalidate()
+        invalidate_listing(evt.drive_letter + "\\")
+        if evt.action == "removed":
+            self.indexer.remove(evt.drive_letter + "\\")
         self.after(0, lambda: self._handle_drive_event(evt.action, evt.drive_letter))
 
     def _handle_drive_event(self, action: str, drive_letter: str):
@@ -385,6 +826,32 @@ class App(tk.Tk):
             self._log(f"写入失败：{e}")
             messagebox.showerror("错误", str(e), parent=self)
 
+    def _job_priority(self) -> int:
+        return JOB_PRIORITIES.get(self.priority_combo.get(), 0)
+
+    def _submit_job(self, device, title, fn, on_success):
+        """
+        提交到传输调度器；任务结束后在 UI 线程中处理结果
+        """
+        def on_done(job):
+            self.after(0, lambda: self._on_job_finished(job, on_success))
+
+        job = self.scheduler.submit(device, title, fn, priority=self._job_priority(), on_done=on_done)
+        self._log(f"已加入队列 #{job.job_id}：{title}（{device}）")
+        return job
+
+    def _on_job_finished(self, job, on_success):
+        if job.status == DONE:
+            on_success(job.result)
+        elif job.status == CANCELLED:
+            self._log(f"任务已取消 #{job.job_id}：{job.title}")
+        else:
+            self._log(f"任务失败 #{job.job_id}：{job.title}：{job.error}")
+            messagebox.showerror("错误", f"{job.title} 失败：\n{job.error}", parent=self)
+
+    def _write_policy(self):
+        return WRITE_POLICIES.get(self.write_policy_var.get(), "periodic")
+
     def _copy_file(self):
         try:
             mp = self._require_mount()
@@ -393,105 +860,453 @@ class App(tk.Tk):
             if not src:
                 return
             dst = os.path.join(mp, os.path.basename(src))
+            verify = self.verify_copy_var.get()
+            policy = self._write_policy()
+
+            def run(job):
+                # 按 U 盘型号 (VID:PID) 自动调优块大小
+                tuner = None
+                dev = get_drive_usb_device(mp[:2])
+                if dev and dev.get("vendor_id") and dev.get("product_id"):
+                    tuner = ChunkTuner(f"{dev['vendor_id']}:{dev['product_id']}", dev.get("usb_version_bcd"))
+
+                def on_p(p):
+                    job.check_cancelled()
+                    rem = p.total_bytes - p.bytes_copied
+                    job.update(
+                        progress=p.bytes_copied / max(p.total_bytes, 1),
+                        speed_bps=p.speed_bps,
+                        eta_sec=rem / p.speed_bps if p.speed_bps > 0 else None,
+                    )
+
+                # 大文件记录断点，同一源/目标再次拷贝时从上次落盘的断点继续
+                return copy_with_progress(
+                    src, dst, on_progress=on_p, tuner=tuner, verify=verify,
+                    resume=os.path.getsize(src) >= RESUME_MIN_BYTES,
+                    write_policy=policy, sync_interval=SYNC_INTERVAL, control=job.control,
+                )
 
-            # 初始化UI
-            self.progress_var.set(0)
-            self.progress_text.config(text=f"正在复制: {os.path.basename(src)}")
-            self.speed_label.config(text=" | 速率: -- MB/s")
-            self.remaining_label.config(text=" | 剩余: --")
-            self.progress_bar.config(mode='determinate', style="")
+            def on_success(result):
+                if result.resumed_from:
+                    self._log(f"断点续传：从 {result.resumed_from / (1024 * 1024):.1f} MB 处继续")
+                self._log(f"拷贝完成：{src} -> {dst}（引擎 {result.engine}，块大小 {result.chunk_size // 1024} KB）")
+                if result.digest:
+                    self._log(f"校验通过：{result.hash_algo} = {result.digest}")
+                self._refresh_file_list()
 
-            def worker():
-                try:
-                    start_time = time.time()
-                    last_update_time = start_time
-                    last_copied = 0
+            self._submit_job(mp[:2], f"拷贝 {os.path.basename(src)}", run, on_success)
 
-                    def on_p(p):
-                        nonlocal last_update_time, last_copied
-
-                        current_time = time.time()
-                        pct = int((p.bytes_copied / max(p.total_bytes, 1)) * 100)
-
-                        # 降低刷新频率，避免卡顿
-                        if current_time - last_update_time >= 0.1 or pct >= 100:
-                            # 计算速度
-                            time_diff = max(current_time - last_update_time, 0.001)
-                            bytes_diff = p.bytes_copied - last_copied
-
-                            # 瞬时速度
-                            speed_mbps = (bytes_diff / time_diff) / (1024 * 1024)
-                            # 平均速度（用于计算剩余时间更准）
-                            total_time = current_time - start_time
-                            avg_speed = (p.bytes_copied / total_time) / (1024 * 1024) if total_time > 0 else 0
-
-                            # 估算剩余时间
-                            rem_time_str = "--"
-                            if avg_speed > 0 and pct < 100:
-                                rem_bytes = p.total_bytes - p.bytes_copied
-                                rem_sec = rem_bytes / (avg_speed * 1024 * 1024)
-                                if rem_sec < 60:
-                                    rem_time_str = f"{rem_sec:.0f}秒"
-                                else:
-                                    rem_time_str = f"{rem_sec / 60:.1f}分"
-
-                            # 线程安全更新 UI
-                            self.after(0, lambda: self._update_progress_ui(
-                                pct, speed_mbps, avg_speed, rem_time_str
-                            ))
-
-                            last_update_time = current_time
-                            last_copied = p.bytes_copied
-
-                    copy_with_progress(src, dst, on_progress=on_p)
-
-                    # 成功
-                    self.after(0, lambda: self._copy_complete(src, dst))
+        except Exception as e:
+            self._log(f"拷贝启动失败：{e}")
+            messagebox.showerror("错误", str(e), parent=self)
 
-                except Exception as e:
-                    # 将异常转换为字符串，确保 lambda 绑定的是值而不是引用
-                    err_msg = str(e)
-                    self.after(0, lambda: self._copy_failed(err_msg))
+    def _copy_folder(self):
+        try:
+            mp = self._require_mount()
+            src = filedialog.askdirectory(title="选择要拷入U盘的文件夹", parent=self)
+            if not src:
+                return
+            dst = os.path.join(mp, os.path.basename(os.path.normpath(src)))
+            policy = self._write_policy()
+
+            def run(job):
+                def on_p(p):
+                    job.check_cancelled()
+                    job.update(
+                        progress=p.bytes_done / max(p.bytes_total, 1) if p.bytes_total else 1.0,
+                        speed_bps=p.speed_bps,
+                        eta_sec=p.eta_sec,
+                        detail=f"{p.files_done}/{p.files_total} 个文件",
+                    )
+
+                return copy_tree(
+                    src, dst, on_progress=on_p, write_policy=policy, sync_interval=SYNC_INTERVAL, control=job.control
+                )
 
-            threading.Thread(target=worker, daemon=True).start()
+            def on_success(result):
+                self._log(f"文件夹拷贝完成：{src} -> {dst}（{result.files_copied} 个文件，用时 {result.elapsed_sec:.1f} 秒）")
+                self._refresh_file_list()
+
+            self._submit_job(mp[:2], f"拷贝文件夹 {os.path.basename(dst)}", run, on_success)
 
         except Exception as e:
             self._log(f"拷贝启动失败：{e}")
             messagebox.showerror("错误", str(e), parent=self)
 
-    def _update_progress_ui(self, percent, instant_speed, avg_speed, remaining):
-        self.progress_var.set(percent)
-        self.speed_label.config(text=f" | {instant_speed:.1f} MB/s")
-        self.remaining_label.config(text=f" | 剩余: {remaining}")
+    def _sync_folder(self):
+        try:
+            mp = self._require_mount()
+            src = filedialog.askdirectory(title="选择要同步到U盘的文件夹", parent=self)
+            if not src:
+                return
+            dst = os.path.join(mp, os.path.basename(os.path.normpath(src)))
+            by_hash = self.sync_by_hash_var.get()
+            trust_manifest = not self.sync_full_compare_var.get()
+            policy = self._write_policy()
+            name = os.path.basename(dst)
+
+            def run_dry(job):
+                job.update(detail="比较中")
+                return sync_tree(src, dst, by_hash=by_hash, dry_run=True, trust_manifest=trust_manifest)
+
+            def on_report(report):
+                mb = report.bytes_to_transfer / (1024 * 1024)
+                self._log(
+                    f"同步预览：{len(report.to_copy)} 个文件需传输（{mb:.1f} MB），"
+                    f"{report.unchanged} 个未变化，{len(report.to_delete)} 个多余"
+                )
+                if not report.to_copy and not report.to_delete and not report.dirs_to_create:
+                    self._log(f"同步完成：{dst} 已是最新")
+                    return
+                plan = report.plan
+                if plan is not None and not plan.fits and not report.to_delete:
+                    # 没有可删除的旧文件腾空间，同步注定失败，直接提示
+                    try:
+                        plan.check()
+                    except OSError as e:
+                        self._log(f"同步无法进行：{e}")
+                        messagebox.showerror("空间不足", str(e), parent=self)
+                    return
+                delete_stale = False
+                if report.to_delete:
+                    answer = messagebox.askyesnocancel(
+                        "确认同步",
+                        f"将传输 {len(report.to_copy)} 个文件（{mb:.1f} MB）。\n"
+                        f"U盘上有 {len(report.to_delete)} 个源中已不存在的文件，是否一并删除？",
+                        parent=self,
+                    )
+                    if answer is None:
+                        return
+                    delete_stale = answer
+                elif not messagebox.askyesno(
+                        "确认同步", f"将传输 {len(report.to_copy)} 个文件（{mb:.1f} MB），是否继续？", parent=self
+                ):
+                    return
+
+                def run(job):
+                    def on_p(p):
+                        job.check_cancelled()
+                        job.update(
+                            progress=p.bytes_done / max(p.bytes_total, 1) if p.bytes_total else 1.0,
+                            speed_bps=p.speed_bps,
+                            eta_sec=p.eta_sec,
+                            detail=f"{p.files_done}/{p.files_total} 个文件",
+                        )
+
+                    return sync_tree(
+                        src, dst, by_hash=by_hash, delete_stale=delete_stale, trust_manifest=trust_manifest,
+                        on_progress=on_p, write_policy=policy, sync_interval=SYNC_INTERVAL, control=job.control,
+                    )
+
+                def on_success(result):
+                    self._log(
+                        f"同步完成：{src} -> {dst}（传输 {result.files_copied} 个，"
+                        f"删除 {result.files_deleted} 个，用时 {result.elapsed_sec:.1f} 秒）"
+                    )
+                    self._refresh_file_list()
+
+                self._submit_job(mp[:2], f"同步 {name}", run, on_success)
+
+            self._submit_job(mp[:2], f"同步预览 {name}", run_dry, on_report)
 
-    def _copy_complete(self, src, dst):
-        self.progress_text.config(text="复制完成!")
-        self.progress_var.set(100)
-        self.speed_label.config(text="")
-        self.remaining_label.config(text="")
-        self.progress_bar.config(style="green.Horizontal.TProgressbar")
+        except Exception as e:
+            self._log(f"同步启动失败：{e}")
+            messagebox.showerror("错误", str(e), parent=self)
 
-        self._log(f"拷贝完成：{src} -> {dst}")
-        self._refresh_file_list()
+    def _pack_folder(self):
+        try:
+            mp = self._require_mount()
+            src = filedialog.askdirectory(title="选择要打包到U盘的文件夹", parent=self)
+            if not src:
+                return
+            compress = self.pack_compress_var.get()
+            measure = self.pack_measure_var.get()
+            name = os.path.basename(os.path.normpath(src)) + (".tar.gz" if compress else ".tar")
+            dst = os.path.join(mp, name)
+            policy = self._write_policy()
+
+            def run(job):
+                def on_p(p):
+                    job.check_cancelled()
+                    job.update(
+                        progress=p.bytes_done / max(p.bytes_total, 1) if p.bytes_total else 1.0,
+                        speed_bps=p.speed_bps,
+                        eta_sec=p.eta_sec,
+                        detail=f"{p.files_done}/{p.files_total} 个文件",
+                    )
+
+                return pack_tree(
+                    src, dst, compress=compress, on_progress=on_p, write_policy=policy, control=job.control,
+                    measure_speedup=measure,
+                )
+
+            def on_success(result):
+                mb = result.archive_bytes / (1024 * 1024)
+                self._log(
+                    f"打包完成：{src} -> {dst}（{result.files_packed} 个文件，归档 {mb:.1f} MB，"
+                    f"用时 {result.elapsed_sec:.1f} 秒）"
+                )
+                if result.speedup is not None:
+                    self._log(
+                        f"逐个文件拷贝预计需要 {result.file_copy_sec:.1f} 秒，打包模式加速 {result.speedup:.1f} 倍"
+                    )
+                self._refresh_file_list()
+
+            self._submit_job(mp[:2], f"打包 {name}", run, on_success)
+
+        except Exception as e:
+            self._log(f"打包启动失败：{e}")
+            messagebox.showerror("错误", str(e), parent=self)
+
+    def _ask_drives(self, title):
+        """
+        弹出对话框让用户勾选目标 U 盘，返回盘符列表（如 ["G:", "H:"]），取消时返回空列表
+        """
+        drives = get_removable_drives()
+        if not drives:
+            raise RuntimeError("没有检测到可用的U盘。")
+
+        dlg = tk.Toplevel(self)
+        dlg.title(title)
+        dlg.transient(self)
+        dlg.grab_set()
+
+        ttk.Label(dlg, text="选择目标U盘：").pack(anchor="w", padx=10, pady=(10, 4))
+        vars_ = {}
+        for d in drives:
+            var = tk.BooleanVar(value=True)
+            vars_[d] = var
+            ttk.Checkbutton(dlg, text=d + "\\", variable=var).pack(anchor="w", padx=20)
+
+        chosen = []
+
+        def on_ok():
+            chosen.extend(d for d, var in vars_.items() if var.get())
+            dlg.destroy()
+
+        btns = ttk.Frame(dlg)
+        btns.pack(fill="x", padx=10, pady=10)
+        ttk.Button(btns, text="取消", command=dlg.destroy).pack(side="right")
+        ttk.Button(btns, text="确定", command=on_ok).pack(side="right", padx=(0, 8))
+
+        self.wait_window(dlg)
+        return chosen
+
+    def _duplicate_file(self):
+        try:
+            src = filedialog.askopenfilename(title="选择要镜像到多个U盘的源文件", parent=self)
+            if not src:
+                return
+            drives = self._ask_drives("镜像到多个U盘")
+            if not drives:
+                return
+            name = os.path.basename(src)
+            dsts = [os.path.join(d + "\\", name) for d in drives]
+
+            def run(job):
+                per_drive = {}
+                lock = threading.Lock()
+
+                def on_p(dst, p):
+                    job.check_cancelled()
+                    # 各目标的写线程都会回调，在锁内更新并取快照后再汇总
+                    with lock:
+                        per_drive[dst[:2]] = p
+                        items = sorted(per_drive.items())
+                    done = sum(x.bytes_copied for _, x in items)
+                    job.update(
+                        progress=done / max(p.total_bytes * len(dsts), 1),
+                        detail=" ".join(
+                            f"{d} {x.bytes_copied * 100 // max(x.total_bytes, 1)}% {x.speed_bps / (1024 * 1024):.0f}MB/s"
+                            for d, x in items
+                        ),
+                    )
+
+                return duplicate_file(src, dsts, on_progress=on_p, control=job.control)
+
+            def on_success(results):
+                for r in results:
+                    if r.error:
+                        self._log(f"镜像失败：{r.dst_file}：{r.error}")
+                    else:
+                        mbps = r.bytes_copied / max(r.elapsed_sec, 1e-6) / (1024 * 1024)
+                        note = "（落后过多，已独立完成）" if r.detached else ""
+                        self._log(f"镜像完成：{r.dst_file}，用时 {r.elapsed_sec:.1f} 秒，{mbps:.1f} MB/s{note}")
+                self._refresh_file_list()
+
+            # 镜像任务同时占用多个 U 盘，在每个盘的队列中各占一个名额
+            self._submit_job(drives, f"镜像 {name} 到 {len(drives)} 个U盘", run, on_success)
+
+        except Exception as e:
+            self._log(f"镜像启动失败：{e}")
+            messagebox.showerror("错误", str(e), parent=self)
+
+    def _poll_jobs(self):
+        """
+        定时把调度器中的任务状态同步到队列表格，进度更新不经过事件队列
+        """
+        jobs = self.scheduler.jobs()
+        alive = set()
+        for job in jobs:
+            iid = str(job.job_id)
+            alive.add(iid)
+            speed = f"{job.speed_bps / (1024 * 1024):.1f} MB/s" if job.status == RUNNING else ""
+            remaining = _format_eta(job.eta_sec) if job.status == RUNNING else ""
+            progress = f"{job.progress * 100:.0f}%"
+            if job.detail and job.status == RUNNING:
+                progress += f" ({job.detail})"
+            status = JOB_STATUS_TEXT.get(job.status, job.status)
+            if job.status == RUNNING and job.control.paused:
+                status = "已暂停"
+            values = (
+                job.job_id,
+                job.device,
+                job.title,
+                status,
+                progress,
+                speed,
+                remaining,
+            )
+            if self.job_tree.exists(iid):
+                self.job_tree.item(iid, values=values)
+            else:
+                self.job_tree.insert("", "end", iid=iid, values=values)
+        for iid in self.job_tree.get_children():
+            if iid not in alive:
+                self.job_tree.delete(iid)
+        self.after(250, self._poll_jobs)
+
+    def _cancel_selected_jobs(self, discard=False):
+        """
+        取消所选任务；可续传的拷贝默认保留已写入的部分，discard=True 时一并删除
+        """
+        for iid in self.job_tree.selection():
+            if self.scheduler.cancel(int(iid), discard=discard):
+                self._log(f"正在取消任务 #{iid}" + ("（丢弃已写入的部分）" if discard else ""))
+
+    def _pause_selected_jobs(self):
+        for iid in self.job_tree.selection():
+            if self.scheduler.pause(int(iid)):
+                self._log(f"已暂停任务 #{iid}")
+
+    def _resume_selected_jobs(self):
+        for iid in self.job_tree.selection():
+            if self.scheduler.resume(int(iid)):
+                self._log(f"已继续任务 #{iid}")
+
+    def _read_rate(self, var):
+        """
+        把界面上的 MB/s 转为字节/秒，0 或无效输入返回 None（不限速）
+        """
+        try:
+            mbps = float(var.get())
+        except (tk.TclError, ValueError):
+            return None
+        return mbps * 1024 * 1024 if mbps > 0 else None
+
+    def _apply_global_rate(self):
+        rate = self._read_rate(self.global_rate_var)
+        self.scheduler.set_global_rate(rate)
+        self._log(f"全局限速：{rate / (1024 * 1024):.1f} MB/s" if rate else "全局限速：不限")
+
+    def _apply_job_rate(self):
+        rate = self._read_rate(self.job_rate_var)
+        for iid in self.job_tree.selection():
+            if self.scheduler.set_job_rate(int(iid), rate):
+                self._log(f"任务 #{iid} 限速：{rate / (1024 * 1024):.1f} MB/s" if rate else f"任务 #{iid} 限速：不限")
+
+    def _clear_finished_jobs(self):
+        self.scheduler.clear_finished()
+
+    def _apply_concurrency(self):
+        try:
+            limit = int(self.concurrency_var.get())
+        except (tk.TclError, ValueError):
+            return
+        self.scheduler.set_concurrency(None, limit)
+
+    def _run_benchmark(self):
+        try:
+            mp = self._require_mount()
+            size = int(self.bench_size_var.get()) * 1024 * 1024
+            qd = int(self.bench_qd_var.get())
+            if not messagebox.askyesno(
+                    "确认测速",
+                    f"将在 {mp} 写入 {size // (1024 * 1024)} MB 的临时测试文件并反复读写，测试结束后自动删除。\n确定继续吗？",
+                    parent=self,
+            ):
+                return
+
+            def run(job):
+                dev = get_drive_usb_device(mp[:2])
 
-        # 3秒后重置
-        self.after(3000, self._reset_progress)
+                def on_p(p):
+                    job.update(
+                        progress=(p.tests_done + p.done) / max(p.tests_total, 1),
+                        detail=f"{p.test} {p.tests_done + 1}/{p.tests_total}",
+                    )
+
+                report = run_benchmark(
+                    mp, file_size=size, queue_depth=qd, on_progress=on_p, control=job.control, device=dev,
+                )
+                save_report(report)
+                return report
 
-    def _copy_failed(self, error_msg):
-        """处理复制失败"""
-        self.progress_text.config(text="复制失败!")
-        self.progress_bar.config(style="red.Horizontal.TProgressbar")
-        self._log(f"拷贝失败：{error_msg}")
-        messagebox.showerror("错误", f"文件复制失败：\n{error_msg}", parent=self)
+            def on_success(report):
+                self._log(f"测速完成：{mp}（{report.product or '未知型号'} {report.model_key or ''}）")
+                for line in format_results(report.results):
+                    self._log("  " + line)
+                self._show_bench_report(report)
 
-        self.after(3000, self._reset_progress)
+            self._submit_job(mp[:2], f"测速 {mp}", run, on_success)
+        except Exception as e:
+            self._log(f"测速启动失败：{e}")
+            messagebox.showerror("错误", str(e), parent=self)
 
-    def _reset_progress(self):
-        self.progress_var.set(0)
-        self.progress_text.config(text="等待操作...")
-        self.speed_label.config(text="")
-        self.remaining_label.config(text="")
-        self.progress_bar.config(style="")
+    def _show_bench_report(self, report):
+        """
+        显示本次测速结果，以及同一型号此前各次结果，便于对比
+        """
+        win = tk.Toplevel(self)
+        title = report.product or "未知型号"
+        win.title(f"测速结果 - {title} {report.model_key or ''}")
+        win.geometry("860x360")
+        cols = ("time", "test", "qd", "mbps", "iops", "p50", "p95", "p99", "mode")
+        headings = {
+            "time": "时间",
+            "test": "测试项",
+            "qd": "QD",
+            "mbps": "MB/s",
+            "iops": "IOPS",
+            "p50": "p50 ms",
+            "p95": "p95 ms",
+            "p99": "p99 ms",
+            "mode": "方式",
+        }
+        tree = ttk.Treeview(win, columns=cols, show="headings")
+        for c in cols:
+            tree.heading(c, text=headings[c])
+            width = 140 if c == "time" else 110 if c == "test" else 70
+            tree.column(c, width=width, anchor="w" if c in ("time", "test") else "e")
+        tree.pack(fill="both", expand=True, padx=10, pady=10)
+
+        history = load_reports(report.model_key).get(report.model_key, []) if report.model_key else [report]
+        # 最新的在前；每次测速按固定顺序列出各测试项
+        order = {t: k for k, t in enumerate(BENCH_TESTS)}
+        for r in reversed(history[-10:]):
+            stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(r.started_at))
+            for res in sorted(r.results, key=lambda x: order.get(x.test, 99)):
+                tree.insert("", "end", values=(
+                    stamp,
+                    res.test,
+                    res.queue_depth,
+                    f"{res.mb_per_sec:.1f}",
+                    f"{res.iops:.0f}",
+                    f"{res.lat_p50_ms:.2f}",
+                    f"{res.lat_p95_ms:.2f}",
+                    f"{res.lat_p99_ms:.2f}",
+                    res.io_mode,
+                ))
 
     def _delete_path(self):
         try:
@@ -501,17 +1316,52 @@ class App(tk.Tk):
                 raise RuntimeError("相对路径不能为空。")
             if not messagebox.askyesno("确认删除", f"确定删除 U盘中的：\n{rel}\n吗？", parent=self):
                 return
-            target = delete_path(mp, rel)
-            self._log(f"删除完成：{target}")
-            self._refresh_file_list()
+
+            def run(job):
+                def on_p(p):
+                    job.update(
+                        progress=p.files_done / p.files_total if p.files_total else 1.0,
+                        speed_bps=p.bytes_per_sec,
+                        eta_sec=(p.files_total - p.files_done) / p.files_per_sec if p.files_per_sec else None,
+                        detail=f"{p.files_done}/{p.files_total} 个文件，{p.files_per_sec:.0f} 个/秒",
+                    )
+
+                return delete_path(mp, rel, on_progress=on_p, control=job.control)
+
+            def on_success(target):
+                self._log(f"删除完成：{target}")
+                self._refresh_file_list()
+
+            # 删除在调度器的设备队列中执行，不阻塞界面，可在队列中暂停或取消
+            self._submit_job(mp[:2], f"删除 {rel}", run, on_success)
         except Exception as e:
             self._log(f"删除失败：{e}")
             messagebox.showerror("错误", str(e), parent=self)
 
+    def _quick_wipe(self):
+        try:
+            mp = self._require_mount()
+            if not messagebox.askyesno(
+                    "确认快速清空",
+                    f"将对 {mp} 执行快速格式化，U 盘中的所有文件都会被清除且无法恢复。\n"
+                    "保留原文件系统类型与卷标，需要管理员权限。\n\n确定继续吗？",
+                    icon="warning",
+                    parent=self,
+            ):
+                return
+
+            def on_success(elapsed):
+                self._log(f"快速清空完成：{mp}（用时 {elapsed:.1f} 秒）")
+                self._refresh_file_list()
+
+            self._submit_job(mp[:2], f"快速清空 {mp}", lambda job: quick_wipe(mp, control=job.control), on_success)
+        except Exception as e:
+            self._log(f"快速清空失败：{e}")
+            messagebox.showerror("错误", str(e), parent=self)
+
 
 if __name__ == "__main__":
     try:
-        # 配置进度条样式
         try:
             from ctypes import windll
 
@@ -520,11 +1370,6 @@ if __name__ == "__main__":
             pass
 
         app = App()
-
-        style = ttk.Style()
-        style.configure("green.Horizontal.TProgressbar", background='green')
-        style.configure("red.Horizontal.TProgressbar", background='red')
-
         app.mainloop()
     except KeyboardInterrupt:
         pass
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from file_ops import copy_with_progress
+
+GIB = 1024 * 1024 * 1024
+
+
+def _legacy_copy(src_file: str, dst_file: str, chunk_size: int = 1024 * 1024) -> None:
+    """
+    旧版拷贝循环：每个分块 read 出新的 bytes 再 write，作为对照组
+    """
+    with open(src_file, "rb") as fsrc, open(dst_file, "wb") as fdst:
+        while True:
+            chunk = fsrc.read(chunk_size)
+            if not chunk:
+                break
+            fdst.write(chunk)
+
+
+def _make_source(path: str, size: int) -> None:
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            n = min(remaining, len(block))
+            f.write(block[:n])
+            remaining -= n
+
+
+def _measure(fn) -> tuple[float, float]:
+    """
+    返回 (墙钟时间, 进程 CPU 时间)，CPU 时间包含内核态
+    """
+    c0 = os.times()
+    t0 = time.perf_counter()
+    fn()
+    t1 = time.perf_counter()
+    c1 = os.times()
+    cpu = (c1.user - c0.user) + (c1.system - c0.system)
+    return t1 - t0, cpu
+
+
+def run(size: int, src_dir: str, dst_dir: str, repeat: int, chunk_size: int) -> list[dict]:
+    src = os.path.join(src_dir, "bench_copy_src.bin")
+    dst = os.path.join(dst_dir, "bench_copy_dst.bin")
+    _make_source(src, size)
+
+    cases = {
+        "legacy": lambda: _legacy_copy(src, dst, chunk_size),
+        "readinto": lambda: copy_with_progress(src, dst, chunk_size=chunk_size, engine="readinto"),
+        "pipelined": lambda: copy_with_progress(src, dst, chunk_size=chunk_size, engine="pipelined"),
+        "auto": lambda: copy_with_progress(src, dst, chunk_size=chunk_size, engine="auto"),
+    }
+
+    results = []
+    try:
+        for name, fn in cases.items():
+            best_wall, best_cpu = float("inf"), float("inf")
+            for _ in range(repeat):
+                wall, cpu = _measure(fn)
+                best_wall = min(best_wall, wall)
+                best_cpu = min(best_cpu, cpu)
+                os.remove(dst)
+            results.append({
+                "engine": name,
+                "mb_per_sec": size / max(best_wall, 1e-9) / (1024 * 1024),
+                "cpu_sec_per_gib": best_cpu * GIB / size,
+            })
+    finally:
+        for p in (src, dst):
+            if os.path.exists(p):
+                os.remove(p)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="对比旧拷贝循环与新拷贝引擎的吞吐与 CPU 开销")
+    parser.add_argument("--size-mb", type=int, default=256, help="测试文件大小 (MiB)")
+    parser.add_argument("--src-dir", default=None, help="源文件所在目录，默认临时目录")
+    parser.add_argument("--dst-dir", default=None, help="目标目录，例如 U 盘挂载点，默认临时目录")
+    parser.add_argument("--repeat", type=int, default=3, help="每种引擎重复次数，取最好成绩")
+    parser.add_argument("--chunk-kb", type=int, default=1024, help="分块大小 (KiB)")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_copy_")
+    try:
+        rows = run(
+            size=args.size_mb * 1024 * 1024,
+            src_dir=args.src_dir or tmp,
+            dst_dir=args.dst_dir or tmp,
+            repeat=args.repeat,
+            chunk_size=args.chunk_kb * 1024,
+        )
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"{'engine':<10} {'MB/s':>10} {'CPU s/GiB':>10}")
+    for r in rows:
+        print(f"{r['engine']:<10} {r['mb_per_sec']:>10.1f} {r['cpu_sec_per_gib']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import time
+
+from usb_info import _coerce_int, _extract_usb_version, _norm_instance_id, _parse_pnputil_lines
+
+_FILLER_PROPS = [
+    ("DEVPKEY_Device_DeviceDesc", "String", "Generic PnP Device"),
+    ("DEVPKEY_Device_HardwareIds", "String List", "ACPI\\PNP0C02"),
+    ("DEVPKEY_Device_Class", "String", "System"),
+    ("DEVPKEY_Device_ClassGuid", "Guid", "{4d36e97d-e325-11ce-bfc1-08002be10318}"),
+    ("DEVPKEY_Device_Driver", "String", "{4d36e97d-e325-11ce-bfc1-08002be10318}\\0001"),
+    ("DEVPKEY_Device_Manufacturer", "String", "(Standard system devices)"),
+    ("DEVPKEY_Device_LocationInfo", "String", "Port_#0001.Hub_#0002"),
+    ("DEVPKEY_Device_Capabilities", "UInt32", "0x00000084 (132)"),
+    ("DEVPKEY_Device_ConfigFlags", "UInt32", "0x00000000 (0)"),
+    ("DEVPKEY_Device_DriverDate", "FileTime", "6/21/2006 0:00:00"),
+    ("DEVPKEY_Device_DriverVersion", "String", "10.0.22621.1"),
+    ("DEVPKEY_Device_InstallDate", "FileTime", "1/1/2024 8:00:00"),
+]
+
+
+def _node(instance_id: str, desc: str, address: int, bus: int, bus_desc: str, filler: int) -> list[str]:
+    lines = [
+        f"Instance ID:                {instance_id}",
+        f"Device Description:         {desc}",
+        "Class Name:                 USB",
+        "Status:                     Started",
+        "Device Properties:",
+    ]
+    for name, typ, val in _FILLER_PROPS[:filler]:
+        lines.append(f"    {name} [{typ}]:")
+        lines.append(f"        {val}")
+    lines += [
+        "    DEVPKEY_Device_BusReportedDeviceDesc [String]:",
+        f"        {bus_desc}",
+        "    DEVPKEY_Device_Address [UInt32]:",
+        f"        0x{address:08x} ({address})",
+        "    DEVPKEY_Device_BusNumber [UInt32]:",
+        f"        0x{bus:08x} ({bus})",
+        "",
+    ]
+    return lines
+
+
+def make_dump(nodes: int, filler: int = len(_FILLER_PROPS), seed: int = 1) -> tuple[list[str], list[str]]:
+    """
+    生成仿 pnputil /enum-devices /connected /properties 输出，返回 (行列表, 实例 ID 列表)
+    """
+    rnd = random.Random(seed)
+    lines = ["Microsoft PnP Utility", ""]
+    ids = []
+    for k in range(nodes):
+        vid, pid = rnd.randrange(0x10000), rnd.randrange(0x10000)
+        instance_id = f"USB\\VID_{vid:04X}&PID_{pid:04X}\\{k:012d}"
+        ids.append(instance_id)
+        ver = rnd.choice(["2.0", "3.0", "3.2"])
+        lines += _node(instance_id, f"USB Mass Storage Device {ver}", k % 16 + 1, k % 4, f"Flash Disk {ver}", filler)
+    return lines, ids
+
+
+def _legacy_parse(text: str) -> dict:
+    """
+    旧版解析：整段文本 splitlines 后逐行匹配，每次调用重新编译正则，作为对照组
+    """
+    idx = {}
+    re_inst_id = re.compile(r"^\s*(?:实例|Instance)\s*ID\s*:\s*(.+)", re.IGNORECASE)
+    re_desc_line = re.compile(r"^\s*(?:设备描述|Device Description)\s*:\s*(.+)", re.IGNORECASE)
+    re_prop_addr = re.compile(r"DEVPKEY_Device_Address", re.IGNORECASE)
+    re_prop_bus = re.compile(r"DEVPKEY_Device_BusNumber", re.IGNORECASE)
+    re_prop_bus_desc = re.compile(r"DEVPKEY_Device_BusReportedDeviceDesc", re.IGNORECASE)
+    re_hex_val = re.compile(r"(0x[0-9A-Fa-f]+)", re.IGNORECASE)
+    re_dec_val = re.compile(r"\((\d+)\)", re.IGNORECASE)
+
+    cur_id_norm = None
+    cur_data = {}
+    expecting = None
+    for line in text.splitlines():
+        line_stripped = line.strip()
+        if not line_stripped:
+            continue
+        m_id = re_inst_id.match(line_stripped)
+        if m_id:
+            if cur_id_norm:
+                idx[cur_id_norm] = cur_data
+            cur_id_norm = _norm_instance_id(m_id.group(1).strip())
+            cur_data = {"address": None, "bus": None, "usb_version_bcd": None}
+            expecting = None
+            continue
+        if not cur_id_norm:
+            continue
+        m_desc = re_desc_line.match(line_stripped)
+        if m_desc:
+            ver = _extract_usb_version(m_desc.group(1))
+            if ver:
+                cur_data["usb_version_bcd"] = ver
+            continue
+        if expecting:
+            if expecting == "bus_desc":
+                ver = _extract_usb_version(line_stripped)
+                if ver:
+                    cur_data["usb_version_bcd"] = ver
+            else:
+                val = None
+                m_hex = re_hex_val.search(line_stripped)
+                if m_hex:
+                    val = _coerce_int(m_hex.group(1))
+                else:
+                    m_dec = re_dec_val.search(line_stripped)
+                    if m_dec:
+                        val = _coerce_int(m_dec.group(1))
+                if val is not None:
+                    if expecting == "addr":
+                        cur_data["address"] = val
+                    elif expecting == "bus":
+                        cur_data["bus"] = val
+            expecting = None
+            continue
+        if re_prop_addr.search(line_stripped):
+            expecting = "addr"
+        elif re_prop_bus.search(line_stripped):
+            expecting = "bus"
+        elif re_prop_bus_desc.search(line_stripped):
+            expecting = "bus_desc"
+    if cur_id_norm:
+        idx[cur_id_norm] = cur_data
+    return idx
+
+
+class _CountingLines:
+    """
+    逐行产出并统计实际读取的行数，用来衡量提前结束省下了多少 pnputil 输出
+    """
+
+    def __init__(self, lines: list[str]):
+        self.lines = lines
+        self.consumed = 0
+
+    def __iter__(self):
+        for line in self.lines:
+            self.consumed += 1
+            yield line
+
+
+def run(nodes: int, wanted: int, repeat: int) -> list[dict]:
+    lines, ids = make_dump(nodes)
+    text = "\n".join(lines)
+    # 被查询的设备随机分布在输出中，与实际 USB 存储设备的位置无关
+    targets = {_norm_instance_id(i) for i in random.Random(2).sample(ids, min(wanted, len(ids)))}
+
+    expected = _legacy_parse(text)
+    streamed = _parse_pnputil_lines(iter(lines))
+    if streamed != expected:
+        raise AssertionError("流式解析结果与旧版不一致")
+
+    cases = {
+        "legacy": lambda: (_legacy_parse(text), len(lines)),
+        "streaming": lambda: (_parse_pnputil_lines(iter(lines)), len(lines)),
+    }
+
+    def early():
+        src = _CountingLines(lines)
+        idx = _parse_pnputil_lines(src, targets)
+        if {k: expected[k] for k in targets} != idx:
+            raise AssertionError("提前结束的解析结果与旧版不一致")
+        return idx, src.consumed
+
+    cases[f"early-stop({len(targets)})"] = early
+
+    results = []
+    for name, fn in cases.items():
+        best = float("inf")
+        consumed = 0
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            _, consumed = fn()
+            best = min(best, time.perf_counter() - t0)
+        results.append({"parser": name, "ms": best * 1000, "lines_read": consumed / len(lines)})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="对比旧版与流式 pnputil 解析器在大输出上的耗时")
+    parser.add_argument("--nodes", type=int, default=2000, help="合成输出中的设备节点数")
+    parser.add_argument("--wanted", type=int, default=3, help="提前结束场景中要查找的设备数")
+    parser.add_argument("--repeat", type=int, default=5, help="每种解析器重复次数，取最好成绩")
+    args = parser.parse_args()
+
+    rows = run(args.nodes, args.wanted, args.repeat)
+    print(f"{'parser':<18} {'ms':>10} {'lines read':>12}")
+    for r in rows:
+        print(f"{r['parser']:<18} {r['ms']:>10.1f} {r['lines_read']:>11.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from usb_info import _norm_instance_id
+
+_INVENTORY_PATH = os.path.join(os.path.expanduser("~"), ".usb_lab_gui", "inventory.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    instance_id TEXT PRIMARY KEY,
+    serial TEXT,
+    data TEXT NOT NULL,
+    connected INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS serial_history (
+    serial TEXT PRIMARY KEY,
+    vendor_id TEXT,
+    product_id TEXT,
+    product TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    connections INTEGER NOT NULL
+);
+"""
+
+
+@dataclass
+class SerialHistory:
+    serial: str
+    vendor_id: Optional[str]
+    product_id: Optional[str]
+    product: Optional[str]
+    first_seen: float
+    last_seen: float
+    connections: int  # 被检测到接入的次数（从未连接变为已连接记一次）
+    connected: bool
+
+
+class DeviceInventory:
+    """
+    持久化的 USB 设备清单（SQLite），按规范化的实例 ID 保存 WMI + pnputil 采集到的属性：
+    - 启动时 load() 立即给出上次已知的设备列表，无需等待采集；
+    - 每次采集完成后 record() 写入当前设备，未出现的设备标记为已断开；
+    - 按序列号记录首次/最近一次出现时间与接入次数，可用 history() 查询。
+    连接在多个线程间共享，由内部锁串行化访问。
+    """
+
+    def __init__(self, path: str = _INVENTORY_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def load(self, only_storage: bool = True) -> List[Dict[str, Any]]:
+        """
+        返回上次记录时仍连接的设备，格式与 list_usb_devices 相同
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM devices WHERE connected = 1 ORDER BY instance_id"
+            ).fetchall()
+        devices = []
+        for (data,) in rows:
+            try:
+                d = json.loads(data)
+            except ValueError:
+                continue
+            if only_storage and (d.get("service") or "").upper() != "USBSTOR":
+                continue
+            devices.append(d)
+        return devices
+
+    def record(self, devices: List[Dict[str, Any]], properties_complete: bool = True) -> None:
+        """
+        保存一次完整（未筛选）的采集结果，不在其中的设备标记为已断开。
+        properties_complete=False 表示 pnputil 属性没有拿全，此时缺失的字段沿用上次记录的值。
+        """
+        now = time.time()
+        current = {}
+        for d in devices:
+            key = _norm_instance_id(d.get("pnp_device_id"))
+            if key:
+                current[key] = d
+
+        with self._lock, self._conn:
+            stored = {
+                key: (connected, data)
+                for key, connected, data in self._conn.execute("SELECT instance_id, connected, data FROM devices")
+            }
+            previously = {key for key, (connected, _) in stored.items() if connected}
+            if not properties_complete:
+                for key, d in current.items():
+                    if key not in stored:
+                        continue
+                    try:
+                        old = json.loads(stored[key][1])
+                    except ValueError:
+                        continue
+                    current[key] = {k: (old.get(k) if v is None else v) for k, v in d.items()}
+
+            self._conn.executemany(
+                "INSERT INTO devices (instance_id, serial, data, connected, updated_at) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT(instance_id) DO UPDATE SET serial = excluded.serial, data = excluded.data, "
+                "connected = 1, updated_at = excluded.updated_at",
+                [(key, d.get("serial_number"), json.dumps(d, ensure_ascii=False), now) for key, d in current.items()],
+            )
+            gone = previously - current.keys()
+            self._conn.executemany(
+                "UPDATE devices SET connected = 0, updated_at = ? WHERE instance_id = ?",
+                [(now, key) for key in gone],
+            )
+
+            for key, d in current.items():
+                serial = d.get("serial_number")
+                if not serial:
+                    continue
+                # 之前不在已连接集合中的设备记一次接入
+                new_connection = 0 if key in previously else 1
+                self._conn.execute(
+                    "INSERT INTO serial_history "
+                    "(serial, vendor_id, product_id, product, first_seen, last_seen, connections) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 1) "
+                    "ON CONFLICT(serial) DO UPDATE SET vendor_id = excluded.vendor_id, "
+                    "product_id = excluded.product_id, product = excluded.product, "
+                    "last_seen = excluded.last_seen, connections = connections + ?",
+                    (serial, d.get("vendor_id"), d.get("product_id"), d.get("product"), now, now, new_connection),
+                )
+
+    def history(self, serial: Optional[str] = None) -> List[SerialHistory]:
+        """
+        按最近出现时间倒序返回序列号历史；给出 serial 时只返回该设备
+        """
+        sql = (
+            "SELECT h.serial, h.vendor_id, h.product_id, h.product, h.first_seen, h.last_seen, h.connections, "
+            "EXISTS (SELECT 1 FROM devices d WHERE d.connected = 1 AND d.serial = h.serial) "
+            "FROM serial_history h"
+        )
+        args: tuple = ()
+        if serial is not None:
+            sql += " WHERE h.serial = ?"
+            args = (serial,)
+        sql += " ORDER BY h.last_seen DESC"
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [SerialHistory(*r[:7], connected=bool(r[7])) for r in rows]
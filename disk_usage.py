@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from file_ops import add_change_listener, get_volume_serial
+
+_WORKERS = 4
+
+
+@dataclass
+class UsageItem:
+    path: str
+    name: str
+    bytes: int
+    files: int
+    is_dir: bool  # False 表示“本目录中的文件”汇总行
+
+
+def _norm(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _scan_dir(path: str) -> Tuple[int, int, List[str]]:
+    """
+    只扫描一层：返回 (本目录中文件的字节数, 文件数, 子目录列表)，不跟随符号链接
+    """
+    size = files = 0
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    else:
+                        size += entry.stat(follow_symlinks=False).st_size
+                        files += 1
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return size, files, subdirs
+
+
+class UsageReport:
+    """
+    一个卷的递归占用统计，只保存目录级数据（各目录自身文件的大小与递归合计），内存与目录数成正比：
+    - scan() 用有界线程池并发遍历子树，每扫完一个目录就把其文件大小累加到所有上级，
+      on_progress(report) 至多每 progress_interval 秒调用一次，可随时读取部分合计；
+    - mark_dirty(path) 记录本程序修改过的路径，refresh_dirty() 只重扫受影响的目录或子树。
+    """
+
+    def __init__(self, root: str, serial: Optional[str], workers: int = _WORKERS):
+        self.root = root
+        self.serial = serial
+        self.workers = workers
+        self.done = False
+        self.elapsed_sec = 0.0
+        self.scanned_dirs = 0
+        self._key = _norm(root)
+        self._lock = threading.RLock()
+        self._own: Dict[str, Tuple[int, int]] = {}
+        self._total: Dict[str, List[int]] = {}
+        self._children: Dict[str, Set[str]] = {}
+        self._parent: Dict[str, Optional[str]] = {}
+        self._paths: Dict[str, str] = {}  # 规范化键 -> 原始路径（用于显示与扫描）
+        self._dirty: Set[str] = set()
+        self._scan_lock = threading.Lock()
+
+    def contains(self, path: str) -> bool:
+        key = _norm(path)
+        return key == self._key or key.startswith(self._key.rstrip(os.sep) + os.sep)
+
+    def total(self, path: Optional[str] = None) -> Tuple[int, int]:
+        with self._lock:
+            t = self._total.get(_norm(path) if path else self._key)
+            return (t[0], t[1]) if t else (0, 0)
+
+    def items(self, path: Optional[str] = None) -> List[UsageItem]:
+        """
+        path 下各子目录的递归合计，加上一行本目录自身文件的合计，按大小降序
+        """
+        key = _norm(path) if path else self._key
+        with self._lock:
+            result = []
+            for child in self._children.get(key, ()):
+                t = self._total.get(child, (0, 0))
+                p = self._paths[child]
+                result.append(UsageItem(p, os.path.basename(p.rstrip("\\/")) or p, t[0], t[1], True))
+            own = self._own.get(key)
+            if own and own[1]:
+                p = self._paths.get(key, path or self.root)
+                result.append(UsageItem(p, "（本目录中的文件）", own[0], own[1], False))
+        result.sort(key=lambda i: i.bytes, reverse=True)
+        return result
+
+    def mark_dirty(self, path: str) -> None:
+        if self.contains(path):
+            with self._lock:
+                self._dirty.add(path)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._dirty)
+
+    def scan(
+            self,
+            on_progress: Optional[Callable[["UsageReport"], None]] = None,
+            progress_interval: float = 0.2,
+            cancel: Optional[threading.Event] = None,
+    ) -> "UsageReport":
+        t0 = time.perf_counter()
+        with self._scan_lock:
+            with self._lock:
+                self._own.clear()
+                self._total.clear()
+                self._children.clear()
+                self._parent.clear()
+                self._paths.clear()
+                self._dirty.clear()
+                self.done = False
+                self.scanned_dirs = 0
+            self._walk(self.root, None, on_progress, progress_interval, cancel)
+            self.done = cancel is None or not cancel.is_set()
+        self.elapsed_sec = time.perf_counter() - t0
+        if on_progress is not None:
+            on_progress(self)
+        return self
+
+    def refresh_dirty(self) -> None:
+        """
+        按记录的脏路径增量更新：已知目录重扫其子树，其它路径只重扫上级目录这一层
+        """
+        with self._scan_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            for path in sorted(dirty, key=len):
+                key = _norm(path)
+                with self._lock:
+                    known = key in self._total
+                if known and os.path.isdir(path):
+                    self._rescan_subtree(key)
+                    continue
+                # 新建/删除的文件或目录：找到最近的已知上级目录，只重扫这一层
+                parent = os.path.dirname(path.rstrip("\\/"))
+                while parent and _norm(parent) not in self._total and self.contains(parent):
+                    up = os.path.dirname(parent)
+                    if up == parent:
+                        break
+                    parent = up
+                if self.contains(parent) and _norm(parent) in self._total:
+                    self._refresh_shallow(_norm(parent))
+
+    # --- 内部实现 ---
+
+    def _register(self, key: str, path: str, parent: Optional[str]) -> None:
+        self._paths[key] = path
+        self._parent[key] = parent
+        self._total[key] = [0, 0]
+        self._children[key] = set()
+        self._own[key] = (0, 0)
+        if parent is not None:
+            self._children[parent].add(key)
+
+    def _add_up(self, key: Optional[str], size: int, files: int) -> None:
+        while key is not None:
+            t = self._total[key]
+            t[0] += size
+            t[1] += files
+            key = self._parent[key]
+
+    def _drop_subtree(self, key: str) -> None:
+        """
+        从统计中移除 key 及其子树，并从所有上级的合计中扣除
+        """
+        t = self._total.get(key)
+        if t is None:
+            return
+        parent = self._parent[key]
+        self._add_up(parent, -t[0], -t[1])
+        if parent is not None:
+            self._children[parent].discard(key)
+        stack = [key]
+        while stack:
+            k = stack.pop()
+            stack.extend(self._children.pop(k, ()))
+            for d in (self._own, self._total, self._parent, self._paths):
+                d.pop(k, None)
+
+    def _walk(
+            self,
+            start: str,
+            parent: Optional[str],
+            on_progress: Optional[Callable[["UsageReport"], None]] = None,
+            progress_interval: float = 0.2,
+            cancel: Optional[threading.Event] = None,
+    ) -> None:
+        with self._lock:
+            self._register(_norm(start), start, parent)
+        last = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {pool.submit(_scan_dir, start): _norm(start)}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    key = pending.pop(fut)
+                    size, files, subdirs = fut.result()
+                    with self._lock:
+                        if key not in self._total:
+                            continue
+                        self._own[key] = (size, files)
+                        self._add_up(key, size, files)
+                        self.scanned_dirs += 1
+                        for sub in subdirs:
+                            self._register(_norm(sub), sub, key)
+                    if cancel is not None and cancel.is_set():
+                        continue
+                    for sub in subdirs:
+                        pending[pool.submit(_scan_dir, sub)] = _norm(sub)
+                if on_progress is not None and time.monotonic() - last >= progress_interval:
+                    last = time.monotonic()
+                    on_progress(self)
+
+    def _rescan_subtree(self, key: str) -> None:
+        with self._lock:
+            path = self._paths[key]
+            parent = self._parent[key]
+            self._drop_subtree(key)
+        self._walk(path, parent)
+
+    def _refresh_shallow(self, key: str) -> None:
+        with self._lock:
+            path = self._paths[key]
+        size, files, subdirs = _scan_dir(path)
+        current = {_norm(s): s for s in subdirs}
+        with self._lock:
+            old_size, old_files = self._own[key]
+            self._own[key] = (size, files)
+            self._add_up(key, size - old_size, files - old_files)
+            known = set(self._children[key])
+            for gone in known - current.keys():
+                self._drop_subtree(gone)
+        for new in current.keys() - known:
+            self._walk(current[new], key)
+
+
+# 按卷序列号缓存的统计结果；同一个 U 盘拔出后重新插入时直接复用
+_reports: Dict[str, UsageReport] = {}
+_reports_lock = threading.Lock()
+
+
+def _on_changed(path: str) -> None:
+    with _reports_lock:
+        reports = list(_reports.values())
+    for report in reports:
+        report.mark_dirty(path)
+
+
+add_change_listener(_on_changed)
+
+
+def analyze_usage(
+        root: str,
+        on_progress: Optional[Callable[[UsageReport], None]] = None,
+        rescan: bool = False,
+        workers: int = _WORKERS,
+        cancel: Optional[threading.Event] = None,
+) -> UsageReport:
+    """
+    返回 root 所在卷的占用统计（阻塞，应在后台线程调用）：
+    - 该卷已有完整结果时只按本程序做过的写入/删除增量更新；
+    - 否则（或 rescan=True）完整并发扫描，过程中通过 on_progress 推送部分合计。
+    """
+    serial = get_volume_serial(root) or _norm(root)
+    with _reports_lock:
+        report = _reports.get(serial)
+        if report is None or rescan or not report.done or _norm(report.root) != _norm(root):
+            report = UsageReport(root, serial, workers)
+            _reports[serial] = report
+        else:
+            report.workers = workers
+    if report.done:
+        if report.dirty:
+            report.refresh_dirty()
+        if on_progress is not None:
+            on_progress(report)
+        return report
+    return report.scan(on_progress, cancel=cancel)
@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import fnmatch
+import os
+import re
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+from file_ops import add_change_listener, remove_change_listener
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+_GLOB_LITERALS = re.compile(r"[^*?\[\]]+")
+
+
+@dataclass
+class SearchHit:
+    root: str
+    path: str  # 相对于盘符根目录的路径
+    is_dir: bool
+
+
+@dataclass
+class SearchResult:
+    hits: List[SearchHit]
+    truncated: bool  # 命中数超过 limit，只返回了前 limit 项
+    elapsed_ms: float
+    indexing: List[str]  # 尚在建立索引、结果可能不全的盘符
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _norm(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+class DriveIndex:
+    """
+    单个盘符的文件名索引（内存中）：
+    - 每个条目保存相对路径与小写文件名，按文件名的三元组（trigram）建立倒排表；
+    - 子串查询取查询串各三元组倒排表的交集再逐个确认，通配符查询用其中的字面片段预筛后 fnmatch；
+    - 查询串不足三个字符时退化为顺序比较；
+    - remove_tree/add_tree 用于按路径增量修补，删除只留墓碑，墓碑过半时重建倒排表。
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.ready = False
+        self.build_sec = 0.0
+        self._lock = threading.RLock()
+        self._paths: List[Optional[str]] = []
+        self._names: List[Optional[str]] = []
+        self._dirs = bytearray()
+        self._ids: Dict[str, int] = {}
+        self._grams: Dict[str, array] = {}
+        self._dead = 0
+        self._cancel = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def build(self) -> "DriveIndex":
+        t0 = time.perf_counter()
+        self.add_tree(self.root)
+        self.build_sec = time.perf_counter() - t0
+        self.ready = not self._cancel.is_set()
+        return self
+
+    def _rel(self, path: str) -> str:
+        return os.path.relpath(path, self.root)
+
+    def _add(self, rel: str, is_dir: bool) -> None:
+        if rel in self._ids:
+            return
+        i = len(self._paths)
+        name = os.path.basename(rel).lower()
+        self._paths.append(rel)
+        self._names.append(name)
+        self._dirs.append(1 if is_dir else 0)
+        self._ids[rel] = i
+        for g in _trigrams(name):
+            postings = self._grams.get(g)
+            if postings is None:
+                postings = self._grams[g] = array("I")
+            postings.append(i)
+
+    def add_tree(self, path: str) -> None:
+        """
+        加入 path（文件或目录），目录会递归加入其下所有条目
+        """
+        if os.path.isfile(path):
+            with self._lock:
+                self._add(self._rel(path), False)
+            return
+        if _norm(path) != _norm(self.root):
+            with self._lock:
+                self._add(self._rel(path), True)
+        stack = [path]
+        while stack and not self._cancel.is_set():
+            d = stack.pop()
+            batch = []
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        batch.append((entry.path, is_dir))
+                        if is_dir:
+                            stack.append(entry.path)
+            except OSError:
+                continue
+            # 每个目录加一次锁，建索引期间查询也能穿插进行
+            with self._lock:
+                for p, is_dir in batch:
+                    self._add(self._rel(p), is_dir)
+
+    def remove_tree(self, path: str) -> None:
+        """
+        移除 path 以及（若是目录）其下所有条目
+        """
+        rel = self._rel(path)
+        prefix = rel.rstrip("\\/") + os.sep
+        with self._lock:
+            i = self._ids.get(rel)
+            if i is not None and not self._dirs[i]:
+                # 普通文件没有子条目，不必扫描整个索引
+                doomed = [rel]
+            else:
+                doomed = [r for r in self._ids if r == rel or r.startswith(prefix)]
+            for r in doomed:
+                i = self._ids.pop(r)
+                self._paths[i] = None
+                self._names[i] = None
+            self._dead += len(doomed)
+            if self._dead > len(self._ids):
+                self._compact()
+
+    def update(self, path: str) -> None:
+        """
+        本程序修改了 path：移除旧条目，若仍存在则重新加入。
+        path 为根目录时整体重建，重建期间 ready 为 False，查询结果会标明该盘仍在建立索引
+        """
+        if _norm(path) == _norm(self.root):
+            with self._lock:
+                self.ready = False
+                self._paths, self._names, self._dirs = [], [], bytearray()
+                self._ids, self._grams, self._dead = {}, {}, 0
+            t0 = time.perf_counter()
+            self.add_tree(self.root)
+            self.build_sec = time.perf_counter() - t0
+            self.ready = not self._cancel.is_set()
+            return
+        self.remove_tree(path)
+        if os.path.exists(path):
+            self.add_tree(path)
+
+    def _compact(self) -> None:
+        live = [(p, bool(self._dirs[i])) for i, p in enumerate(self._paths) if p is not None]
+        self._paths, self._names, self._dirs = [], [], bytearray()
+        self._ids, self._grams, self._dead = {}, {}, 0
+        for rel, is_dir in live:
+            self._add(rel, is_dir)
+
+    def _candidates(self, literals: Iterable[str]) -> Optional[List[int]]:
+        """
+        各字面片段三元组倒排表的交集；没有可用的三元组时返回 None（需要顺序比较）
+        """
+        grams = set()
+        for lit in literals:
+            grams |= _trigrams(lit)
+        if not grams:
+            return None
+        lists = []
+        for g in grams:
+            postings = self._grams.get(g)
+            if postings is None:
+                return []
+            lists.append(postings)
+        lists.sort(key=len)
+        result = set(lists[0])
+        for postings in lists[1:]:
+            result.intersection_update(postings)
+            if not result:
+                break
+        return sorted(result)
+
+    def search(self, query: str, limit: int = 500) -> List[SearchHit]:
+        q = query.lower()
+        if _GLOB_CHARS.search(q):
+            literals = _GLOB_LITERALS.findall(q)
+            match = lambda name: fnmatch.fnmatchcase(name, q)
+        else:
+            literals = [q]
+            match = lambda name: q in name
+        hits = []
+        with self._lock:
+            ids = self._candidates(literals)
+            for i in (range(len(self._names)) if ids is None else ids):
+                name = self._names[i]
+                if name is not None and match(name):
+                    hits.append(SearchHit(self.root, self._paths[i], bool(self._dirs[i])))
+                    if len(hits) > limit:
+                        break
+        return hits
+
+
+class FileIndexer:
+    """
+    管理各个可移动盘的文件名索引：
+    - add(root) 在后台线程中建立索引，remove(root) 丢弃索引（U 盘拔出时调用）；
+    - sync(roots) 按当前盘符列表增删；
+    - 通过 file_ops 的变更通知增量修补本程序写入/删除过的路径：通知只把路径放入队列，
+      由索引自己的后台线程合并后处理，不占用拷贝/删除线程的时间。
+    """
+
+    def __init__(self, on_ready=None):
+        self.on_ready = on_ready  # on_ready(index)，在后台线程中调用
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, DriveIndex] = {}
+        self._changes: List[str] = []
+        self._changes_cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        threading.Thread(target=self._apply_changes, name="file-index-changes", daemon=True).start()
+        add_change_listener(self._on_changed)
+
+    def close(self) -> None:
+        remove_change_listener(self._on_changed)
+        with self._changes_cond:
+            self._closed = True
+            self._changes_cond.notify_all()
+        with self._lock:
+            indexes, self._indexes = list(self._indexes.values()), {}
+        for idx in indexes:
+            idx.cancel()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待已排队的变更处理完；超时返回 False
+        """
+        with self._changes_cond:
+            return self._changes_cond.wait_for(lambda: not self._changes and not self._busy, timeout)
+
+    def add(self, root: str) -> DriveIndex:
+        key = _norm(root)
+        with self._lock:
+            idx = self._indexes.get(key)
+            if idx is not None:
+                return idx
+            idx = self._indexes[key] = DriveIndex(root)
+        threading.Thread(target=self._build, args=(idx,), daemon=True).start()
+        return idx
+
+    def remove(self, root: str) -> None:
+        with self._lock:
+            idx = self._indexes.pop(_norm(root), None)
+        if idx is not None:
+            idx.cancel()
+
+    def sync(self, roots: Iterable[str]) -> None:
+        wanted = {_norm(r): r for r in roots}
+        with self._lock:
+            stale = [k for k in self._indexes if k not in wanted]
+        for k in stale:
+            self.remove(k)
+        for r in wanted.values():
+            self.add(r)
+
+    def get(self, root: str) -> Optional[DriveIndex]:
+        with self._lock:
+            return self._indexes.get(_norm(root))
+
+    def _build(self, idx: DriveIndex) -> None:
+        idx.build()
+        if idx.ready and self.on_ready is not None and self.get(idx.root) is idx:
+            self.on_ready(idx)
+
+    def _on_changed(self, path: str) -> None:
+        with self._changes_cond:
+            self._changes.append(path)
+            self._changes_cond.notify_all()
+
+    def _apply_changes(self) -> None:
+        while True:
+            with self._changes_cond:
+                self._busy = False
+                self._changes_cond.notify_all()
+                self._changes_cond.wait_for(lambda: self._changes or self._closed)
+                if self._closed:
+                    return
+                changes, self._changes = self._changes, []
+                self._busy = True
+            # 合并：同一路径只处理一次，已有上级目录在队列中的路径随上级一起重建
+            merged: Dict[str, str] = {}
+            for path in sorted(changes, key=lambda p: len(_norm(p))):
+                key = _norm(path)
+                if not any(key == k or key.startswith(k.rstrip(os.sep) + os.sep) for k in merged):
+                    merged[key] = path
+            with self._lock:
+                indexes = list(self._indexes.items())
+            for key, path in merged.items():
+                for root, idx in indexes:
+                    if key == root or key.startswith(root.rstrip(os.sep) + os.sep):
+                        try:
+                            idx.update(path)
+                        except Exception:
+                            pass
+
+    def search(self, query: str, roots: Optional[Iterable[str]] = None, limit: int = 500) -> SearchResult:
+        """
+        在各盘索引中按文件名查找：普通字符串按子串（不区分大小写），含 * ? [ ] 时按通配符匹配整个文件名
+        """
+        t0 = time.perf_counter()
+        with self._lock:
+            if roots is None:
+                targets = list(self._indexes.values())
+            else:
+                targets = [self._indexes[k] for k in map(_norm, roots) if k in self._indexes]
+        hits: List[SearchHit] = []
+        truncated = False
+        for idx in targets:
+            hits.extend(idx.search(query, limit - len(hits)))
+            if len(hits) > limit:
+                hits = hits[:limit]
+                truncated = True
+                break
+        return SearchResult(
+            hits=hits,
+            truncated=truncated,
+            elapsed_ms=(time.perf_counter() - t0) * 1000,
+            indexing=[idx.root for idx in targets if not idx.ready],
+        )
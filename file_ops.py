@@ -1,106 +1,2622 @@
 from __future__ import annotations
 
+import bisect
+import errno
+import functools
+import hashlib
+import heapq
+import itertools
+import json
+import mmap
 import os
+import queue
 import shutil
+import sys
+import threading
 import time
 import stat
-from dataclasses import dataclass
-from typing import Callable, Optional
+import subprocess
+import zlib
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional
 from datetime import datetime
 
+from transfer_control import TransferCancelled, TransferControl
+
+
+class FileEntry:
+    """
+    目录中的一个条目，每个条目只 stat 一次；修改时间字符串在首次访问 modified 时才格式化
+    """
+
+    __slots__ = ('name', 'path', 'size', 'is_dir', 'is_hidden', 'mtime', '_modified')
+
+    def __init__(self, name: str, path: str, size: int, is_dir: bool, is_hidden: bool, mtime: float):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.is_dir = is_dir
+        self.is_hidden = is_hidden
+        self.mtime = mtime
+        self._modified: Optional[str] = None
+
+    @property
+    def modified(self) -> str:
+        if self._modified is None:
+            self._modified = format_mtime(self.mtime)
+        return self._modified
+
+    @property
+    def sort_key(self) -> tuple:
+        # 文件夹在前，文件在后，同类按名称（不区分大小写）
+        return (not self.is_dir, self.name.lower())
+
+    def __repr__(self) -> str:
+        return f"FileEntry({self.path!r}, size={self.size}, is_dir={self.is_dir})"
+
+
+def format_mtime(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _file_sort_key(f: FileEntry) -> tuple:
+    return f.sort_key
+
+
+# 目录列表缓存：(规范化路径, 是否显示隐藏) -> (目录 mtime_ns, 排好序的条目)
+# 目录 mtime 未变时复用上次结果；目录内文件被原地改写不会改变目录 mtime（FAT 上甚至增删也未必），
+# 所以本模块的写入/删除/拷贝操作完成后都会主动失效受影响的目录
+_LISTING_CACHE_MAX = 8
+_listing_cache: dict[tuple[str, bool], tuple[int, list[FileEntry]]] = {}
+_listing_lock = threading.Lock()
+# 每次失效加一；扫描开始后若发生过失效，扫描结果可能已过期，不写入缓存
+_listing_generation = 0
+
+
+def _listing_key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _dir_mtime_ns(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _cached_listing(path: str, show_hidden: bool) -> Optional[list[FileEntry]]:
+    key = (_listing_key(path), show_hidden)
+    with _listing_lock:
+        hit = _listing_cache.get(key)
+    if hit is None:
+        return None
+    if _dir_mtime_ns(path) != hit[0]:
+        with _listing_lock:
+            if _listing_cache.get(key) is hit:
+                del _listing_cache[key]
+        return None
+    return hit[1]
+
+
+def _store_listing(
+        path: str, show_hidden: bool, mtime_ns: Optional[int], generation: int, entries: list[FileEntry]
+) -> None:
+    if mtime_ns is None:
+        return
+    key = (_listing_key(path), show_hidden)
+    with _listing_lock:
+        if generation != _listing_generation:
+            return
+        _listing_cache.pop(key, None)
+        while len(_listing_cache) >= _LISTING_CACHE_MAX:
+            del _listing_cache[next(iter(_listing_cache))]
+        _listing_cache[key] = (mtime_ns, entries)
+
+
+def invalidate_listing(path: Optional[str] = None) -> None:
+    """
+    让包含 path 的各级目录的列表缓存失效；path 为 None 时清空全部（如 U 盘插拔后）
+    """
+    global _listing_generation
+    with _listing_lock:
+        _listing_generation += 1
+        if path is None:
+            _listing_cache.clear()
+            return
+        target = _listing_key(path)
+        for key in list(_listing_cache):
+            d = key[0]
+            if target == d or target.startswith(d.rstrip(os.sep) + os.sep):
+                del _listing_cache[key]
+
+
+# 本模块的写入/删除操作完成后以目标路径调用，供磁盘占用分析等做增量更新
+_change_listeners: list[Callable[[str], None]] = []
+
+
+def add_change_listener(fn: Callable[[str], None]) -> None:
+    _change_listeners.append(fn)
+
+
+def remove_change_listener(fn: Callable[[str], None]) -> None:
+    try:
+        _change_listeners.remove(fn)
+    except ValueError:
+        pass
+
+
+def _changed(path: str) -> None:
+    """
+    path 被本模块修改过：使列表缓存失效并通知监听者
+    """
+    invalidate_listing(path)
+    for fn in list(_change_listeners):
+        try:
+            fn(path)
+        except Exception:
+            pass
+
+
+def _invalidates_listing(arg_index: int, arg_name: str):
+    """
+    装饰写入类函数：无论成功、失败还是取消，结束后让目标路径所在目录的列表缓存失效并通知监听者
+    """
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                target = kwargs.get(arg_name, args[arg_index] if len(args) > arg_index else None)
+                for p in ([target] if isinstance(target, str) else target or ()):
+                    _changed(p)
+
+        return wrapper
+
+    return decorate
+
 
 def write_text(usb_root: str, relative_path: str, text: str, encoding: str = "utf-8") -> str:
     target = os.path.join(usb_root, relative_path)
-    os.makedirs(os.path.dirname(target) or usb_root, exist_ok=True)
-    with open(target, "w", encoding=encoding) as f:
-        f.write(text)
+    try:
+        os.makedirs(os.path.dirname(target) or usb_root, exist_ok=True)
+        with open(target, "w", encoding=encoding) as f:
+            f.write(text)
+    finally:
+        _changed(target)
     return target
 
 
-def delete_path(usb_root: str, relative_path: str) -> str:
+def delete_path(
+        usb_root: str,
+        relative_path: str,
+        on_progress: Optional[Callable[["DeleteProgress"], None]] = None,
+        workers: int = 4,
+        control: Optional[TransferControl] = None,
+) -> str:
     target = os.path.join(usb_root, relative_path)
     if os.path.isdir(target):
-        shutil.rmtree(target)
-    else:
-        os.remove(target)
+        # 指向目录的链接也交给 delete_tree，它只删除链接本身
+        delete_tree(target, on_progress=on_progress, workers=workers, control=control)
+        return target
+    try:
+        _unlink(target)
+    finally:
+        _changed(target)
     return target
 
 
-def list_files(drive_path: str, show_hidden: bool = True) -> list[dict]:
+def iter_files(
+        drive_path: str,
+        show_hidden: bool = True,
+        batch_size: int = 1000,
+        first_batch: int = 200,
+        cancel: Optional[threading.Event] = None,
+) -> Iterator[list[FileEntry]]:
     """
-    列出指定驱动器路径下的所有文件和目录。
+    按目录原始顺序分批产出条目，不排序、不格式化时间，
+    第一批较小以便尽快显示首屏；cancel 被置位时停止。
     """
-    files = []
+    batch = []
+    limit = first_batch
+    nt = os.name == 'nt'
     try:
-        # 使用 scandir 获取详细的文件信息
         with os.scandir(drive_path) as it:
             for entry in it:
-                # 判断是否为隐藏文件
-                is_hidden = False
+                if cancel is not None and cancel.is_set():
+                    return
                 try:
-                    if os.name == 'nt':
-                        is_hidden = bool(entry.stat().st_file_attributes & stat.FILE_ATTRIBUTE_HIDDEN)
-                    else:
-                        is_hidden = entry.name.startswith('.')
-                except (OSError, AttributeError):
-                    pass
-
-                # 过滤隐藏文件
+                    # 只 stat 一次（跟随符号链接，与 is_dir() 一致），目录/隐藏属性都从结果中取
+                    info = entry.stat()
+                except OSError:
+                    continue
+                if nt:
+                    is_hidden = bool(getattr(info, 'st_file_attributes', 0) & stat.FILE_ATTRIBUTE_HIDDEN)
+                else:
+                    is_hidden = entry.name.startswith('.')
                 if not show_hidden and is_hidden:
                     continue
+                is_dir = stat.S_ISDIR(info.st_mode)
+                batch.append(FileEntry(entry.name, entry.path, 0 if is_dir else info.st_size, is_dir, is_hidden,
+                                       info.st_mtime))
+                if len(batch) >= limit:
+                    yield batch
+                    batch = []
+                    limit = batch_size
+    except OSError:
+        pass
+    if batch:
+        yield batch
 
-                try:
-                    info = entry.stat()
-                    # 格式化时间
-                    mtime = datetime.fromtimestamp(info.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-
-                    files.append({
-                        'name': entry.name,
-                        'path': entry.path,
-                        'size': info.st_size if not entry.is_dir() else 0,
-                        'is_dir': entry.is_dir(),
-                        'is_hidden': is_hidden,
-                        'modified': mtime
-                    })
-                except (OSError, PermissionError):
-                    continue
 
-    except (FileNotFoundError, PermissionError, OSError):
-        pass
+def list_files(drive_path: str, show_hidden: bool = True) -> list[FileEntry]:
+    """
+    列出指定驱动器路径下的所有文件和目录（文件夹在前，文件在后）。
+    目录 mtime 未变且未被本模块的操作失效时直接返回缓存结果，只需一次 stat。
+    """
+    cached = _cached_listing(drive_path, show_hidden)
+    if cached is not None:
+        return list(cached)
+    generation = _listing_generation
+    mtime_ns = _dir_mtime_ns(drive_path)
+    files = [f for batch in iter_files(drive_path, show_hidden) for f in batch]
+    files.sort(key=_file_sort_key)
+    _store_listing(drive_path, show_hidden, mtime_ns, generation, files)
+    return list(files)
+
+
+class FileListing:
+    """
+    在后台线程中流式列出目录，按页提供排好序的条目：
+    - 目录 mtime 未变时直接使用缓存的列表（见 list_files），不再扫描；
+    - 扫描过程中只维护排序后的前 page_size 项，首屏无需等待整个目录；
+    - 扫描结束后做一次整体排序，之后可以翻到任意页；
+    - on_update(listing) 在后台线程中调用（首批、之后至多每 update_interval 秒一次、结束时），
+      调用方自行切换到 UI 线程；
+    - cancel() 让扫描尽快停止，已切换到其它目录时使用。
+    """
+
+    def __init__(
+            self,
+            path: str,
+            show_hidden: bool = True,
+            page_size: int = 500,
+            on_update: Optional[Callable[["FileListing"], None]] = None,
+            update_interval: float = 0.1,
+    ):
+        self.path = path
+        self.show_hidden = show_hidden
+        self.page_size = page_size
+        self.on_update = on_update
+        self.update_interval = update_interval
+        self.done = False
+        self.cached = False  # 结果来自目录列表缓存
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._entries: list[FileEntry] = []
+        self._head: list[FileEntry] = []
+        self._sorted = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def count(self) -> int:
+        return len(self._entries)
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-len(self._entries) // self.page_size))
 
-    # 排序：文件夹在前，文件在后
-    files.sort(key=lambda x: (not x['is_dir'], x['name'].lower()))
-    return files
+    def start(self) -> "FileListing":
+        if not os.path.isdir(self.path):
+            self.error = f"目录不存在：{self.path}"
+            self.done = True
+            self._notify()
+            return self
+        cached = _cached_listing(self.path, self.show_hidden)
+        if cached is not None:
+            self._entries = cached
+            self._sorted = True
+            self.cached = True
+            self.done = True
+            self._notify()
+            return self
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def page(self, index: int) -> list[FileEntry]:
+        """
+        返回第 index 页；扫描未结束时只有第 0 页可用，其余页返回空列表
+        """
+        with self._lock:
+            if self._sorted:
+                start = index * self.page_size
+                return self._entries[start:start + self.page_size]
+            return list(self._head) if index == 0 else []
+
+    def _notify(self) -> None:
+        if self.on_update is not None and not self._cancel.is_set():
+            self.on_update(self)
+
+    def _run(self) -> None:
+        last = 0.0
+        generation = _listing_generation
+        mtime_ns = _dir_mtime_ns(self.path)
+        try:
+            for batch in iter_files(self.path, self.show_hidden, cancel=self._cancel):
+                # 增量维护首页：已有首页与新一批合并后取最小的 page_size 项
+                head = heapq.nsmallest(self.page_size, itertools.chain(self._head, batch), key=_file_sort_key)
+                with self._lock:
+                    self._entries.extend(batch)
+                    self._head = head
+                now = time.monotonic()
+                if not last or now - last >= self.update_interval:
+                    last = now
+                    self._notify()
+            if self._cancel.is_set():
+                return
+            self._entries.sort(key=_file_sort_key)
+            with self._lock:
+                self._sorted = True
+                self._head = []
+            _store_listing(self.path, self.show_hidden, mtime_ns, generation, self._entries)
+        except Exception as e:
+            self.error = str(e)
+        self.done = True
+        self._notify()
 
 
 @dataclass
 class CopyProgress:
-    bytes_copied: int
+    bytes_copied: int  # 非 buffered 写入策略下只统计已确认落盘的字节
     total_bytes: int
     speed_bps: float
 
 
+@dataclass
+class CopyResult:
+    bytes_copied: int
+    elapsed_sec: float
+    engine: str  # 实际使用的拷贝引擎
+    chunk_size: int  # 实际使用（或自动调优锁定）的块大小
+    hash_algo: Optional[str] = None
+    digest: Optional[str] = None  # 源数据流的十六进制摘要
+    verified: bool = False  # 目标文件已绕过页缓存回读并与摘要比对一致
+    resumed_from: int = 0  # 断点续传时从该偏移继续，0 表示从头拷贝
+
+
+# 每写出一个分块调用一次：(字节数, 数据视图)；内核拷贝不经过用户态，数据视图为 None
+ChunkCallback = Callable[[int, Optional[memoryview]], None]
+
+# 可选的拷贝引擎："auto" 自动选择；"kernel" 内核零拷贝；"readinto" 复用缓冲区的用户态拷贝；
+# "pipelined" 读写线程分离、通过环形缓冲区流水线重叠读写
+COPY_ENGINES = ("auto", "kernel", "readinto", "pipelined")
+
+# 写入策略："buffered" 交给系统缓存；"periodic" 每 sync_interval 字节 fsync 一次；
+# "write_through" 每个分块都直写到设备（有 O_SYNC 时使用 O_SYNC，否则逐块 fsync）
+WRITE_POLICIES = ("buffered", "periodic", "write_through")
+
+# auto 模式下，超过该大小且没有内核拷贝可用时使用流水线拷贝
+_PIPELINE_MIN_BYTES = 32 * 1024 * 1024
+
+# 内核拷贝原语不可用时（跨文件系统、内核过旧、不支持的文件类型等）回退的 errno
+_KERNEL_FALLBACK_ERRNOS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.ENOTSOCK,
+    errno.ETXTBSY,
+    errno.EPERM,
+    errno.EBADF,
+}
+
+
+def _kernel_copy_primitives() -> list[str]:
+    """
+    返回当前平台可用的内核拷贝原语（按开销从低到高排序）
+    """
+    names = []
+    if hasattr(os, "copy_file_range"):
+        names.append("copy_file_range")
+    # 只有 Linux 的 sendfile 支持普通文件作为输出端
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        names.append("sendfile")
+    return names
+
+
+def _copy_kernel(src_fd: int, dst_fd: int, chunk_size: int, on_chunk: ChunkCallback) -> bool:
+    """
+    数据不经过用户态，由内核直接在两个文件描述符之间搬运。
+    返回 False 表示在拷贝任何数据之前就发现当前原语不可用，调用方应回退到用户态拷贝。
+    """
+    for name in _kernel_copy_primitives():
+        copied = 0
+        while True:
+            try:
+                if name == "copy_file_range":
+                    n = os.copy_file_range(src_fd, dst_fd, chunk_size)
+                else:
+                    n = os.sendfile(dst_fd, src_fd, None, chunk_size)
+            except OSError as e:
+                if copied == 0 and e.errno in _KERNEL_FALLBACK_ERRNOS:
+                    break
+                raise
+            if n == 0:
+                # 某些伪文件系统会直接返回 0，首块即为 0 时交给下一种方式确认是否真的到达 EOF
+                if copied == 0:
+                    break
+                return True
+            copied += n
+            on_chunk(n, None)
+    return False
+
+
+def _write_all(fdst, view: memoryview) -> None:
+    # 无缓冲的 FileIO.write 可能只写入部分数据
+    while view:
+        n = fdst.write(view)
+        view = view[n:]
+
+
+def _copy_readinto(
+        fsrc,
+        fdst,
+        chunk_size: int,
+        on_chunk: ChunkCallback,
+        view: Optional[memoryview] = None,
+) -> None:
+    """
+    复用同一块缓冲区读写，避免每个分块都分配新的 bytes 对象；调用方也可以传入自己的缓冲区
+    """
+    if view is None:
+        view = memoryview(bytearray(chunk_size))
+    while True:
+        n = fsrc.readinto(view)
+        if not n:
+            break
+        _write_all(fdst, view[:n])
+        on_chunk(n, view[:n])
+
+
+class _HashWorker:
+    """
+    在独立线程中计算摘要。hashlib 处理大块数据时会释放 GIL，因此可以与读写线程并行。
+    提交的缓冲区在摘要更新完成后通过 release 回调归还。
+    """
+
+    def __init__(self, algo: str):
+        self.algo = algo
+        self._h = hashlib.new(algo)
+        self._q: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="copy-hasher", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._q.get()
+            if item is None:
+                return
+            view, release = item
+            try:
+                self._h.update(view)
+            finally:
+                if release:
+                    release()
+
+    def submit(self, view: memoryview, release: Optional[Callable[[], None]] = None) -> None:
+        self._q.put((view, release))
+
+    def update_sync(self, view: memoryview) -> None:
+        # 调用方需要立即复用缓冲区时使用
+        done = threading.Event()
+        self.submit(view, done.set)
+        done.wait()
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._q.put(None)
+            self._thread.join()
+
+    def hexdigest(self) -> str:
+        self.close()
+        return self._h.hexdigest()
+
+
+def _copy_pipelined(
+        fsrc,
+        fdst,
+        chunk_size: int,
+        depth: int,
+        on_chunk: ChunkCallback,
+        hasher: Optional[_HashWorker] = None,
+) -> None:
+    """
+    读线程把数据读入预分配的环形缓冲区，调用线程负责写出，源盘读取与 U 盘写入可以重叠进行。
+    传入 hasher 时，缓冲区写出后交给摘要线程，摘要完成后才回到空闲队列。
+    读线程中的异常会转交给调用线程重新抛出。
+    """
+    bufs = [memoryview(bytearray(chunk_size)) for _ in range(max(depth, 2))]
+    free: queue.Queue = queue.Queue()
+    filled: queue.Queue = queue.Queue()
+    for i in range(len(bufs)):
+        free.put(i)
+    stop = threading.Event()
+
+    def reader() -> None:
+        try:
+            while True:
+                i = free.get()
+                if i is None or stop.is_set():
+                    return
+                n = fsrc.readinto(bufs[i])
+                if not n:
+                    filled.put(None)
+                    return
+                filled.put((i, n))
+        except BaseException as e:
+            filled.put(e)
+
+    t = threading.Thread(target=reader, name="copy-reader", daemon=True)
+    t.start()
+    try:
+        while True:
+            item = filled.get()
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            i, n = item
+            _write_all(fdst, bufs[i][:n])
+            # 必须在缓冲区归还之前回调，否则读线程可能已经覆盖了其中的数据
+            on_chunk(n, bufs[i][:n])
+            if hasher:
+                hasher.submit(bufs[i][:n], lambda i=i: free.put(i))
+            else:
+                free.put(i)
+    finally:
+        # 写端出错时通知读线程退出，避免其阻塞在空闲队列上
+        stop.set()
+        free.put(None)
+        t.join()
+
+
+# 块大小调优结果缓存，按 VID:PID 记录
+_TUNING_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".usb_lab_gui", "chunk_tuning.json")
+_tuning_lock = threading.Lock()
+
+# 不同 USB 版本的候选块大小，USB 2.0 设备带宽低，过大的块只会拉长单次写入延迟
+_TUNE_CANDIDATES_USB2 = (64 * 1024, 256 * 1024, 1024 * 1024)
+_TUNE_CANDIDATES_USB3 = (256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 8 * 1024 * 1024)
+
+
+def _load_tuning_cache(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+class ChunkTuner:
+    """
+    块大小自动调优：传输开始时依次试写几种块大小，锁定最快的一个，并按设备型号缓存到磁盘。
+    device_key 一般为 "VID:PID"，usb_version 为 usb_info 提取的版本字符串（如 "3.0"）。
+    """
+
+    def __init__(
+            self,
+            device_key: str,
+            usb_version: Optional[str] = None,
+            cache_path: str = _TUNING_CACHE_PATH,
+            probe_bytes: int = 8 * 1024 * 1024,
+            probe_sec: float = 1.0,
+    ):
+        self.device_key = device_key
+        self.usb_version = usb_version
+        self.cache_path = cache_path
+        self.probe_bytes = probe_bytes
+        self.probe_sec = probe_sec
+        self.last_probe: dict[int, float] = {}  # 块大小 -> 实测速率 (B/s)
+
+    def candidates(self) -> tuple[int, ...]:
+        if self.usb_version and self.usb_version.startswith("2"):
+            return _TUNE_CANDIDATES_USB2
+        return _TUNE_CANDIDATES_USB3
+
+    def cached_chunk_size(self) -> Optional[int]:
+        with _tuning_lock:
+            entry = _load_tuning_cache(self.cache_path).get(self.device_key)
+        if isinstance(entry, dict) and isinstance(entry.get("chunk_size"), int) and entry["chunk_size"] > 0:
+            return entry["chunk_size"]
+        return None
+
+    def record(self, chunk_size: int, speed_bps: float) -> None:
+        with _tuning_lock:
+            data = _load_tuning_cache(self.cache_path)
+            data[self.device_key] = {
+                "chunk_size": chunk_size,
+                "speed_bps": speed_bps,
+                "usb_version": self.usb_version,
+                "updated_at": time.time(),
+            }
+            try:
+                os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+                tmp = self.cache_path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=1)
+                os.replace(tmp, self.cache_path)
+            except OSError:
+                pass
+
+
+def _probe_chunk_sizes(
+        fsrc,
+        fdst,
+        tuner: ChunkTuner,
+        on_chunk: ChunkCallback,
+        hasher: Optional[_HashWorker] = None,
+) -> Optional[int]:
+    """
+    用每个候选块大小写一段数据并 fsync，计时包含落盘时间，避免测到的只是页缓存速度。
+    返回最快的块大小；若文件在探测阶段就已拷贝完毕则返回 None。
+    """
+    cands = tuner.candidates()
+    view = memoryview(bytearray(max(cands)))
+    tuner.last_probe = {}
+    for size in cands:
+        written = 0
+        t0 = time.perf_counter()
+        while written < tuner.probe_bytes:
+            n = fsrc.readinto(view[:size])
+            if not n:
+                return None
+            _write_all(fdst, view[:n])
+            if hasher:
+                hasher.update_sync(view[:n])
+            written += n
+            on_chunk(n, view[:n])
+            if time.perf_counter() - t0 >= tuner.probe_sec:
+                break
+        os.fsync(fdst.fileno())
+        tuner.last_probe[size] = written / max(time.perf_counter() - t0, 1e-6)
+
+    best = max(tuner.last_probe, key=tuner.last_probe.get)
+    tuner.record(best, tuner.last_probe[best])
+    return best
+
+
+_FILE_FLAG_NO_BUFFERING = 0x20000000
+_FILE_FLAG_SEQUENTIAL_SCAN = 0x08000000
+_ERROR_HANDLE_EOF = 38
+
+
+@functools.lru_cache(maxsize=None)
+def _overlapped_type():
+    import ctypes
+    from ctypes import wintypes
+
+    class OVERLAPPED(ctypes.Structure):
+        _fields_ = [
+            ("Internal", ctypes.c_size_t),
+            ("InternalHigh", ctypes.c_size_t),
+            ("Offset", wintypes.DWORD),
+            ("OffsetHigh", wintypes.DWORD),
+            ("hEvent", wintypes.HANDLE),
+        ]
+
+    return OVERLAPPED
+
+
+def _overlapped_at(offset: int):
+    """
+    构造指定读取偏移的 OVERLAPPED 结构；同步句柄上 ReadFile 按其中的偏移读取
+    """
+    return _overlapped_type()(0, 0, offset & 0xFFFFFFFF, offset >> 32, None)
+
+
+class UncachedReader:
+    """
+    绕过页缓存顺序读取文件，用于回读校验与测速：
+    - Linux 使用 O_DIRECT（mode="direct"）；
+    - Windows 使用 FILE_FLAG_NO_BUFFERING（mode="direct"）；
+    - 文件系统不支持时，先 posix_fadvise(DONTNEED) 丢弃缓存页再读（mode="dontneed"），
+      再不行则为普通读取（mode="cached"）。
+    缓冲区由 mmap 分配，天然按页对齐，满足直接 IO 的对齐要求。
+    """
+
+    def __init__(self, path: str, chunk_size: int = 1024 * 1024):
+        self.path = path
+        self.chunk_size = max(mmap.PAGESIZE, chunk_size - chunk_size % mmap.PAGESIZE)
+        self._buf = mmap.mmap(-1, self.chunk_size)
+        self._fd: Optional[int] = None
+        self._handle = None
+        self._addr = None
+        if os.name == "nt":
+            self._open_windows()
+        else:
+            self._open_posix()
+
+    def _open_posix(self) -> None:
+        if hasattr(os, "O_DIRECT"):
+            try:
+                self._fd = os.open(self.path, os.O_RDONLY | os.O_DIRECT)
+                self.mode = "direct"
+                return
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+        self._fd = os.open(self.path, os.O_RDONLY)
+        self.mode = "cached"
+        if hasattr(os, "posix_fadvise"):
+            try:
+                os.posix_fadvise(self._fd, 0, 0, os.POSIX_FADV_DONTNEED)
+                self.mode = "dontneed"
+            except OSError:
+                pass
+
+    def _open_windows(self) -> None:
+        import ctypes
+        from ctypes import wintypes
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.CreateFileW.restype = wintypes.HANDLE
+        kernel32.CreateFileW.argtypes = [
+            wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID,
+            wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE,
+        ]
+        kernel32.ReadFile.argtypes = [
+            wintypes.HANDLE, wintypes.LPVOID, wintypes.DWORD, ctypes.POINTER(wintypes.DWORD), wintypes.LPVOID,
+        ]
+        kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+
+        # GENERIC_READ, FILE_SHARE_READ | FILE_SHARE_WRITE, OPEN_EXISTING
+        handle = kernel32.CreateFileW(
+            self.path, 0x80000000, 0x3, None, 3,
+            _FILE_FLAG_NO_BUFFERING | _FILE_FLAG_SEQUENTIAL_SCAN, None,
+        )
+        if handle is None or handle == wintypes.HANDLE(-1).value:
+            raise ctypes.WinError(ctypes.get_last_error())
+        self._kernel32 = kernel32
+        self._handle = handle
+        self._addr = ctypes.c_char.from_buffer(self._buf)
+        self.mode = "direct"
+
+    def _read_once(self) -> int:
+        if self._handle is not None:
+            import ctypes
+            from ctypes import wintypes
+
+            n = wintypes.DWORD(0)
+            ok = self._kernel32.ReadFile(
+                self._handle, ctypes.addressof(self._addr), self.chunk_size, ctypes.byref(n), None,
+            )
+            if not ok:
+                raise ctypes.WinError(ctypes.get_last_error())
+            return n.value
+        return os.readv(self._fd, [self._buf])
+
+    def read_at(self, offset: int, length: Optional[int] = None) -> int:
+        """
+        从 offset 处读取至多 length（默认 chunk_size）字节到内部缓冲区，返回读到的字节数（文件末尾为 0）。
+        不改变顺序读取的位置；直接 IO 模式下 offset 与 length 须按扇区对齐。
+        """
+        length = self.chunk_size if length is None else min(length, self.chunk_size)
+        if self._handle is not None:
+            import ctypes
+            from ctypes import wintypes
+
+            n = wintypes.DWORD(0)
+            ov = _overlapped_at(offset)
+            ok = self._kernel32.ReadFile(
+                self._handle, ctypes.addressof(self._addr), length, ctypes.byref(n), ctypes.byref(ov),
+            )
+            if not ok:
+                err = ctypes.get_last_error()
+                if err == _ERROR_HANDLE_EOF:
+                    return 0
+                raise ctypes.WinError(err)
+            return n.value
+        view = memoryview(self._buf)[:length]
+        try:
+            if hasattr(os, "preadv"):
+                return os.preadv(self._fd, [view], offset)
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            return os.readv(self._fd, [view])
+        finally:
+            view.release()
+
+    def read_chunks(self) -> Iterator[memoryview]:
+        """
+        依次产出文件内容；产出的视图指向内部缓冲区，下一次迭代前有效
+        """
+        view = memoryview(self._buf)
+        try:
+            while True:
+                n = self._read_once()
+                if not n:
+                    return
+                yield view[:n]
+        finally:
+            view.release()
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._kernel32.CloseHandle(self._handle)
+            self._handle = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._addr = None
+        try:
+            self._buf.close()
+        except BufferError:
+            # 调用方仍持有 read_chunks 产出的视图，缓冲区交由垃圾回收释放
+            pass
+
+    def __enter__(self) -> "UncachedReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def hash_file_uncached(path: str, algo: str = "sha256", chunk_size: int = 1024 * 1024) -> str:
+    """
+    绕过页缓存读取文件并计算摘要，确保读到的是设备上的实际数据
+    """
+    h = hashlib.new(algo)
+    with UncachedReader(path, chunk_size) as r:
+        for view in r.read_chunks():
+            h.update(view)
+    return h.hexdigest()
+
+
+def _fsync_dir(path: str) -> None:
+    """
+    POSIX 上新建文件后还需 fsync 所在目录，目录项才算落盘；Windows 不支持也不需要
+    """
+    if os.name == "nt":
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _journal_path(dst_file: str) -> str:
+    return dst_file + ".resume.json"
+
+
+def _read_prefix(path: str, length: int, chunk_size: int, fn: Callable[[memoryview], None]) -> None:
+    """
+    顺序读取文件的前 length 字节，逐块交给 fn；文件不足 length 时抛出 EOFError
+    """
+    view = memoryview(bytearray(chunk_size))
+    remaining = length
+    with open(path, "rb", buffering=0) as f:
+        while remaining > 0:
+            n = f.readinto(view[:min(chunk_size, remaining)])
+            if not n:
+                raise EOFError(path)
+            fn(view[:n])
+            remaining -= n
+
+
+def _load_resume_point(src_file: str, dst_file: str, st: os.stat_result, chunk_size: int) -> tuple[int, int]:
+    """
+    读取断点日志，确认源文件未变化并重新计算目标文件前缀的 CRC32，
+    返回可续传的 (偏移, 前缀 CRC32)；任何一项不符都返回 (0, 0) 从头拷贝。
+    """
+    try:
+        with open(_journal_path(dst_file), "r", encoding="utf-8") as f:
+            j = json.load(f)
+        offset = int(j["offset"])
+        if (
+                j["src"] != os.path.abspath(src_file)
+                or j["src_size"] != st.st_size
+                or j["src_mtime_ns"] != st.st_mtime_ns
+                or not 0 < offset <= st.st_size
+                or os.path.getsize(dst_file) < offset
+        ):
+            return 0, 0
+
+        crc = 0
+
+        def update(view: memoryview) -> None:
+            nonlocal crc
+            crc = zlib.crc32(view, crc)
+
+        _read_prefix(dst_file, offset, chunk_size, update)
+        return (offset, crc) if crc == int(j["crc32"]) else (0, 0)
+    except (OSError, EOFError, ValueError, KeyError, TypeError):
+        return 0, 0
+
+
+def _write_journal(src_file: str, dst_file: str, st: os.stat_result, offset: int, crc: int) -> None:
+    path = _journal_path(dst_file)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "src": os.path.abspath(src_file),
+            "src_size": st.st_size,
+            "src_mtime_ns": st.st_mtime_ns,
+            "offset": offset,
+            "crc32": crc,
+        }, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# FAT32 单个文件最大 4 GiB - 1 字节
+FAT32_MAX_FILE_SIZE = 4 * 1024 * 1024 * 1024 - 1
+
+_FAT_FS_TYPES = {"fat", "fat12", "fat16", "fat32", "vfat", "msdos"}
+
+# fallocate(2) 的 FALLOC_FL_KEEP_SIZE：只分配空间，不改变文件长度
+_FALLOC_FL_KEEP_SIZE = 0x01
+# SetFileInformationByHandle 的 FileAllocationInfo：同样只分配簇，不移动文件末尾（EOF）
+_FILE_ALLOCATION_INFO_CLASS = 5
+_ERROR_DISK_FULL = 112
+
+
+@dataclass
+class TransferPlan:
+    bytes_needed: int  # 按簇对齐后需要新占用的空间（已扣除被覆盖的旧文件）
+    free_bytes: int
+    fs_type: Optional[str]  # 目标卷的文件系统，如 "FAT32"/"exFAT"/"NTFS"/"vfat"，未知为 None
+    cluster_size: int
+    oversized: list[str]  # 超出文件系统单文件大小上限的文件
+
+    @property
+    def fits(self) -> bool:
+        return not self.oversized and self.bytes_needed <= self.free_bytes
+
+    def check(self) -> None:
+        """
+        放不下时抛出 OSError：单文件超限为 EFBIG，空间不足为 ENOSPC
+        """
+        if self.oversized:
+            names = "、".join(self.oversized[:3]) + (" 等" if len(self.oversized) > 3 else "")
+            raise OSError(errno.EFBIG, f"{self.fs_type} 不支持大于 4 GiB 的文件：{names}")
+        if self.bytes_needed > self.free_bytes:
+            raise OSError(
+                errno.ENOSPC,
+                f"目标空间不足：需要 {self.bytes_needed / (1024 * 1024):.1f} MB，"
+                f"可用 {self.free_bytes / (1024 * 1024):.1f} MB",
+            )
+
+
+def _existing_ancestor(path: str) -> str:
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def _volume_info_windows(path: str) -> tuple[Optional[str], int]:
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    root = ctypes.create_unicode_buffer(261)
+    if not kernel32.GetVolumePathNameW(path, root, len(root)):
+        return None, 0
+    fs_name = ctypes.create_unicode_buffer(261)
+    fs_type = None
+    if kernel32.GetVolumeInformationW(root.value, None, 0, None, None, None, fs_name, len(fs_name)):
+        fs_type = fs_name.value
+    spc, bps, free_clusters, total_clusters = (wintypes.DWORD() for _ in range(4))
+    cluster = 0
+    if kernel32.GetDiskFreeSpaceW(
+            root.value, ctypes.byref(spc), ctypes.byref(bps), ctypes.byref(free_clusters), ctypes.byref(total_clusters)
+    ):
+        cluster = spc.value * bps.value
+    return fs_type, cluster
+
+
+def _mount_fs_type(path: str) -> Optional[str]:
+    """
+    在 /proc/mounts 中找到包含 path 的最长挂载点，返回其文件系统类型
+    """
+    path = os.path.realpath(path)
+    best, fs_type = "", None
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mnt = parts[1].replace("\\040", " ")
+                if (path == mnt or path.startswith(mnt.rstrip("/") + "/")) and len(mnt) > len(best):
+                    best, fs_type = mnt, parts[2]
+    except OSError:
+        return None
+    return fs_type
+
+
+def get_volume_info(path: str) -> tuple[int, Optional[str], int]:
+    """
+    返回 path 所在卷的 (可用字节数, 文件系统类型, 簇大小)；path 不存在时取最近的已存在上级目录
+    """
+    path = _existing_ancestor(path)
+    free = shutil.disk_usage(path).free
+    if os.name == "nt":
+        fs_type, cluster = _volume_info_windows(path)
+    else:
+        fs_type = _mount_fs_type(path)
+        try:
+            cluster = os.statvfs(path).f_bsize
+        except OSError:
+            cluster = 0
+    return free, fs_type, cluster or 4096
+
+
+def get_volume_serial(path: str) -> Optional[str]:
+    """
+    返回 path 所在卷的序列号（十六进制字符串），重新插拔或换盘符后不变；
+    非 Windows 平台没有卷序列号，退而使用设备号
+    """
+    if os.name == "nt":
+        import ctypes
+        from ctypes import wintypes
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        root = ctypes.create_unicode_buffer(261)
+        if not kernel32.GetVolumePathNameW(path, root, len(root)):
+            return None
+        serial = wintypes.DWORD()
+        if not kernel32.GetVolumeInformationW(root.value, None, 0, ctypes.byref(serial), None, None, None, 0):
+            return None
+        return f"{serial.value:08X}"
+    try:
+        return f"dev-{os.stat(path).st_dev:x}"
+    except OSError:
+        return None
+
+
+def plan_transfer(
+        dst_dir: str,
+        files: list[tuple[str, int]],
+        existing: Optional[dict] = None,
+        reclaim_bytes: int = 0,
+) -> TransferPlan:
+    """
+    在写入任何数据之前估算一批文件放到 dst_dir 下需要的空间。
+    files 为 [(相对路径, 大小)]；每个文件按簇大小向上取整。
+    目标位置已有同名文件时视为覆盖，扣除其占用；existing 可直接给出 {相对路径: 旧文件大小}
+    以免逐个 stat U 盘上的文件。reclaim_bytes 为写入前会先删除的空间（如同步时删除的旧文件）。
+    目标是 FAT 文件系统时，超过 4 GiB 的文件记入 oversized。
+    """
+    free, fs_type, cluster = get_volume_info(dst_dir)
+
+    def on_disk(size: int) -> int:
+        return -(-size // cluster) * cluster
+
+    scan_dst = existing is None and os.path.isdir(dst_dir)
+    is_fat = (fs_type or "").lower() in _FAT_FS_TYPES
+    needed = 0
+    oversized = []
+    for rel, size in files:
+        needed += on_disk(size)
+        if is_fat and size > FAT32_MAX_FILE_SIZE:
+            oversized.append(rel)
+        old = existing.get(rel) if existing is not None else None
+        if scan_dst:
+            try:
+                old = os.path.getsize(os.path.join(dst_dir, rel))
+            except OSError:
+                old = None
+        if old:
+            needed -= on_disk(old)
+    return TransferPlan(
+        bytes_needed=max(needed - reclaim_bytes, 0),
+        free_bytes=free,
+        fs_type=fs_type,
+        cluster_size=cluster,
+        oversized=oversized,
+    )
+
+
+def _preallocate(fd: int, offset: int, length: int) -> bool:
+    """
+    为目标文件一次性分配 [offset, offset + length) 的空间，减少边写边扩展造成的碎片。
+    Linux 使用 fallocate(FALLOC_FL_KEEP_SIZE)：只分配不改长度，且不像 posix_fallocate 那样
+    在不支持的文件系统（如 vfat）上退化为逐块写零；Windows 用 FileAllocationInfo 设置分配大小，
+    同样不移动 EOF。两者都不改变文件长度，出错、拔出或取消时目标文件只包含实际写入的字节，
+    多分配的簇在关闭文件时由文件系统回收。其他平台不做预分配。
+    """
+    if length <= 0:
+        return False
+    if os.name == "nt":
+        import ctypes
+        import msvcrt
+        from ctypes import wintypes
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.SetFileInformationByHandle.argtypes = [
+            wintypes.HANDLE, ctypes.c_int, wintypes.LPVOID, wintypes.DWORD,
+        ]
+        size = ctypes.c_longlong(offset + length)  # FILE_ALLOCATION_INFO 只有一个 LARGE_INTEGER
+        if kernel32.SetFileInformationByHandle(
+                msvcrt.get_osfhandle(fd), _FILE_ALLOCATION_INFO_CLASS, ctypes.byref(size), ctypes.sizeof(size)
+        ):
+            return True
+        if ctypes.get_last_error() == _ERROR_DISK_FULL:
+            raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+        return False
+    if sys.platform.startswith("linux"):
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        fallocate = getattr(libc, "fallocate64", None) or getattr(libc, "fallocate", None)
+        if fallocate is None:
+            return False
+        fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+        if fallocate(fd, _FALLOC_FL_KEEP_SIZE, offset, length) == 0:
+            return True
+        err = ctypes.get_errno()
+        if err == errno.ENOSPC:
+            raise OSError(err, os.strerror(err))
+    return False
+
+
+def _save_resume_point(src_file: str, dst_file: str, st: os.stat_result, offset: int, crc: int, start: int) -> None:
+    """
+    取消可续传的拷贝时调用：把 offset 之前的数据落盘并写入断点日志；
+    失败时保留上一个检查点的日志，下次从那里继续
+    """
+    if offset <= start:
+        return
+    try:
+        with open(dst_file, "r+b", buffering=0) as f:
+            os.fsync(f.fileno())
+        _write_journal(src_file, dst_file, st, offset, crc)
+    except OSError:
+        pass
+
+
+def _remove_partial(dst_file: str, with_journal: bool = False) -> None:
+    """
+    取消后清理不完整的目标文件（及其断点日志）
+    """
+    paths = [dst_file, _journal_path(dst_file)] if with_journal else [dst_file]
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+@_invalidates_listing(1, "dst_file")
 def copy_with_progress(
         src_file: str,
         dst_file: str,
         chunk_size: int = 1024 * 1024,
         on_progress: Optional[Callable[[CopyProgress], None]] = None,
-) -> None:
-    total = os.path.getsize(src_file)
-    copied = 0
+        engine: str = "auto",
+        pipeline_depth: int = 4,
+        tuner: Optional[ChunkTuner] = None,
+        hash_algo: Optional[str] = None,
+        verify: bool = False,
+        resume: bool = False,
+        checkpoint_bytes: int = 64 * 1024 * 1024,
+        write_policy: str = "buffered",
+        sync_interval: int = 32 * 1024 * 1024,
+        control: Optional[TransferControl] = None,
+        preflight: bool = True,
+        preallocate: bool = True,
+) -> CopyResult:
+    """
+    带进度回调的文件拷贝。
+    engine="auto" 时优先使用内核零拷贝（Linux 的 copy_file_range/sendfile），
+    不可用时大文件使用流水线拷贝（pipeline_depth 个 chunk_size 大小的缓冲区），
+    小文件使用复用缓冲区的 readinto 拷贝。
+    传入 tuner 时忽略 chunk_size：有缓存结果直接使用，否则先探测再锁定最快的块大小。
+    hash_algo（hashlib 算法名，如 "sha256"/"blake2b"）会在独立线程中对源数据流计算摘要，
+    此时数据必须经过用户态，因此总是使用流水线引擎；verify=True 时拷贝结束后
+    绕过页缓存回读目标文件并比对摘要（未指定算法时默认 sha256），不一致抛出 OSError(EIO)。
+    resume=True 时每 checkpoint_bytes 把目标文件 fsync 并在旁边的 .resume.json 中记录
+    已落盘偏移与前缀 CRC32；再次拷贝同一对文件时校验前缀后从断点继续，完成后删除日志。
+    write_policy 为 "periodic"/"write_through" 时，进度与速率只统计已确认落盘的字节，
+    函数返回即表示数据已在设备上，可以安全拔出。
+    control 用于暂停/取消与限速：每个分块后调用 control.checkpoint；取消时（包括进度回调
+    抛出 TransferCancelled）resume=True 的拷贝把已写入部分落盘并记下断点，保留目标文件与日志，
+    下次从这里继续；resume=False 或以 control.cancel(discard=True) 取消时删除不完整的目标文件
+    与断点日志。最后把异常抛给调用方。
+    preflight=True 时在打开目标前检查剩余空间与 FAT32 4 GiB 限制，放不下立即抛出 OSError
+    （ENOSPC/EFBIG）；preallocate=True 时先为目标文件一次性分配空间，减少碎片。
+    """
+    if engine not in COPY_ENGINES:
+        raise ValueError(f"未知的拷贝引擎：{engine}")
+    if write_policy not in WRITE_POLICIES:
+        raise ValueError(f"未知的写入策略：{write_policy}")
+    if verify and not hash_algo:
+        hash_algo = "sha256"
+    if hash_algo:
+        hashlib.new(hash_algo)  # 提前校验算法名
+    # 摘要与断点 CRC 都需要读到数据本身，内核拷贝不满足
+    user_space = bool(hash_algo) or resume
+    if engine == "kernel" and user_space:
+        raise ValueError("内核拷贝引擎不经过用户态，无法同时计算摘要或断点校验")
+
+    st = os.stat(src_file)
+    total = st.st_size
+    if preflight:
+        plan_transfer(os.path.dirname(dst_file) or ".", [(os.path.basename(dst_file), total)]).check()
+    start_offset, crc = _load_resume_point(src_file, dst_file, st, chunk_size) if resume else (0, 0)
+    copied = start_offset
+    durable = start_offset  # 已确认落盘的字节数
+    next_checkpoint = start_offset + checkpoint_bytes
+    o_sync = getattr(os, "O_SYNC", 0) if write_policy == "write_through" else 0
     t0 = time.time()
 
+    def report(done: int) -> None:
+        if on_progress:
+            dt = max(time.time() - t0, 1e-6)
+            speed = (done - start_offset) / dt
+            on_progress(CopyProgress(bytes_copied=done, total_bytes=total, speed_bps=speed))
+
+    def sync_now() -> None:
+        nonlocal durable
+        os.fsync(fdst.fileno())
+        durable = copied
+
+    def on_chunk(n: int, data: Optional[memoryview]) -> None:
+        nonlocal copied, crc, next_checkpoint, durable
+        if control is not None:
+            control.checkpoint(n)
+        copied += n
+        if resume:
+            crc = zlib.crc32(data, crc)
+            if copied >= next_checkpoint:
+                # 先落盘再记录偏移，日志中的偏移之前的数据一定已经在设备上
+                sync_now()
+                _write_journal(src_file, dst_file, st, copied, crc)
+                next_checkpoint = copied + checkpoint_bytes
+
+        if write_policy == "buffered":
+            report(copied)
+            return
+        before = durable
+        if write_policy == "write_through":
+            if o_sync:
+                durable = copied
+            else:
+                sync_now()
+        elif copied - durable >= sync_interval:
+            sync_now()
+        if durable != before:
+            report(durable)
+
+    def open_dst(path: str, flags: int) -> int:
+        return os.open(path, flags | o_sync, 0o666)
+
     os.makedirs(os.path.dirname(dst_file) or ".", exist_ok=True)
 
-    with open(src_file, "rb") as fsrc, open(dst_file, "wb") as fdst:
+    if control is not None:
+        control.checkpoint()
+    hasher = _HashWorker(hash_algo) if hash_algo else None
+    try:
+        if hasher and start_offset:
+            # 续传时摘要仍需覆盖整个源文件，先补上已拷贝部分
+            _read_prefix(src_file, start_offset, chunk_size, hasher.update_sync)
+
+        # 使用无缓冲的 FileIO，保证内核拷贝与用户态拷贝共享同一个文件位置
+        with open(src_file, "rb", buffering=0) as fsrc, \
+                open(dst_file, "r+b" if start_offset else "wb", buffering=0, opener=open_dst) as fdst:
+            if start_offset:
+                fdst.truncate(start_offset)
+                fdst.seek(start_offset)
+                fsrc.seek(start_offset)
+            if preallocate:
+                _preallocate(fdst.fileno(), start_offset, total - start_offset)
+
+            used = "readinto"
+            finished = False
+            if tuner is not None:
+                cached = tuner.cached_chunk_size()
+                if cached:
+                    chunk_size = cached
+                else:
+                    best = _probe_chunk_sizes(fsrc, fdst, tuner, on_chunk, hasher)
+                    if best is None:
+                        # 文件小于探测所需数据量，探测过程已完成整个拷贝
+                        used, finished = "probe", True
+                    else:
+                        chunk_size = best
+
+            if finished:
+                pass
+            elif not user_space and engine in ("auto", "kernel") and \
+                    _copy_kernel(fsrc.fileno(), fdst.fileno(), chunk_size, on_chunk):
+                used = "kernel"
+            elif engine == "kernel" and total > copied:
+                raise OSError(errno.ENOTSUP, "当前平台或文件系统不支持内核拷贝", dst_file)
+            elif hasher is not None or engine == "pipelined" or \
+                    (engine == "auto" and total - copied >= _PIPELINE_MIN_BYTES):
+                used = "pipelined"
+                _copy_pipelined(fsrc, fdst, chunk_size, pipeline_depth, on_chunk, hasher)
+            else:
+                _copy_readinto(fsrc, fdst, chunk_size, on_chunk)
+
+            if verify or write_policy != "buffered":
+                # 回读校验或报告完成前确保数据已写到设备上
+                if durable != copied:
+                    sync_now()
+                    if write_policy != "buffered":
+                        report(durable)
+
+        digest = hasher.hexdigest() if hasher else None
+    except TransferCancelled:
+        if resume and not (control is not None and control.discard):
+            _save_resume_point(src_file, dst_file, st, copied, crc, start_offset)
+        else:
+            _remove_partial(dst_file, resume)
+        raise
+    finally:
+        if hasher:
+            hasher.close()
+
+    if write_policy != "buffered":
+        _fsync_dir(os.path.dirname(dst_file) or ".")
+
+    if resume:
+        try:
+            os.remove(_journal_path(dst_file))
+        except FileNotFoundError:
+            pass
+
+    verified = False
+    if verify:
+        actual = hash_file_uncached(dst_file, hash_algo, chunk_size)
+        if actual != digest:
+            raise OSError(errno.EIO, f"拷贝校验失败：源 {hash_algo}={digest}，目标 {hash_algo}={actual}", dst_file)
+        verified = True
+
+    return CopyResult(
+        bytes_copied=copied,
+        elapsed_sec=time.time() - t0,
+        engine=used,
+        chunk_size=chunk_size,
+        hash_algo=hash_algo,
+        digest=digest,
+        verified=verified,
+        resumed_from=start_offset,
+    )
+
+
+@dataclass
+class TreeCopyProgress:
+    files_done: int
+    files_total: int
+    bytes_done: int
+    bytes_total: int
+    speed_bps: float
+    eta_sec: Optional[float]
+
+
+@dataclass
+class TreeCopyResult:
+    files_copied: int
+    bytes_copied: int
+    elapsed_sec: float
+
+
+def _scan_tree(src_dir: str) -> tuple[list[str], list[tuple[str, int, int]]]:
+    """
+    用 os.scandir 遍历目录树，返回 (相对目录列表, [(相对文件路径, 大小, mtime_ns)])
+    """
+    dirs: list[str] = []
+    files: list[tuple[str, int, int]] = []
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        with os.scandir(os.path.join(src_dir, rel) if rel else src_dir) as it:
+            for entry in it:
+                entry_rel = os.path.join(rel, entry.name) if rel else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry_rel)
+                    stack.append(entry_rel)
+                elif entry.is_file():
+                    st = entry.stat()
+                    files.append((entry_rel, st.st_size, st.st_mtime_ns))
+    return dirs, files
+
+
+class _TreeProgressTracker:
+    """
+    汇总多个线程的拷贝进度，并按 report_interval 节流回调，避免 UI 收到过多事件
+    """
+
+    def __init__(
+            self,
+            files_total: int,
+            bytes_total: int,
+            on_progress: Optional[Callable[[TreeCopyProgress], None]],
+            report_interval: float,
+    ):
+        self.files_total = files_total
+        self.bytes_total = bytes_total
+        self.files_done = 0
+        self.bytes_done = 0
+        self.on_progress = on_progress
+        self.report_interval = report_interval
+        self.t0 = time.time()
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, n_bytes: int = 0, n_files: int = 0) -> None:
+        with self._lock:
+            self.bytes_done += n_bytes
+            self.files_done += n_files
+            now = time.time()
+            if now - self._last_report < self.report_interval:
+                return
+            self._last_report = now
+            p = self._snapshot(now)
+        if self.on_progress:
+            self.on_progress(p)
+
+    def finish(self) -> None:
+        with self._lock:
+            p = self._snapshot(time.time())
+        if self.on_progress:
+            self.on_progress(p)
+
+    def _snapshot(self, now: float) -> TreeCopyProgress:
+        speed = self.bytes_done / max(now - self.t0, 1e-6)
+        eta = (self.bytes_total - self.bytes_done) / speed if speed > 0 else None
+        return TreeCopyProgress(
+            files_done=self.files_done,
+            files_total=self.files_total,
+            bytes_done=self.bytes_done,
+            bytes_total=self.bytes_total,
+            speed_bps=speed,
+            eta_sec=eta,
+        )
+
+
+_small_copy_local = threading.local()
+
+
+def _copy_small_file(src_file: str, dst_file: str, buf_size: int, durable: bool = False) -> None:
+    # 每个工作线程复用一块缓冲区
+    view = getattr(_small_copy_local, "view", None)
+    if view is None or len(view) < buf_size:
+        view = memoryview(bytearray(buf_size))
+        _small_copy_local.view = view
+    with open(src_file, "rb", buffering=0) as fsrc, open(dst_file, "wb", buffering=0) as fdst:
+        _copy_readinto(fsrc, fdst, buf_size, lambda n, data: None, view=view)
+        if durable:
+            os.fsync(fdst.fileno())
+
+
+@_invalidates_listing(1, "dst_dir")
+def copy_tree(
+        src_dir: str,
+        dst_dir: str,
+        on_progress: Optional[Callable[[TreeCopyProgress], None]] = None,
+        small_file_threshold: int = 1024 * 1024,
+        workers: int = 4,
+        report_interval: float = 0.1,
+        tuner: Optional[ChunkTuner] = None,
+        write_policy: str = "buffered",
+        control: Optional[TransferControl] = None,
+        preflight: bool = True,
+        sync_interval: int = 32 * 1024 * 1024,
+) -> TreeCopyResult:
+    """
+    递归拷贝目录树。大文件在调用线程中逐个走 copy_with_progress，
+    小文件交给有界线程池并发拷贝，以掩盖逐个打开/关闭文件的延迟。
+    on_progress 收到的是汇总进度，最多每 report_interval 秒回调一次（结束时必回调一次）。
+    write_policy、sync_interval 含义同 copy_with_progress；非 buffered 时小文件在关闭前逐个 fsync。
+    control 同时作用于所有文件；取消时已完成的文件保留，正在拷贝的大文件被删除。
+    preflight=True 时先按 plan_transfer 检查整批文件能否放下，放不下时不写入任何数据。
+    """
+    dirs, files = _scan_tree(src_dir)
+    if preflight:
+        plan_transfer(dst_dir, [(rel, size) for rel, size, _ in files]).check()
+    return _copy_file_list(
+        src_dir, dst_dir, dirs, files, on_progress, small_file_threshold, workers, report_interval, tuner,
+        write_policy, control, sync_interval,
+    )
+
+
+def _copy_file_list(
+        src_dir: str,
+        dst_dir: str,
+        dirs: list[str],
+        files: list[tuple[str, int, int]],
+        on_progress: Optional[Callable[[TreeCopyProgress], None]],
+        small_file_threshold: int,
+        workers: int,
+        report_interval: float,
+        tuner: Optional[ChunkTuner],
+        write_policy: str = "buffered",
+        control: Optional[TransferControl] = None,
+        sync_interval: int = 32 * 1024 * 1024,
+) -> TreeCopyResult:
+    """
+    copy_tree / sync_tree 共用：按 _scan_tree 的格式拷贝给定的目录与文件，并保留修改时间。
+    容量检查由调用方整批完成，这里的单文件拷贝不再重复检查。
+    """
+    tracker = _TreeProgressTracker(
+        files_total=len(files),
+        bytes_total=sum(size for _, size, _ in files),
+        on_progress=on_progress,
+        report_interval=report_interval,
+    )
+
+    os.makedirs(dst_dir, exist_ok=True)
+    for rel in dirs:
+        os.makedirs(os.path.join(dst_dir, rel), exist_ok=True)
+
+    def copy_small(rel: str, size: int, mtime_ns: int) -> None:
+        if control is not None:
+            # 小文件整体申请令牌后再拷贝，取消时不会留下半个文件
+            control.checkpoint(size)
+        dst = os.path.join(dst_dir, rel)
+        _copy_small_file(os.path.join(src_dir, rel), dst, small_file_threshold, write_policy != "buffered")
+        os.utime(dst, ns=(mtime_ns, mtime_ns))
+        tracker.add(n_bytes=size, n_files=1)
+
+    pending: set = set()
+    max_pending = max(workers, 1) * 4
+
+    def drain(return_when) -> None:
+        nonlocal pending
+        done, pending = wait(pending, return_when=return_when)
+        for f in done:
+            f.result()
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="copy-tree") as pool:
+        try:
+            for rel, size, mtime_ns in files:
+                if control is not None:
+                    control.checkpoint()
+                if size < small_file_threshold:
+                    if len(pending) >= max_pending:
+                        drain(FIRST_COMPLETED)
+                    pending.add(pool.submit(copy_small, rel, size, mtime_ns))
+                    continue
+
+                last = 0
+
+                def on_file_progress(p: CopyProgress) -> None:
+                    nonlocal last
+                    tracker.add(n_bytes=p.bytes_copied - last)
+                    last = p.bytes_copied
+
+                dst = os.path.join(dst_dir, rel)
+                copy_with_progress(
+                    os.path.join(src_dir, rel), dst, on_progress=on_file_progress, tuner=tuner,
+                    write_policy=write_policy, sync_interval=sync_interval, control=control, preflight=False,
+                )
+                os.utime(dst, ns=(mtime_ns, mtime_ns))
+                tracker.add(n_bytes=size - last, n_files=1)
+
+            if pending:
+                drain(ALL_COMPLETED)
+        except BaseException:
+            for f in pending:
+                f.cancel()
+            raise
+
+    tracker.finish()
+    return TreeCopyResult(
+        files_copied=tracker.files_done,
+        bytes_copied=tracker.bytes_done,
+        elapsed_sec=time.time() - tracker.t0,
+    )
+
+
+@dataclass
+class DuplicateResult:
+    dst_file: str
+    bytes_copied: int
+    elapsed_sec: float
+    error: Optional[str] = None  # None 表示成功
+    detached: bool = False  # 落后过多而脱离共享缓冲区，改为自行读取源文件完成剩余部分
+
+
+# 写线程收到该标记后脱离共享缓冲区，自行从源文件继续拷贝
+_DETACH = object()
+
+
+class _FanOutWriter:
+    def __init__(self, dst_file: str):
+        self.dst_file = dst_file
+        self.q: queue.Queue = queue.Queue()
+        self.position = 0
+        self.active = True  # 仍在接收共享缓冲区中的数据
+        self.detached = False
+        self.error: Optional[BaseException] = None
+        self.finished_at: Optional[float] = None
+
+
+@_invalidates_listing(1, "dst_files")
+def duplicate_file(
+        src_file: str,
+        dst_files: list[str],
+        chunk_size: int = 4 * 1024 * 1024,
+        depth: int = 16,
+        on_progress: Optional[Callable[[str, CopyProgress], None]] = None,
+        straggler_timeout: Optional[float] = 2.0,
+        control: Optional[TransferControl] = None,
+) -> list[DuplicateResult]:
+    """
+    把同一个源文件同时写入多个目标（通常位于不同 U 盘）。
+    源文件每个分块只读一次，放入 depth 个共享缓冲区中，每个目标一个写线程；
+    缓冲区在所有目标都写完后才被复用，因此整体耗时接近最慢的那个 U 盘。
+    - 某个目标写入失败只会让它退出，其余目标继续；
+    - 若共享缓冲区被占满超过 straggler_timeout 秒，积压最多的目标会脱离共享缓冲区，
+      改为自行读取源文件完成剩余部分，不再拖慢其他目标（None 表示从不脱离）。
+    on_progress 以 (目标路径, CopyProgress) 回调，调用发生在各自的写线程中。
+    每个目标写完后先 fsync 再关闭，返回成功即表示数据已落盘、可以安全拔出。
+    每个目标在写入前单独检查目标目录是否存在、剩余空间与 FAT32 4 GiB 限制并预分配空间，不满足的目标直接失败。
+    返回与 dst_files 顺序一致的结果列表，失败的目标在 error 中给出原因，不抛出异常。
+    control 在读取源文件时限速/暂停；取消时删除所有未完成的目标文件并抛出 TransferCancelled。
+    """
+    total = os.path.getsize(src_file)
+    bufs = [memoryview(bytearray(chunk_size)) for _ in range(max(depth, 2))]
+    refs = [0] * len(bufs)
+    free: queue.Queue = queue.Queue()
+    for i in range(len(bufs)):
+        free.put(i)
+    lock = threading.Lock()
+    writers = [_FanOutWriter(d) for d in dst_files]
+    t0 = time.time()
+
+    def release(i: int) -> None:
+        with lock:
+            refs[i] -= 1
+            last = refs[i] == 0
+        if last:
+            free.put(i)
+
+    def run_writer(w: _FanOutWriter) -> None:
+        def on_chunk(n: int, data: Optional[memoryview]) -> None:
+            if control is not None and w.detached:
+                # 脱离后自行读取源文件，需要单独受控
+                control.checkpoint(n)
+            w.position += n
+            if on_progress:
+                dt = max(time.time() - t0, 1e-6)
+                on_progress(w.dst_file, CopyProgress(bytes_copied=w.position, total_bytes=total, speed_bps=w.position / dt))
+
+        def fail(e: BaseException) -> None:
+            with lock:
+                w.error = e
+                w.active = False
+
+        fdst = None
+        try:
+            # 目标目录不存在（如 U 盘已拔出）时报告真实原因，而不是按最近的上级目录估算空间
+            dst_dir = os.path.dirname(w.dst_file) or "."
+            if not os.path.isdir(dst_dir):
+                code = errno.ENOTDIR if os.path.exists(dst_dir) else errno.ENOENT
+                raise OSError(code, os.strerror(code), dst_dir)
+            # 放不下的目标在写入前就失败，不占用共享缓冲区
+            plan_transfer(dst_dir, [(os.path.basename(w.dst_file), total)]).check()
+            fdst = open(w.dst_file, "wb", buffering=0)
+            _preallocate(fdst.fileno(), 0, total)
+        except Exception as e:
+            fail(e)
+
+        try:
+            # 即使已经失败也要继续取队列，把缓冲区引用计数还回去
+            while True:
+                item = w.q.get()
+                if item is None:
+                    break
+                if item is _DETACH:
+                    if w.error is None:
+                        try:
+                            with open(src_file, "rb", buffering=0) as fsrc:
+                                fsrc.seek(w.position)
+                                _copy_readinto(fsrc, fdst, chunk_size, on_chunk)
+                        except Exception as e:
+                            fail(e)
+                    break
+                i, n = item
+                try:
+                    if w.error is None and not w.detached:
+                        _write_all(fdst, bufs[i][:n])
+                        on_chunk(n, bufs[i][:n])
+                except Exception as e:
+                    fail(e)
+                finally:
+                    release(i)
+        finally:
+            if fdst is not None and w.error is None and not (control is not None and control.cancelled):
+                # 镜像完成即表示可以拔出，关闭前确保数据落盘
+                try:
+                    os.fsync(fdst.fileno())
+                except OSError as e:
+                    w.error = e
+            w.finished_at = time.time()
+            if fdst is not None:
+                try:
+                    fdst.close()
+                except OSError as e:
+                    if w.error is None:
+                        w.error = e
+
+    threads = [
+        threading.Thread(target=run_writer, args=(w,), name=f"fanout-writer-{k}", daemon=True)
+        for k, w in enumerate(writers)
+    ]
+    for t in threads:
+        t.start()
+
+    stalled = 0.0  # 有目标空闲、却因缓冲区被占满而等待的累计时长
+
+    def acquire_slot() -> Optional[int]:
+        nonlocal stalled
         while True:
-            chunk = fsrc.read(chunk_size)
-            if not chunk:
+            t_wait = time.time()
+            try:
+                i = free.get(timeout=0.05)
+            except queue.Empty:
+                i = None
+            waited = time.time() - t_wait
+            slow = None
+            with lock:
+                active = [w for w in writers if w.active]
+                if not active:
+                    return None
+                if straggler_timeout is not None and len(active) > 1:
+                    if any(w.q.empty() for w in active):
+                        stalled += waited
+                    if stalled >= straggler_timeout:
+                        slow = max(active, key=lambda w: w.q.qsize())
+                        slow.active = False
+                        slow.detached = True
+                        stalled = 0.0
+            if slow is not None:
+                slow.q.put(_DETACH)
+            if i is not None:
+                return i
+
+    try:
+        with open(src_file, "rb", buffering=0) as fsrc:
+            while True:
+                i = acquire_slot()
+                if i is None:
+                    break
+                n = fsrc.readinto(bufs[i])
+                if control is not None:
+                    try:
+                        control.checkpoint(n)
+                    except TransferCancelled:
+                        # 停止分发，待写线程退出后统一清理
+                        free.put(i)
+                        break
+                with lock:
+                    receivers = [w for w in writers if w.active]
+                    refs[i] = len(receivers)
+                    for w in receivers:
+                        w.q.put((i, n))
+                if not n or not receivers:
+                    break
+    finally:
+        for w in writers:
+            if not w.detached:
+                w.q.put(None)
+        for t in threads:
+            t.join()
+
+    if control is not None and control.cancelled:
+        for w in writers:
+            _remove_partial(w.dst_file)
+        raise TransferCancelled("镜像已取消")
+
+    results = []
+    for w in writers:
+        if w.error is None and w.position != total:
+            w.error = OSError(errno.EIO, "写入字节数与源文件大小不一致", w.dst_file)
+        results.append(DuplicateResult(
+            dst_file=w.dst_file,
+            bytes_copied=w.position,
+            elapsed_sec=(w.finished_at or time.time()) - t0,
+            error=str(w.error) if w.error is not None else None,
+            detached=w.detached,
+        ))
+    return results
+
+
+@dataclass
+class DeleteProgress:
+    files_done: int
+    files_total: int
+    bytes_done: int
+    bytes_total: int
+    files_per_sec: float
+    bytes_per_sec: float
+
+
+@dataclass
+class DeleteResult:
+    files_removed: int
+    bytes_removed: int
+    dirs_removed: int
+    elapsed_sec: float
+
+
+_IO_REPARSE_TAG_MOUNT_POINT = 0xA0000003
+
+
+def _is_link(st: os.stat_result) -> bool:
+    """
+    lstat 结果是否为链接：符号链接（含指向目录的）或 Windows 目录联接（junction）
+    """
+    return stat.S_ISLNK(st.st_mode) or getattr(st, "st_reparse_tag", 0) == _IO_REPARSE_TAG_MOUNT_POINT
+
+
+def _scan_for_delete(root: str) -> tuple[list[str], list[tuple[str, int, bool]]]:
+    """
+    按 lstat 分类遍历待删除的目录树，从不进入链接：
+    返回 (真实子目录的相对路径列表, [(相对路径, 字节数, 是否链接)])，
+    后者包含普通文件、各种链接（含指向目录的链接与联接、悬空链接）以及特殊文件。
+    """
+    dirs: list[str] = []
+    items: list[tuple[str, int, bool]] = []
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        with os.scandir(os.path.join(root, rel) if rel else root) as it:
+            for entry in it:
+                entry_rel = os.path.join(rel, entry.name) if rel else entry.name
+                st = entry.stat(follow_symlinks=False)
+                link = _is_link(st)
+                if stat.S_ISDIR(st.st_mode) and not link:
+                    dirs.append(entry_rel)
+                    stack.append(entry_rel)
+                else:
+                    items.append((entry_rel, st.st_size if stat.S_ISREG(st.st_mode) else 0, link))
+    return dirs, items
+
+
+def _unlink(path: str, link: bool = False) -> None:
+    try:
+        os.unlink(path)
+    except PermissionError:
+        if link and os.name == "nt":
+            # 指向目录的符号链接/联接在 Windows 上要用 rmdir 删除，只删链接本身
+            os.rmdir(path)
+            return
+        # Windows 上只读文件不能直接删除，去掉只读属性后重试
+        os.chmod(path, stat.S_IWRITE)
+        os.unlink(path)
+    except IsADirectoryError:
+        if not link:
+            raise
+        os.rmdir(path)
+
+
+def _unlink_batch(paths: list[tuple[str, int, bool]]) -> tuple[int, int]:
+    files = size = 0
+    for path, n, link in paths:
+        try:
+            _unlink(path, link)
+        except FileNotFoundError:
+            pass
+        files += 1
+        size += n
+    return files, size
+
+
+@_invalidates_listing(0, "target")
+def delete_tree(
+        target: str,
+        on_progress: Optional[Callable[[DeleteProgress], None]] = None,
+        workers: int = 4,
+        batch_files: int = 64,
+        report_interval: float = 0.25,
+        control: Optional[TransferControl] = None,
+) -> DeleteResult:
+    """
+    删除整个目录树，应在后台线程中调用：
+    - 先遍历一遍得到文件数与总字节数（只读元数据，比删除快得多），用于计算进度；
+    - 文件按批交给 workers 个线程并发删除，FAT 等文件系统上删除主要耗在等待 I/O，
+      并发可以把多个请求同时压到设备上；同一设备的删除任务由调度器按设备排队；
+    - 文件删完后由深到浅删除目录；
+    - 链接（指向目录的符号链接、联接、悬空链接）只删除链接本身，从不进入；target 本身是链接时也只删链接；
+    - control 用于暂停/取消，取消时已删除的部分不会恢复，抛出 TransferCancelled。
+    """
+    t0 = time.time()
+    if control is not None:
+        control.checkpoint()
+    if _is_link(os.lstat(target)):
+        _unlink(target, link=True)
+        return DeleteResult(1, 0, 0, time.time() - t0)
+    dirs, files = _scan_for_delete(target)
+    items = [(os.path.join(target, rel), size, link) for rel, size, link in files]
+    files_total = len(items)
+    bytes_total = sum(n for _, n, _ in items)
+    files_done = bytes_done = 0
+    last = 0.0
+
+    def report(force: bool = False) -> None:
+        nonlocal last
+        now = time.time()
+        if on_progress is None or (not force and now - last < report_interval):
+            return
+        last = now
+        elapsed = max(now - t0, 1e-6)
+        on_progress(DeleteProgress(
+            files_done, files_total, bytes_done, bytes_total, files_done / elapsed, bytes_done / elapsed
+        ))
+
+    batches = [items[i:i + batch_files] for i in range(0, len(items), batch_files)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = set()
+        it = iter(batches)
+        cancelled = None
+        while True:
+            # 同时最多 2*workers 批在途，取消后不再提交新的批次
+            while cancelled is None and len(pending) < 2 * workers:
+                batch = next(it, None)
+                if batch is None:
+                    break
+                pending.add(pool.submit(_unlink_batch, batch))
+            if not pending:
                 break
-            fdst.write(chunk)
-            copied += len(chunk)
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                n, size = fut.result()
+                files_done += n
+                bytes_done += size
+            report()
+            if control is not None and cancelled is None:
+                try:
+                    control.checkpoint()
+                except TransferCancelled as e:
+                    cancelled = e
+        if cancelled is not None:
+            raise cancelled
 
-            dt = max(time.time() - t0, 1e-6)
-            speed = copied / dt
-            if on_progress:
-                on_progress(CopyProgress(bytes_copied=copied, total_bytes=total, speed_bps=speed))
\ No newline at end of file
+    dirs_removed = 0
+    for rel in sorted(dirs, key=lambda d: d.count(os.sep), reverse=True):
+        try:
+            os.rmdir(os.path.join(target, rel))
+            dirs_removed += 1
+        except FileNotFoundError:
+            pass
+    os.rmdir(target)
+    report(force=True)
+    return DeleteResult(files_done, bytes_done, dirs_removed + 1, time.time() - t0)
+
+
+def _volume_label_windows(root: str) -> str:
+    import ctypes
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    label = ctypes.create_unicode_buffer(261)
+    if not kernel32.GetVolumeInformationW(root, label, len(label), None, None, None, None, 0):
+        return ""
+    return label.value
+
+
+def quick_wipe(volume_root: str, control: Optional[TransferControl] = None, timeout: float = 600.0) -> float:
+    """
+    快速清空整个卷：用系统的快速格式化（format /Q）重建文件系统元数据，保留原文件系统类型与卷标，
+    耗时与文件数量无关，远快于逐个删除。返回耗时秒数。
+    只接受卷根目录，且拒绝系统盘；需要管理员权限，开始后不能取消。
+    """
+    root = os.path.abspath(volume_root)
+    if os.name != "nt":
+        raise OSError(errno.ENOTSUP, "快速清空仅支持 Windows", root)
+    drive = os.path.splitdrive(root)[0]
+    if not drive or root.rstrip("\\/") != drive:
+        raise OSError(errno.EINVAL, "快速清空只能用于卷的根目录", root)
+    if drive.upper() == os.environ.get("SystemDrive", "C:").upper():
+        raise OSError(errno.EPERM, "拒绝清空系统盘", root)
+    if control is not None:
+        control.checkpoint()
+
+    _, fs_type, _ = get_volume_info(drive + "\\")
+    label = _volume_label_windows(drive + "\\")
+    cmd = ["format", drive, "/Q", "/Y", "/X"]
+    if fs_type:
+        cmd.append(f"/FS:{fs_type}")
+    cmd.append(f"/V:{label}")
+    t0 = time.time()
+    try:
+        # 卷带有卷标时 format 会要求先输入当前卷标确认，从标准输入提供
+        proc = subprocess.run(
+            cmd,
+            input=f"{label}\r\n",
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+    finally:
+        _changed(drive + "\\")
+    if proc.returncode != 0:
+        detail = (proc.stderr or proc.stdout or "").strip().splitlines()
+        raise OSError(errno.EIO, f"快速格式化失败（{proc.returncode}）：{detail[-1] if detail else ''}", root)
+    return time.time() - t0
+
+
+# 同步清单文件，保存在 U 盘上的目标目录中
+SYNC_MANIFEST_NAME = ".usb_lab_manifest.json"
+
+# FAT/exFAT 的修改时间精度为 2 秒，比较时允许该误差
+_MTIME_TOLERANCE_NS = 2_000_000_000
+
+
+@dataclass
+class SyncReport:
+    to_copy: list[str]  # 需要传输的相对路径（新增或变化）
+    to_delete: list[str]  # 源中已不存在的相对路径
+    bytes_to_transfer: int
+    unchanged: int
+    dry_run: bool
+    manifest_used: bool  # 是否依据 U 盘上的清单比较（否则为全量扫描目标目录）
+    dirs_to_create: list[str] = field(default_factory=list)  # 目标上还没有的源目录（含空目录）
+    files_copied: int = 0
+    files_deleted: int = 0
+    elapsed_sec: float = 0.0
+    plan: Optional[TransferPlan] = None  # 容量规划结果，plan.fits 为 False 时实际同步会立即失败
+
+
+def _manifest_key(rel: str) -> str:
+    return rel.replace(os.sep, "/")
+
+
+def _load_manifest(dst_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(dst_dir, SYNC_MANIFEST_NAME), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == 1 and isinstance(data.get("files"), dict):
+            return data
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def _save_manifest(dst_dir: str, files: dict, hash_algo: Optional[str], dirs: list[str]) -> None:
+    path = os.path.join(dst_dir, SYNC_MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        # 紧凑格式：相对路径 -> [大小, mtime_ns, 摘要或 null]；dirs 为已在目标上建好的目录
+        json.dump({"version": 1, "algo": hash_algo, "files": files, "dirs": dirs}, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _hash_file(path: str, algo: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.new(algo)
+    _read_prefix(path, os.path.getsize(path), chunk_size, h.update)
+    return h.hexdigest()
+
+
+def _drop_sync_artifacts(files: list[tuple[str, int, int]]) -> list[tuple[str, int, int]]:
+    """
+    去掉同步自身产生的文件：根目录下的清单（及其临时文件），以及列表中某个文件旁边的断点日志
+    （<文件>.resume.json[.tmp]）；恰好以 .resume.json 结尾的普通文件照常同步
+    """
+    names = {rel for rel, _, _ in files}
+
+    def is_artifact(rel: str) -> bool:
+        if rel in (SYNC_MANIFEST_NAME, SYNC_MANIFEST_NAME + ".tmp"):
+            return True
+        for suffix in (".resume.json", ".resume.json.tmp"):
+            if rel.endswith(suffix) and rel[:-len(suffix)] in names:
+                return True
+        return False
+
+    return [f for f in files if not is_artifact(f[0])]
+
+
+@_invalidates_listing(1, "dst_dir")
+def sync_tree(
+        src_dir: str,
+        dst_dir: str,
+        by_hash: bool = False,
+        delete_stale: bool = False,
+        dry_run: bool = False,
+        trust_manifest: bool = True,
+        hash_algo: str = "sha256",
+        on_progress: Optional[Callable[[TreeCopyProgress], None]] = None,
+        small_file_threshold: int = 1024 * 1024,
+        workers: int = 4,
+        report_interval: float = 0.1,
+        write_policy: str = "buffered",
+        control: Optional[TransferControl] = None,
+        sync_interval: int = 32 * 1024 * 1024,
+) -> SyncReport:
+    """
+    增量同步：只拷贝新增或变化的文件，可选删除源中已不存在的文件；源中的目录（包括空目录）都会在目标上建立。
+    目标目录中的清单 (SYNC_MANIFEST_NAME) 记录上次同步时每个文件的大小、修改时间和摘要，
+    比较时只需 stat 本地源目录，不必逐个 stat U 盘上的文件；清单缺失、损坏或
+    trust_manifest=False 时才全量扫描目标目录。
+    by_hash=True 时按内容摘要比较（源文件需完整读取一遍）。
+    dry_run=True 时只返回报告（需要传输的文件与字节数），不做任何修改。
+    write_policy、sync_interval、control 含义同 copy_with_progress；中途取消时不更新清单。
+    拷贝前先做容量规划（被覆盖的旧文件与 delete_stale 要删除的文件都计为可回收空间），
+    放不下时在写入任何数据之前抛出 OSError；删除多余文件先于拷贝进行，以便腾出空间。
+    """
+    t0 = time.time()
+    src_dirs, src_files = _scan_tree(src_dir)
+    src_files = _drop_sync_artifacts(src_files)
+    src_dir_keys = {_manifest_key(rel) for rel in src_dirs}
+
+    manifest = _load_manifest(dst_dir) if trust_manifest else None
+    manifest_used = manifest is not None
+    if manifest is not None:
+        known: dict = manifest["files"]
+        known_dirs = set(manifest.get("dirs") or ())
+        if manifest.get("algo") != hash_algo:
+            # 摘要算法变了，旧摘要不可比
+            known = {k: [v[0], v[1], None] for k, v in known.items()}
+    else:
+        known = {}
+        known_dirs = set()
+        if os.path.isdir(dst_dir):
+            dst_dirs, dst_files = _scan_tree(dst_dir)
+            known_dirs = {_manifest_key(rel) for rel in dst_dirs}
+            for rel, size, mtime_ns in _drop_sync_artifacts(dst_files):
+                known[_manifest_key(rel)] = [size, mtime_ns, None]
+
+    to_copy: list[tuple[str, int, int]] = []
+    new_entries: dict = {}
+    unchanged = 0
+    for rel, size, mtime_ns in src_files:
+        key = _manifest_key(rel)
+        entry = known.get(key)
+        digest = None
+        if by_hash:
+            digest = _hash_file(os.path.join(src_dir, rel), hash_algo)
+            same = False
+            if entry is not None and entry[0] == size:
+                old_digest = entry[2]
+                if old_digest is None and os.path.exists(os.path.join(dst_dir, rel)):
+                    old_digest = _hash_file(os.path.join(dst_dir, rel), hash_algo)
+                same = old_digest == digest
+        else:
+            same = entry is not None and entry[0] == size and abs(entry[1] - mtime_ns) <= _MTIME_TOLERANCE_NS
+            if same:
+                digest = entry[2]
+
+        if same:
+            unchanged += 1
+        else:
+            to_copy.append((rel, size, mtime_ns))
+        new_entries[key] = [size, mtime_ns, digest]
+
+    stale = sorted(set(known) - set(new_entries))
+    # 覆盖的旧文件大小直接取自清单/扫描结果，不必再逐个 stat U 盘
+    existing = {rel: known[_manifest_key(rel)][0] for rel, _, _ in to_copy if _manifest_key(rel) in known}
+    plan = plan_transfer(
+        dst_dir,
+        [(rel, size) for rel, size, _ in to_copy],
+        existing=existing,
+        reclaim_bytes=sum(known[key][0] for key in stale) if delete_stale else 0,
+    )
+    report = SyncReport(
+        to_copy=[rel for rel, _, _ in to_copy],
+        to_delete=[os.path.join(*key.split("/")) for key in stale],
+        bytes_to_transfer=sum(size for _, size, _ in to_copy),
+        unchanged=unchanged,
+        dry_run=dry_run,
+        manifest_used=manifest_used,
+        dirs_to_create=sorted(rel for rel in src_dirs if _manifest_key(rel) not in known_dirs),
+        plan=plan,
+    )
+    if dry_run:
+        report.elapsed_sec = time.time() - t0
+        return report
+    plan.check()
+
+    if delete_stale:
+        for key in stale:
+            target = os.path.join(dst_dir, *key.split("/"))
+            try:
+                os.remove(target)
+            except FileNotFoundError:
+                pass
+            report.files_deleted += 1
+            # 顺带清理变空的上级目录（不超出目标根目录，源中仍有的目录保留）
+            parent = os.path.dirname(target)
+            while os.path.normpath(parent) != os.path.normpath(dst_dir) and \
+                    _manifest_key(os.path.relpath(parent, dst_dir)) not in src_dir_keys:
+                try:
+                    os.rmdir(parent)
+                except OSError:
+                    break
+                parent = os.path.dirname(parent)
+    else:
+        # 不删除时保留旧条目，下次仍能识别这些文件
+        for key in stale:
+            new_entries[key] = known[key]
+
+    # 已知存在的目录不再逐个创建，免得每次同步都要访问 U 盘上的每个目录
+    dirs = sorted(
+        set(report.dirs_to_create) | {os.path.dirname(rel) for rel, _, _ in to_copy if os.path.dirname(rel)}
+    )
+    result = _copy_file_list(
+        src_dir, dst_dir, dirs, to_copy, on_progress, small_file_threshold, workers, report_interval, None,
+        write_policy, control, sync_interval,
+    )
+    report.files_copied = result.files_copied
+
+    _save_manifest(dst_dir, new_entries, hash_algo, sorted(src_dir_keys if delete_stale else src_dir_keys | known_dirs))
+    report.elapsed_sec = time.time() - t0
+    return report
+
+
+# 打包模式：把大量小文件写成 U 盘上的一个顺序 tar 流，旁边保存成员索引
+PACK_INDEX_SUFFIX = ".idx.json"
+_PACK_BLOCK_SIZE = 4 * 1024 * 1024  # 压缩模式下每个独立 gzip 块对应的 tar 数据量
+_TAR_BLOCK = 512
+
+
+@dataclass
+class PackMember:
+    name: str  # 以 "/" 分隔的相对路径
+    size: int
+    mtime_ns: int
+    offset: int  # 数据在（解压后的）tar 流中的偏移
+
+
+@dataclass
+class PackResult:
+    archive: str
+    files_packed: int
+    bytes_packed: int  # 源文件总字节数
+    archive_bytes: int
+    elapsed_sec: float
+    compressed: bool
+    file_copy_sec: Optional[float] = None  # 按抽样估计的逐个文件拷贝同一批数据的耗时
+    speedup: Optional[float] = None  # file_copy_sec / elapsed_sec
+
+
+class _ParallelGzipWriter:
+    """
+    供 tarfile 写入的文件对象：把 tar 流切成 block_size 的块，在线程池中各自压缩成独立的
+    gzip 成员，再按顺序写入目标文件。多成员 gzip 仍是标准的 .tar.gz，
+    同时记录每块的 (解压后起始偏移, 压缩后偏移, 压缩后长度)，解包单个成员时只需解压相关的块。
+    """
+
+    def __init__(self, fdst, pool: ThreadPoolExecutor, window: int, block_size: int = _PACK_BLOCK_SIZE):
+        self.fdst = fdst
+        self.pool = pool
+        self.window = max(window, 1)
+        self.block_size = block_size
+        self.blocks: list[list[int]] = []
+        self._buf = bytearray()
+        self._pending: list = []  # [(解压后起始偏移, future)]，按提交顺序
+        self._raw_pos = 0  # 已提交压缩的 tar 字节数
+        self._out_pos = 0
+
+    def write(self, data) -> int:
+        self._buf += data
+        while len(self._buf) >= self.block_size:
+            self._submit(bytes(self._buf[:self.block_size]))
+            del self._buf[:self.block_size]
+        return len(data)
+
+    def tell(self) -> int:
+        return self._raw_pos + len(self._buf)
+
+    def _submit(self, block: bytes) -> None:
+        if len(self._pending) >= self.window:
+            self._flush_one()
+        self._pending.append((self._raw_pos, self.pool.submit(_gzip_block, block)))
+        self._raw_pos += len(block)
+
+    def _flush_one(self) -> None:
+        raw_start, fut = self._pending.pop(0)
+        data = fut.result()
+        _write_all(self.fdst, memoryview(data))
+        self.blocks.append([raw_start, self._out_pos, len(data)])
+        self._out_pos += len(data)
+
+    def close(self) -> None:
+        if self._buf:
+            self._submit(bytes(self._buf))
+            self._buf.clear()
+        while self._pending:
+            self._flush_one()
+
+
+def _gzip_block(block: bytes) -> bytes:
+    import gzip
+
+    # 固定 mtime，同样的输入得到同样的输出；zlib 压缩时释放 GIL，可在线程池中并行
+    return gzip.compress(block, compresslevel=6, mtime=0)
+
+
+def _estimate_file_copy_sec(
+        src_dir: str,
+        files: list[tuple[str, int, int]],
+        probe_dir: str,
+        sample: int,
+        durable: bool,
+) -> Optional[float]:
+    """
+    从文件列表中均匀抽取 sample 个文件逐个拷到目标卷上的临时目录，按文件数外推整批耗时，
+    用于与打包模式比较；拷完即删除，删除耗时不计入。
+    """
+    if not files or sample <= 0:
+        return None
+    step = max(len(files) // sample, 1)
+    picked = files[::step][:sample]
+    shutil.rmtree(probe_dir, ignore_errors=True)
+    try:
+        t0 = time.perf_counter()
+        for k, (rel, _, _) in enumerate(picked):
+            # 保留一层子目录结构，目录创建也是逐文件拷贝开销的一部分
+            sub = os.path.join(probe_dir, str(k % 16))
+            os.makedirs(sub, exist_ok=True)
+            _copy_small_file(os.path.join(src_dir, rel), os.path.join(sub, f"{k}.bin"), 1024 * 1024, durable)
+        _fsync_dir(probe_dir)
+        elapsed = time.perf_counter() - t0
+    except OSError:
+        return None
+    finally:
+        shutil.rmtree(probe_dir, ignore_errors=True)
+    return elapsed * len(files) / len(picked)
+
+
+def _save_pack_index(archive: str, members: list[PackMember], blocks: Optional[list], compressed: bool) -> None:
+    path = archive + PACK_INDEX_SUFFIX
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": 1,
+            "format": "tar.gz" if compressed else "tar",
+            "members": [[m.name, m.size, m.mtime_ns, m.offset] for m in members],
+            "blocks": blocks or [],
+        }, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+@_invalidates_listing(1, "archive")
+def pack_tree(
+        src_dir: str,
+        archive: str,
+        compress: bool = False,
+        workers: int = 4,
+        on_progress: Optional[Callable[[TreeCopyProgress], None]] = None,
+        report_interval: float = 0.1,
+        write_policy: str = "buffered",
+        control: Optional[TransferControl] = None,
+        measure_speedup: bool = False,
+        speedup_sample: int = 100,
+) -> PackResult:
+    """
+    打包模式：把整个目录树写成 U 盘上的一个 tar 文件（compress=True 时为 .tar.gz）。
+    FAT 闪存盘上逐个创建大量小文件时元数据更新极慢，打包后只有一个大文件的顺序写入。
+    - 存储模式下数据经 4 MiB 缓冲合并成大块顺序写；
+    - 压缩模式下 tar 流按块在 workers 个线程中并行压缩，每块是一个独立的 gzip 成员；
+    - 旁边的 archive + PACK_INDEX_SUFFIX 索引记录每个成员的偏移（及压缩块表），
+      list_archive / extract_member 只读索引和相关数据，不必扫描整个归档。
+    measure_speedup=True 时另外抽样 speedup_sample 个文件逐个拷到同一卷上，估算逐文件拷贝的耗时并给出加速比；
+    这会额外写入 U 盘并拖慢打包本身，默认关闭，只在需要比较时打开。
+    write_policy、control 含义同 copy_with_progress；取消时删除不完整的归档。
+    """
+    import tarfile
+
+    if write_policy not in WRITE_POLICIES:
+        raise ValueError(f"未知的写入策略：{write_policy}")
+    dirs, files = _scan_tree(src_dir)
+    files.sort()
+    bytes_total = sum(size for _, size, _ in files)
+    # 存储模式下归档大小的上界：每个成员至多三个头块（含非 ASCII 路径的 PAX 扩展头），
+    # 数据按 512 字节补齐，外加结束块
+    estimate = sum(3 * _TAR_BLOCK + -(-size // _TAR_BLOCK) * _TAR_BLOCK for _, size, _ in files) + 20 * _TAR_BLOCK
+    archive_dir = os.path.dirname(archive) or "."
+    plan_transfer(archive_dir, [(os.path.basename(archive), estimate)]).check()
+
+    tracker = _TreeProgressTracker(
+        files_total=len(files),
+        bytes_total=bytes_total,
+        on_progress=on_progress,
+        report_interval=report_interval,
+    )
+    members: list[PackMember] = []
+    gz = None
+    os.makedirs(archive_dir, exist_ok=True)
+    o_sync = getattr(os, "O_SYNC", 0) if write_policy == "write_through" else 0
+    try:
+        with open(archive, "wb", buffering=0, opener=lambda p, fl: os.open(p, fl | o_sync, 0o666)) as fdst, \
+                ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="pack-gzip") as pool:
+            if not compress:
+                _preallocate(fdst.fileno(), 0, estimate)
+            if compress:
+                gz = _ParallelGzipWriter(fdst, pool, window=max(workers, 1) * 2)
+                sink = gz
+            else:
+                sink = _BufferedSink(fdst, _PACK_BLOCK_SIZE)
+            with tarfile.open(fileobj=sink, mode="w", format=tarfile.PAX_FORMAT) as tar:
+                tar.copybufsize = 1024 * 1024
+                for rel in sorted(dirs):
+                    info = tarfile.TarInfo(rel.replace(os.sep, "/"))
+                    info.type = tarfile.DIRTYPE
+                    info.mode = 0o755
+                    info.mtime = os.stat(os.path.join(src_dir, rel)).st_mtime
+                    tar.addfile(info)
+                for rel, size, mtime_ns in files:
+                    if control is not None:
+                        control.checkpoint(size)
+                    name = rel.replace(os.sep, "/")
+                    info = tarfile.TarInfo(name)
+                    info.size = size
+                    info.mode = 0o644
+                    info.mtime = mtime_ns / 1e9
+                    with open(os.path.join(src_dir, rel), "rb") as fsrc:
+                        tar.addfile(info, fsrc)
+                    # addfile 之后 tar.offset 指向补齐后的数据末尾，倒推出数据起始位置
+                    members.append(PackMember(name, size, mtime_ns, tar.offset - -(-size // _TAR_BLOCK) * _TAR_BLOCK))
+                    tracker.add(n_bytes=size, n_files=1)
+            sink.close()
+            if write_policy != "buffered" and not o_sync:
+                os.fsync(fdst.fileno())
+            archive_bytes = fdst.tell()
+    except TransferCancelled:
+        _remove_partial(archive)
+        raise
+
+    _save_pack_index(archive, members, gz.blocks if gz else None, compress)
+    if write_policy != "buffered":
+        _fsync_dir(archive_dir)
+    tracker.finish()
+    elapsed = time.time() - tracker.t0
+
+    file_copy_sec = None
+    if measure_speedup:
+        file_copy_sec = _estimate_file_copy_sec(
+            src_dir, files, os.path.join(archive_dir, ".usb_lab_pack_probe"), speedup_sample, write_policy != "buffered"
+        )
+    return PackResult(
+        archive=archive,
+        files_packed=len(members),
+        bytes_packed=bytes_total,
+        archive_bytes=archive_bytes,
+        elapsed_sec=elapsed,
+        compressed=compress,
+        file_copy_sec=file_copy_sec,
+        speedup=file_copy_sec / max(elapsed, 1e-6) if file_copy_sec is not None else None,
+    )
+
+
+class _BufferedSink:
+    """
+    把 tarfile 的大量小块写入合并成 buf_size 的大块再写到无缓冲的目标文件
+    """
+
+    def __init__(self, fdst, buf_size: int):
+        self.fdst = fdst
+        self.buf_size = buf_size
+        self._buf = bytearray()
+        self._pos = 0
+
+    def write(self, data) -> int:
+        self._buf += data
+        if len(self._buf) >= self.buf_size:
+            self._flush()
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos + len(self._buf)
+
+    def _flush(self) -> None:
+        if self._buf:
+            _write_all(self.fdst, memoryview(self._buf))
+            self._pos += len(self._buf)
+            self._buf = bytearray()
+
+    def close(self) -> None:
+        self._flush()
+
+
+def _load_pack_index(archive: str) -> Optional[dict]:
+    try:
+        with open(archive + PACK_INDEX_SUFFIX, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != 1:
+            return None
+        return data
+    except (OSError, ValueError):
+        return None
+
+
+def list_archive(archive: str) -> list[PackMember]:
+    """
+    列出归档中的文件。有索引时只读索引；索引缺失时退化为用 tarfile 扫描整个归档。
+    """
+    index = _load_pack_index(archive)
+    if index is not None:
+        return [PackMember(*m) for m in index["members"]]
+
+    import tarfile
+
+    with tarfile.open(archive, "r:*") as tar:
+        return [
+            PackMember(m.name, m.size, int(m.mtime * 1e9), m.offset_data)
+            for m in tar.getmembers() if m.isfile()
+        ]
+
+
+@_invalidates_listing(2, "dst_file")
+def extract_member(archive: str, name: str, dst_file: str) -> int:
+    """
+    从归档中取出单个文件写到 dst_file，返回字节数。
+    借助索引直接定位：存储模式 seek 到数据偏移读取；压缩模式只解压覆盖该文件的 gzip 块。
+    """
+    import gzip
+
+    index = _load_pack_index(archive)
+    if index is None:
+        import tarfile
+
+        with tarfile.open(archive, "r:*") as tar:
+            src = tar.extractfile(name.replace(os.sep, "/"))
+            if src is None:
+                raise FileNotFoundError(errno.ENOENT, "归档中没有该文件", name)
+            os.makedirs(os.path.dirname(dst_file) or ".", exist_ok=True)
+            with open(dst_file, "wb") as fdst:
+                shutil.copyfileobj(src, fdst, 1024 * 1024)
+                return fdst.tell()
+
+    name = name.replace(os.sep, "/")
+    member = next((PackMember(*m) for m in index["members"] if m[0] == name), None)
+    if member is None:
+        raise FileNotFoundError(errno.ENOENT, "归档中没有该文件", name)
+
+    os.makedirs(os.path.dirname(dst_file) or ".", exist_ok=True)
+    with open(archive, "rb") as fsrc, open(dst_file, "wb") as fdst:
+        if index["format"] == "tar":
+            fsrc.seek(member.offset)
+            remaining = member.size
+            while remaining > 0:
+                chunk = fsrc.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    raise EOFError(archive)
+                fdst.write(chunk)
+                remaining -= len(chunk)
+        else:
+            start, end = member.offset, member.offset + member.size
+            blocks = index["blocks"]
+            # 块表按解压后偏移升序排列，二分找到包含数据起点的块
+            k = max(bisect.bisect_right([b[0] for b in blocks], start) - 1, 0)
+            for raw_start, out_off, out_len in blocks[k:]:
+                if raw_start >= end:
+                    break
+                fsrc.seek(out_off)
+                raw = gzip.decompress(fsrc.read(out_len))
+                fdst.write(raw[max(start - raw_start, 0):end - raw_start])
+            if fdst.tell() != member.size:
+                raise EOFError(archive)
+    os.utime(dst_file, ns=(member.mtime_ns, member.mtime_ns))
+    return member.size
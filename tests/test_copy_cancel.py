@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from file_ops import _journal_path, copy_with_progress
+from transfer_control import TransferCancelled, TransferControl
+
+CHUNK = 64 * 1024
+
+
+def _cancel_after(control, n_bytes, discard=False):
+    def on_progress(p):
+        if p.bytes_copied >= n_bytes:
+            control.cancel(discard)
+    return on_progress
+
+
+def _copy(src, dst, **kwargs):
+    return copy_with_progress(
+        str(src), str(dst), chunk_size=CHUNK, resume=True, checkpoint_bytes=4 * CHUNK, preflight=False, **kwargs
+    )
+
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / "src.bin"
+    path.write_bytes(os.urandom(40 * CHUNK))
+    return path
+
+
+def test_cancel_keeps_partial_copy_for_resume(tmp_path, src):
+    dst = tmp_path / "dst.bin"
+    control = TransferControl()
+    with pytest.raises(TransferCancelled):
+        _copy(src, dst, control=control, on_progress=_cancel_after(control, 10 * CHUNK))
+    assert dst.exists() and os.path.exists(_journal_path(str(dst)))
+
+    result = _copy(src, dst)
+    assert result.resumed_from >= 10 * CHUNK
+    assert dst.read_bytes() == src.read_bytes()
+    assert not os.path.exists(_journal_path(str(dst)))
+
+
+def test_cancel_with_discard_removes_partial_copy(tmp_path, src):
+    dst = tmp_path / "dst.bin"
+    control = TransferControl()
+    with pytest.raises(TransferCancelled):
+        _copy(src, dst, control=control, on_progress=_cancel_after(control, 10 * CHUNK, discard=True))
+    assert not dst.exists() and not os.path.exists(_journal_path(str(dst)))
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from file_ops import copy_with_progress
+
+CHUNK = 64 * 1024
+
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / "src.bin"
+    # 不是分块大小的整数倍，覆盖最后一个不满的分块
+    path.write_bytes(os.urandom(10 * CHUNK + 123))
+    return path
+
+
+@pytest.mark.parametrize("engine", ["auto", "readinto", "pipelined"])
+def test_engines_copy_identical_data_and_report_full_progress(tmp_path, src, engine):
+    dst = tmp_path / f"dst-{engine}.bin"
+    seen = []
+
+    result = copy_with_progress(
+        str(src), str(dst), chunk_size=CHUNK, engine=engine, on_progress=lambda p: seen.append(p.bytes_copied)
+    )
+
+    assert dst.read_bytes() == src.read_bytes()
+    assert result.bytes_copied == src.stat().st_size
+    assert seen and seen[-1] == src.stat().st_size
+    assert seen == sorted(seen)
+    if engine != "auto":
+        assert result.engine == engine
+
+
+def test_kernel_engine_when_available(tmp_path, src):
+    dst = tmp_path / "dst.bin"
+    try:
+        result = copy_with_progress(str(src), str(dst), chunk_size=CHUNK, engine="kernel")
+    except OSError as e:
+        pytest.skip(f"当前平台不支持内核拷贝：{e}")
+    assert result.engine == "kernel"
+    assert dst.read_bytes() == src.read_bytes()
+
+
+def test_empty_file(tmp_path):
+    src = tmp_path / "empty"
+    src.write_bytes(b"")
+    dst = tmp_path / "out"
+    result = copy_with_progress(str(src), str(dst), chunk_size=CHUNK)
+    assert result.bytes_copied == 0 and dst.read_bytes() == b""
@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+from file_ops import _journal_path, copy_with_progress
+from transfer_control import TransferCancelled, TransferControl
+
+CHUNK = 64 * 1024
+
+
+def _copy(src, dst, **kwargs):
+    return copy_with_progress(
+        str(src), str(dst), chunk_size=CHUNK, resume=True, checkpoint_bytes=4 * CHUNK, preflight=False, **kwargs
+    )
+
+
+def _interrupt(src, dst, after):
+    control = TransferControl()
+
+    def on_progress(p):
+        if p.bytes_copied >= after:
+            control.cancel()
+
+    with pytest.raises(TransferCancelled):
+        _copy(src, dst, control=control, on_progress=on_progress)
+
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / "src.bin"
+    path.write_bytes(os.urandom(32 * CHUNK))
+    return path
+
+
+def test_journal_records_durable_offset_and_crc(tmp_path, src):
+    dst = tmp_path / "dst.bin"
+    _interrupt(src, dst, 9 * CHUNK)
+    with open(_journal_path(str(dst)), encoding="utf-8") as f:
+        j = json.load(f)
+    assert 0 < j["offset"] <= dst.stat().st_size
+    assert j["src"] == os.path.abspath(str(src))
+    assert j["src_size"] == src.stat().st_size
+
+
+def test_corrupted_prefix_restarts_from_zero(tmp_path, src):
+    dst = tmp_path / "dst.bin"
+    _interrupt(src, dst, 9 * CHUNK)
+    with open(dst, "r+b") as f:
+        f.write(b"\0" * 16)  # 破坏已拷贝的前缀，CRC 对不上
+
+    result = _copy(src, dst)
+    assert result.resumed_from == 0
+    assert dst.read_bytes() == src.read_bytes()
+
+
+def test_changed_source_restarts_from_zero(tmp_path, src):
+    dst = tmp_path / "dst.bin"
+    _interrupt(src, dst, 9 * CHUNK)
+    src.write_bytes(os.urandom(32 * CHUNK))
+    os.utime(src, ns=(0, 10 ** 18))
+
+    result = _copy(src, dst)
+    assert result.resumed_from == 0
+    assert dst.read_bytes() == src.read_bytes()
+
+
+def test_truncated_destination_restarts_from_zero(tmp_path, src):
+    dst = tmp_path / "dst.bin"
+    _interrupt(src, dst, 9 * CHUNK)
+    with open(dst, "r+b") as f:
+        f.truncate(CHUNK)
+
+    result = _copy(src, dst)
+    assert result.resumed_from == 0
+    assert dst.read_bytes() == src.read_bytes()
+    assert not os.path.exists(_journal_path(str(dst)))
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from file_ops import delete_path, delete_tree
+
+
+def _symlink(src, dst, target_is_directory=False):
+    try:
+        os.symlink(src, dst, target_is_directory=target_is_directory)
+    except (OSError, NotImplementedError) as e:
+        pytest.skip(f"无法创建符号链接：{e}")
+
+
+def test_delete_tree_with_dir_symlink_keeps_link_target(tmp_path):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "keep.txt").write_bytes(b"keep")
+
+    tree = tmp_path / "tree"
+    (tree / "sub").mkdir(parents=True)
+    (tree / "a.bin").write_bytes(b"x" * 100)
+    (tree / "sub" / "b.bin").write_bytes(b"y" * 10)
+    _symlink(str(outside), str(tree / "sub" / "link_to_dir"), target_is_directory=True)
+    _symlink(str(tmp_path / "missing"), str(tree / "dangling"))
+
+    result = delete_tree(str(tree))
+
+    assert not tree.exists()
+    assert (outside / "keep.txt").read_bytes() == b"keep"
+    assert result.files_removed == 4
+    assert result.bytes_removed == 110
+
+
+def test_delete_path_on_dir_symlink_removes_only_link(tmp_path):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "keep.txt").write_bytes(b"keep")
+    _symlink(str(outside), str(tmp_path / "link"), target_is_directory=True)
+
+    delete_path(str(tmp_path), "link")
+
+    assert not os.path.lexists(tmp_path / "link")
+    assert (outside / "keep.txt").exists()
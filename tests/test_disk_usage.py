@@ -0,0 +1,16 @@
+from disk_usage import UsageReport
+
+
+def test_rescan_resets_counts(tmp_path):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "a" / "f.bin").write_bytes(b"x" * 10)
+    (tmp_path / "a" / "b" / "g.bin").write_bytes(b"y" * 5)
+
+    report = UsageReport(str(tmp_path), None, workers=2)
+    report.scan()
+    assert report.done and report.scanned_dirs == 3
+    assert report.total() == (15, 2)
+
+    report.scan()
+    assert report.scanned_dirs == 3
+    assert report.total() == (15, 2)
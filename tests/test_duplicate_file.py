@@ -0,0 +1,17 @@
+import errno
+
+from file_ops import duplicate_file
+
+
+def test_missing_target_dir_reports_enoent(tmp_path):
+    src = tmp_path / "src.bin"
+    src.write_bytes(b"z" * 5000)
+    ok = tmp_path / "a" / "src.bin"
+    ok.parent.mkdir()
+    missing = tmp_path / "gone" / "src.bin"
+
+    results = duplicate_file(str(src), [str(ok), str(missing)], chunk_size=1024, depth=2)
+
+    assert results[0].error is None and ok.read_bytes() == src.read_bytes()
+    assert f"[Errno {errno.ENOENT}]" in results[1].error
+    assert not missing.parent.exists()
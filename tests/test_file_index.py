@@ -0,0 +1,41 @@
+import os
+import time
+
+from file_index import FileIndexer
+from file_ops import _changed
+
+
+def _ready_indexer(root):
+    indexer = FileIndexer()
+    idx = indexer.add(str(root))
+    for _ in range(500):
+        if idx.ready:
+            break
+        time.sleep(0.01)
+    assert idx.ready
+    return indexer
+
+
+def test_change_notifications_update_index_in_background(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "report.txt").write_text("x")
+    indexer = _ready_indexer(tmp_path)
+    try:
+        assert [h.path for h in indexer.search("report").hits] == [os.path.join("a", "report.txt")]
+
+        (tmp_path / "a" / "summary.txt").write_text("y")
+        os.remove(tmp_path / "a" / "report.txt")
+        _changed(str(tmp_path / "a" / "summary.txt"))
+        _changed(str(tmp_path / "a" / "report.txt"))
+        assert indexer.flush(5)
+        assert indexer.search("report").hits == []
+        assert [h.path for h in indexer.search("summary").hits] == [os.path.join("a", "summary.txt")]
+
+        # 根目录变化（如快速清空）整体重建
+        (tmp_path / "new.bin").write_text("z")
+        _changed(str(tmp_path))
+        assert indexer.flush(5)
+        result = indexer.search("new.bin")
+        assert [h.path for h in result.hits] == ["new.bin"] and result.indexing == []
+    finally:
+        indexer.close()
@@ -0,0 +1,12 @@
+import os
+
+from file_ops import _preallocate
+
+
+def test_preallocate_does_not_move_eof(tmp_path):
+    path = tmp_path / "out.bin"
+    with open(path, "wb", buffering=0) as f:
+        f.write(b"a" * 100)
+        _preallocate(f.fileno(), 100, 1024 * 1024)
+        assert os.fstat(f.fileno()).st_size == 100
+    assert path.stat().st_size == 100
@@ -0,0 +1,83 @@
+import os
+
+from file_ops import sync_tree
+
+
+def test_sync_creates_empty_source_dirs(tmp_path):
+    src = tmp_path / "src"
+    (src / "empty" / "nested").mkdir(parents=True)
+    (src / "data").mkdir()
+    (src / "data" / "a.txt").write_bytes(b"a")
+    dst = tmp_path / "dst"
+
+    report = sync_tree(str(src), str(dst))
+    assert (dst / "empty" / "nested").is_dir()
+    assert (dst / "data" / "a.txt").read_bytes() == b"a"
+    assert report.files_copied == 1
+
+    # 清单记下了已建好的目录，再次同步无事可做
+    again = sync_tree(str(src), str(dst), dry_run=True)
+    assert again.to_copy == [] and again.dirs_to_create == []
+
+    # 目标上的目录被删掉后，信任清单时不会察觉，完整比对会重新建立
+    (dst / "empty" / "nested").rmdir()
+    assert sync_tree(str(src), str(dst), dry_run=True).dirs_to_create == []
+    sync_tree(str(src), str(dst), trust_manifest=False)
+    assert (dst / "empty" / "nested").is_dir()
+
+
+def test_delete_stale_keeps_dirs_present_in_source(tmp_path):
+    src = tmp_path / "src"
+    (src / "keep").mkdir(parents=True)
+    dst = tmp_path / "dst"
+    (dst / "keep").mkdir(parents=True)
+    (dst / "keep" / "old.txt").write_bytes(b"old")
+
+    report = sync_tree(str(src), str(dst), delete_stale=True, trust_manifest=False)
+    assert report.files_deleted == 1
+    assert (dst / "keep").is_dir() and not (dst / "keep" / "old.txt").exists()
+
+
+def test_sync_reports_paths_in_one_format_and_keeps_user_resume_json(tmp_path):
+    src = tmp_path / "src"
+    (src / "cfg").mkdir(parents=True)
+    (src / "cfg" / "tool.resume.json").write_text("{}")
+    dst = tmp_path / "dst"
+    (dst / "old").mkdir(parents=True)
+    (dst / "old" / "gone.txt").write_text("x")
+    # 目标上未完成拷贝留下的断点日志不算多余文件
+    (dst / "old" / "part.bin").write_bytes(b"p")
+    (dst / "old" / "part.bin.resume.json").write_text("{}")
+
+    report = sync_tree(str(src), str(dst), dry_run=True, trust_manifest=False)
+    assert report.to_copy == [os.path.join("cfg", "tool.resume.json")]
+    assert sorted(report.to_delete) == [os.path.join("old", "gone.txt"), os.path.join("old", "part.bin")]
+
+
+def test_delete_stale_with_manifest(tmp_path):
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    (src / "keep.txt").write_text("k")
+    (src / "sub" / "drop.txt").write_text("d")
+    (src / "drop2.txt").write_text("d2")
+    dst = tmp_path / "dst"
+    sync_tree(str(src), str(dst))
+
+    os.remove(src / "sub" / "drop.txt")
+    os.rmdir(src / "sub")
+    os.remove(src / "drop2.txt")
+
+    # 不删除时只报告多余文件，清单保留其条目，下次仍会报告
+    report = sync_tree(str(src), str(dst))
+    assert sorted(report.to_delete) == ["drop2.txt", os.path.join("sub", "drop.txt")]
+    assert report.manifest_used and report.files_deleted == 0
+    assert (dst / "drop2.txt").exists()
+    assert sorted(sync_tree(str(src), str(dst), dry_run=True).to_delete) == sorted(report.to_delete)
+
+    report = sync_tree(str(src), str(dst), delete_stale=True)
+    assert report.files_deleted == 2 and report.files_copied == 0
+    assert not (dst / "drop2.txt").exists()
+    assert not (dst / "sub").exists()  # 变空且源中已没有的目录一并清理
+    assert (dst / "keep.txt").read_text() == "k"
+    again = sync_tree(str(src), str(dst), dry_run=True)
+    assert again.to_delete == [] and again.to_copy == []
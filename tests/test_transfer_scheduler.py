@@ -0,0 +1,149 @@
+import threading
+import time
+
+from transfer_scheduler import QUEUED, RUNNING, DONE, TransferScheduler
+
+
+def _blocking(started, release):
+    def fn(job):
+        started.set()
+        release.wait(5)
+    return fn
+
+
+def test_mirror_job_reserves_every_target_device():
+    sched = TransferScheduler(default_concurrency=1)
+    started, release = threading.Event(), threading.Event()
+    single = sched.submit("H:", "copy", _blocking(started, release))
+    assert started.wait(5)
+
+    mirror_started, mirror_release = threading.Event(), threading.Event()
+    mirror = sched.submit(["H:", "G:"], "mirror", _blocking(mirror_started, mirror_release))
+    assert mirror.devices == ("G:", "H:")
+
+    # H: 被占用时镜像任务只占到 G:，仍在排队，G: 上的其他任务也要等它
+    assert not mirror_started.wait(0.2)
+    assert mirror.status == QUEUED and mirror.reserved == ["G:"]
+    other = sched.submit("G:", "copy-g", lambda job: None)
+    assert other.status == QUEUED
+    assert sched.pending("G:") == [mirror, other]
+
+    release.set()
+    assert mirror_started.wait(5)
+    assert single.status == DONE
+    assert mirror.status == RUNNING and other.status == QUEUED
+
+    done = threading.Event()
+    other.on_done = lambda job: done.set()
+    mirror_release.set()
+    assert done.wait(5)
+    assert mirror.status == DONE and other.status == DONE
+
+
+def test_cancel_queued_mirror_job_releases_reserved_slots():
+    sched = TransferScheduler(default_concurrency=1)
+    started, release = threading.Event(), threading.Event()
+    sched.submit("H:", "copy", _blocking(started, release))
+    assert started.wait(5)
+
+    mirror = sched.submit(["G:", "H:"], "mirror", lambda job: None)
+    assert mirror.reserved == ["G:"]
+    ran = threading.Event()
+    other = sched.submit("G:", "copy-g", lambda job: ran.set())
+    sched.cancel(mirror.job_id)
+
+    assert ran.wait(5)
+    assert other.status in (RUNNING, DONE)
+    release.set()
+
+
+def test_same_device_runs_by_priority_and_other_devices_in_parallel():
+    sched = TransferScheduler(default_concurrency=1)
+    started, release = threading.Event(), threading.Event()
+    sched.submit("G:", "first", _blocking(started, release))
+    assert started.wait(5)
+
+    order = []
+    all_done = threading.Event()
+
+    def record(name):
+        def fn(job):
+            order.append(name)
+        return fn
+
+    low = sched.submit("G:", "low", record("low"), priority=-10)
+    sched.submit("G:", "high", record("high"), priority=10)
+    sched.submit("G:", "normal", record("normal"))
+    low.on_done = lambda job: all_done.set()  # low 最后执行
+
+    # 另一个 U 盘不受 G: 上阻塞任务的影响
+    other_ran = threading.Event()
+    sched.submit("H:", "other", lambda job: other_ran.set())
+    assert other_ran.wait(5)
+    assert order == []
+
+    release.set()
+    assert all_done.wait(5)
+    assert order == ["high", "normal", "low"]
+
+
+def test_concurrency_limit_per_device():
+    sched = TransferScheduler(default_concurrency=2)
+    gate = threading.Event()
+    running = []
+    lock = threading.Lock()
+    peak = [0]
+
+    def fn(job):
+        with lock:
+            running.append(job)
+            peak[0] = max(peak[0], len(running))
+        gate.wait(5)
+        with lock:
+            running.remove(job)
+
+    jobs = [sched.submit("G:", f"job{i}", fn) for i in range(4)]
+    for _ in range(100):
+        if len(running) == 2:
+            break
+        time.sleep(0.01)
+    assert len(running) == 2
+    assert [j.status for j in jobs].count(QUEUED) == 2
+
+    gate.set()
+    for _ in range(500):
+        if all(j.status == DONE for j in jobs):
+            break
+        time.sleep(0.01)
+    assert all(j.status == DONE for j in jobs)
+    assert peak[0] == 2
+
+
+def test_overlapping_mirror_jobs_take_slots_in_sorted_order_without_deadlock():
+    sched = TransferScheduler(default_concurrency=1)
+    active = set()
+    lock = threading.Lock()
+    overlap = []
+
+    def fn(job):
+        with lock:
+            if any(set(job.devices) & set(other.devices) for other in active):
+                overlap.append(job.title)
+            active.add(job)
+        time.sleep(0.05)  # 占住名额一会儿，错误的调度才会表现为重叠
+        with lock:
+            active.discard(job)
+
+    jobs = [
+        sched.submit(["H:", "G:"], "a", fn),
+        sched.submit(["G:", "H:"], "b", fn),
+        sched.submit(["I:", "H:"], "c", fn),
+        sched.submit("I:", "d", fn),
+    ]
+    assert [j.devices for j in jobs[:3]] == [("G:", "H:"), ("G:", "H:"), ("H:", "I:")]
+    for _ in range(500):
+        if all(j.status == DONE for j in jobs):
+            break
+        time.sleep(0.01)
+    assert [j.status for j in jobs] == [DONE] * 4
+    assert overlap == []
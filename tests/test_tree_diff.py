@@ -0,0 +1,109 @@
+from tree_diff import TreeviewSync, as_row, diff_rows
+
+
+class FakeTree:
+    """
+    只实现 TreeviewSync 用到的 ttk.Treeview 方法，并记录调用次数
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.order = []
+        self.calls = {"delete": 0, "insert": 0, "item": 0, "move": 0}
+        self._selection = ()
+        self._focus = ""
+
+    def after_idle(self, fn):
+        return "after#1"
+
+    def after_cancel(self, after_id):
+        pass
+
+    def get_children(self, item=""):
+        return tuple(self.order)
+
+    def delete(self, *iids):
+        self.calls["delete"] += 1
+        for iid in iids:
+            self.order.remove(iid)
+            del self.rows[iid]
+
+    def insert(self, parent, index, iid, values):
+        self.calls["insert"] += 1
+        self.order.insert(index, iid)
+        self.rows[iid] = tuple(values)
+
+    def item(self, iid, values):
+        self.calls["item"] += 1
+        self.rows[iid] = tuple(values)
+
+    def move(self, iid, parent, index):
+        self.calls["move"] += 1
+        self.order.remove(iid)
+        self.order.insert(index, iid)
+
+    def selection(self):
+        return self._selection
+
+    def selection_set(self, items):
+        self._selection = tuple(items)
+
+    def focus(self, iid=None):
+        if iid is None:
+            return self._focus
+        self._focus = iid
+
+    def yview(self):
+        return (0.0, 1.0)
+
+    def yview_moveto(self, fraction):
+        pass
+
+
+def test_diff_rows():
+    old = {"a": ("1",), "b": ("2",), "c": ("3",)}
+    new = {"b": ("2",), "c": ("30",), "d": ("4",)}
+    diff = diff_rows(old, new)
+    assert diff.added == {"d": ("4",)}
+    assert diff.removed == ["a"]
+    assert diff.changed == {"c": ("30",)}
+    assert diff.order == ["b", "c", "d"]
+    assert not diff_rows(new, dict(new))
+
+
+def test_as_row_matches_treeview_strings():
+    assert as_row(["x", 1, None, 2.5]) == ("x", "1", "", "2.5")
+
+
+def test_sync_applies_only_differences_and_keeps_selection():
+    tree = FakeTree()
+    tree.order.append("loading")
+    tree.rows["loading"] = ("加载中...",)
+    sync = TreeviewSync(tree)
+
+    sync.update({"a": ("1",), "b": ("2",)})
+    sync.flush()
+    assert tree.order == ["a", "b"]  # 占位行被删除
+
+    tree.selection_set(["a", "b"])
+    tree.focus("b")
+    tree.calls = dict.fromkeys(tree.calls, 0)
+    sync.update({"b": ("2",), "c": ("3",)})
+    sync.update({"b": ("20",), "c": ("3",)})  # 合并为一次应用
+    diff = sync.flush()
+
+    assert diff.removed == ["a"] and diff.changed == {"b": ("20",)} and list(diff.added) == ["c"]
+    assert tree.order == ["b", "c"] and tree.rows == {"b": ("20",), "c": ("3",)}
+    assert tree.calls == {"delete": 1, "insert": 1, "item": 1, "move": 0}
+    assert tree.selection() == ("b",) and tree.focus() == "b"
+
+    tree.calls = dict.fromkeys(tree.calls, 0)
+    sync.update({"c": ("3",), "b": ("20",)})  # 只有顺序变化
+    sync.flush()
+    assert tree.order == ["c", "b"]
+    assert tree.calls["insert"] == tree.calls["item"] == tree.calls["delete"] == 0
+
+    tree.calls = dict.fromkeys(tree.calls, 0)
+    sync.update({"c": ("3",), "b": ("20",)})
+    assert not sync.flush()
+    assert sum(tree.calls.values()) == 0
@@ -0,0 +1,147 @@
+import subprocess
+import threading
+import time
+
+import pytest
+
+import usb_info
+
+
+@pytest.fixture(autouse=True)
+def _restore_targeted_flag(monkeypatch):
+    monkeypatch.setattr(usb_info, "_pnputil_targeted_ok", True)
+
+
+def _fake_run(returncode, stdout="", stderr=""):
+    def run(args, **kwargs):
+        return subprocess.CompletedProcess(args, returncode, stdout, stderr)
+    return run
+
+
+def test_targeted_query_with_nothing_wanted_returns_empty():
+    assert usb_info._query_pnputil_targeted(set()) == {}
+
+
+def test_targeted_mode_survives_transient_failures(monkeypatch):
+    def timeout(args, **kwargs):
+        raise subprocess.TimeoutExpired(args, kwargs.get("timeout"))
+
+    monkeypatch.setattr(usb_info.subprocess, "run", timeout)
+    assert usb_info._query_pnputil_targeted({"USB\\VID_0781&PID_5581\\S1"}) == {}
+    assert usb_info._pnputil_targeted_ok
+
+    monkeypatch.setattr(usb_info.subprocess, "run", _fake_run(1, "No devices were found on the system."))
+    usb_info._query_pnputil_targeted({"USB\\VID_0781&PID_5581\\S1"})
+    assert usb_info._pnputil_targeted_ok
+
+
+def test_targeted_mode_disabled_on_unknown_switch(monkeypatch):
+    monkeypatch.setattr(usb_info.subprocess, "run", _fake_run(87, "Invalid argument: /instanceid"))
+    usb_info._query_pnputil_targeted({"USB\\VID_0781&PID_5581\\S1"})
+    assert not usb_info._pnputil_targeted_ok
+
+
+def _dev(pnp, service, bus=None):
+    return {"pnp_device_id": pnp, "service": service, "bus": bus}
+
+
+class FakeCollector:
+    """
+    代替 _collect_usb_devices：记录调用次数，可阻塞在 gate 上，可在后台回调 on_rest
+    """
+
+    def __init__(self, complete=True, rest=None):
+        self.calls = 0
+        self.complete = complete
+        self.rest = rest
+        self.gate = None
+        self.entered = threading.Event()
+
+    def __call__(self, only_storage, on_partial, wmi_timeout, pnputil_timeout, on_rest=None):
+        self.calls += 1
+        self.entered.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        devices = [_dev("USBSTOR\\A", "USBSTOR", 1), _dev("USB\\KBD", "HidUsb")]
+        if self.rest is not None and on_rest is not None:
+            threading.Timer(0.05, on_rest, args=(self.rest, True)).start()
+        return devices, self.complete
+
+
+def test_cache_hit_until_invalidated(monkeypatch):
+    fake = FakeCollector()
+    monkeypatch.setattr(usb_info, "_collect_usb_devices", fake)
+    cache = usb_info.DeviceCache()
+
+    assert [d["pnp_device_id"] for d in cache.get(only_storage=True)] == ["USBSTOR\\A"]
+    assert len(cache.get(only_storage=False)) == 2
+    assert fake.calls == 1
+
+    cache.invalidate()
+    cache.get()
+    st = cache.stats()
+    assert fake.calls == 2
+    assert (st.hits, st.misses, st.invalidations, st.refreshes) == (1, 2, 1, 2)
+
+
+def test_invalidate_during_refresh_discards_result(monkeypatch):
+    fake = FakeCollector()
+    fake.gate = threading.Event()
+    monkeypatch.setattr(usb_info, "_collect_usb_devices", fake)
+    cache = usb_info.DeviceCache()
+
+    t = threading.Thread(target=cache.get)
+    t.start()
+    assert fake.entered.wait(5)
+    cache.invalidate()  # 采集期间发生插拔
+    fake.gate.set()
+    t.join(5)
+
+    cache.get()
+    assert fake.calls == 2
+
+
+def test_concurrent_misses_collect_once(monkeypatch):
+    fake = FakeCollector()
+    fake.gate = threading.Event()
+    monkeypatch.setattr(usb_info, "_collect_usb_devices", fake)
+    cache = usb_info.DeviceCache()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(4)]
+    for t in threads:
+        t.start()
+    assert fake.entered.wait(5)
+    fake.gate.set()
+    for t in threads:
+        t.join(5)
+    assert fake.calls == 1 and len(results) == 4
+
+
+def test_partial_result_cached_for_short_ttl(monkeypatch):
+    # 后台补齐一直没有回调（pnputil 卡住），部分结果过期后也要重新采集而不是一直等
+    fake = FakeCollector(complete=False)
+    monkeypatch.setattr(usb_info, "_collect_usb_devices", fake)
+    cache = usb_info.DeviceCache(partial_ttl_sec=0.2)
+
+    cache.get()
+    cache.get()
+    assert fake.calls == 1
+    time.sleep(0.25)
+    cache.get()
+    assert fake.calls == 2
+
+
+def test_all_devices_wait_for_background_fill(monkeypatch):
+    filled = [_dev("USBSTOR\\A", "USBSTOR", 1), _dev("USB\\KBD", "HidUsb", 2)]
+    fake = FakeCollector(complete=False, rest=filled)
+    monkeypatch.setattr(usb_info, "_collect_usb_devices", fake)
+    refreshed = []
+    cache = usb_info.DeviceCache(on_refresh=lambda devs, complete: refreshed.append(complete))
+
+    devs = cache.get(only_storage=False)
+    assert [d["bus"] for d in devs] == [1, 2]
+    assert refreshed == [False, True]
+    # 补齐后的完整结果按正常规则缓存
+    cache.get(only_storage=False)
+    assert fake.calls == 1
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Iterable, Optional
+
+
+class TransferCancelled(Exception):
+    """传输被取消时由 TransferControl.checkpoint 抛出"""
+
+
+class TokenBucket:
+    """
+    令牌桶限速器：令牌以 rate_bps 字节/秒的速度补充，最多积攒 burst_sec 秒的量。
+    允许单次消耗超过桶容量（欠账），随后等待令牌补回，因此任意块大小都能被限速。
+    rate_bps 为 None 或 0 表示不限速；可在其他线程中随时调用 set_rate 调整。
+    """
+
+    def __init__(self, rate_bps: Optional[float] = None, burst_sec: float = 0.25):
+        self.burst_sec = burst_sec
+        self._lock = threading.Lock()
+        self._rate = rate_bps or None
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+
+    @property
+    def rate(self) -> Optional[float]:
+        return self._rate
+
+    def set_rate(self, rate_bps: Optional[float]) -> None:
+        with self._lock:
+            self._refill()
+            self._rate = rate_bps or None
+            # 调低速率时丢掉按旧速率积攒的令牌，新限制立即生效
+            if self._rate is None:
+                self._tokens = 0.0
+            else:
+                self._tokens = min(self._tokens, self._rate * self.burst_sec)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self._rate is not None:
+            self._tokens = min(self._tokens + (now - self._stamp) * self._rate, self._rate * self.burst_sec)
+        self._stamp = now
+
+    def consume(self, n: int, control: Optional["TransferControl"] = None) -> None:
+        """
+        消耗 n 字节的令牌，不足时阻塞；传入 control 时等待期间可被取消
+        """
+        with self._lock:
+            if self._rate is None:
+                return
+            self._refill()
+            self._tokens -= n
+        while True:
+            with self._lock:
+                if self._rate is None:
+                    return
+                self._refill()
+                if self._tokens >= 0:
+                    return
+                delay = -self._tokens / self._rate
+            # 分段等待，期间的速率调整与取消都能及时生效
+            delay = min(delay, 0.1)
+            if control is not None:
+                control.sleep(delay)
+            else:
+                time.sleep(delay)
+
+
+class TransferControl:
+    """
+    单个传输的控制句柄：暂停/继续/取消与限速。
+    拷贝函数在每个分块后调用 checkpoint(n)：暂停时阻塞，取消时抛出 TransferCancelled，
+    并依次向自身的限速器和 shared 中的共享限速器（如全局限速）申请 n 字节的令牌。
+    """
+
+    def __init__(self, rate_bps: Optional[float] = None, shared: Iterable[TokenBucket] = ()):
+        self.limiter = TokenBucket(rate_bps)
+        self._shared = list(shared)
+        self._cond = threading.Condition()
+        self._paused = False
+        self._cancelled = False
+        self._discard = False
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    @property
+    def discard(self) -> bool:
+        """
+        取消时是否同时丢弃已写入的部分（默认保留，可续传的拷贝下次从断点继续）
+        """
+        return self._discard
+
+    def set_rate(self, rate_bps: Optional[float]) -> None:
+        self.limiter.set_rate(rate_bps)
+
+    def pause(self) -> None:
+        with self._cond:
+            self._paused = True
+
+    def resume(self) -> None:
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+
+    def cancel(self, discard: bool = False) -> None:
+        with self._cond:
+            self._cancelled = True
+            self._discard = self._discard or discard
+            self._cond.notify_all()
+
+    def check(self) -> None:
+        if self._cancelled:
+            raise TransferCancelled("传输已取消")
+
+    def sleep(self, sec: float) -> None:
+        """
+        可被取消打断的 sleep
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._cancelled, timeout=sec)
+        self.check()
+
+    def checkpoint(self, n: int = 0) -> None:
+        with self._cond:
+            while self._paused and not self._cancelled:
+                self._cond.wait()
+        self.check()
+        if n:
+            for bucket in (self.limiter, *self._shared):
+                bucket.consume(n, self)
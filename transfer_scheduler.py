@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from transfer_control import TokenBucket, TransferCancelled, TransferControl
+
+
+class JobCancelled(TransferCancelled):
+    """任务被取消时由 TransferJob.check_cancelled 抛出"""
+
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+@dataclass(eq=False)
+class TransferJob:
+    job_id: int
+    device: str  # 显示用的设备名；单设备任务即设备键（如 "G:"），多设备任务为各设备键以 "+" 连接
+    title: str
+    priority: int  # 数值越大越先执行
+    fn: Callable[["TransferJob"], Any]
+    on_done: Optional[Callable[["TransferJob"], None]] = None
+
+    status: str = QUEUED
+    progress: float = 0.0  # 0.0 ~ 1.0
+    speed_bps: float = 0.0
+    eta_sec: Optional[float] = None
+    detail: str = ""
+    result: Any = None
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # 暂停/取消/限速句柄，任务函数把它传给 copy_with_progress 等拷贝函数
+    control: TransferControl = field(default_factory=TransferControl)
+    # 任务占用的设备键（已排序）；多设备任务（如一拖多镜像）要在每个设备上都占到名额才开始
+    devices: Tuple[str, ...] = ()
+    # 已占到名额的设备，按 devices 的顺序依次占用
+    reserved: List[str] = field(default_factory=list)
+    seq: int = 0
+
+    def update(
+            self,
+            progress: Optional[float] = None,
+            speed_bps: Optional[float] = None,
+            eta_sec: Optional[float] = None,
+            detail: Optional[str] = None,
+    ) -> None:
+        """
+        由任务函数在工作线程中调用；UI 线程定时读取这些字段，不产生额外事件
+        """
+        if progress is not None:
+            self.progress = progress
+        if speed_bps is not None:
+            self.speed_bps = speed_bps
+        if eta_sec is not None:
+            self.eta_sec = eta_sec
+        if detail is not None:
+            self.detail = detail
+
+    def check_cancelled(self) -> None:
+        if self.control.cancelled:
+            raise JobCancelled(f"任务已取消：{self.title}")
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+
+class _DeviceQueue:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.running = 0
+        self.heap: List[tuple] = []
+
+
+class TransferScheduler:
+    """
+    按设备分队列的传输调度器：
+    - 同一设备上的任务按优先级排队，最多同时运行 concurrency 个，避免多个拷贝抢同一个 U 盘；
+    - 不同设备的队列互不影响，可以并行；
+    - 涉及多个设备的任务（如一拖多镜像）在每个设备的队列中排队，按设备键排序依次占用名额，
+      全部占到后才开始，并计入每个设备的并发上限；按固定顺序占用避免了互相等待；
+    - 支持取消排队中/运行中的任务以及查看队列；
+    - 运行中的任务可以暂停/继续，并可随时调整单个任务限速与全局限速（所有任务共享一个令牌桶）。
+    """
+
+    def __init__(
+            self,
+            default_concurrency: int = 1,
+            on_change: Optional[Callable[[TransferJob], None]] = None,
+    ):
+        self.default_concurrency = max(default_concurrency, 1)
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._queues: Dict[str, _DeviceQueue] = {}
+        self._jobs: Dict[int, TransferJob] = {}
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+        self.global_limiter = TokenBucket()
+
+    def _queue(self, device: str) -> _DeviceQueue:
+        q = self._queues.get(device)
+        if q is None:
+            q = _DeviceQueue(self.default_concurrency)
+            self._queues[device] = q
+        return q
+
+    def set_concurrency(self, device: Optional[str], limit: int) -> None:
+        """
+        设置某个设备的并发上限；device 为 None 时修改默认值并应用到所有设备
+        """
+        limit = max(limit, 1)
+        with self._lock:
+            if device is None:
+                self.default_concurrency = limit
+                for q in self._queues.values():
+                    q.limit = limit
+            else:
+                self._queue(device).limit = limit
+        self._dispatch()
+
+    def submit(
+            self,
+            device: Union[str, Sequence[str]],
+            title: str,
+            fn: Callable[[TransferJob], Any],
+            priority: int = 0,
+            on_done: Optional[Callable[[TransferJob], None]] = None,
+    ) -> TransferJob:
+        """
+        提交任务。device 为设备键，或多个设备键（任务同时占用这些设备）；
+        fn 在工作线程中以 job 为参数调用，其返回值保存到 job.result；
+        on_done 在任务结束（成功/失败/取消）后于同一工作线程中调用。
+        """
+        devices = tuple(sorted({device} if isinstance(device, str) else set(device)))
+        if not devices:
+            raise ValueError("至少需要一个设备")
+        with self._lock:
+            job = TransferJob(
+                job_id=next(self._ids),
+                device="+".join(devices),
+                title=title,
+                priority=priority,
+                fn=fn,
+                on_done=on_done,
+                control=TransferControl(shared=[self.global_limiter]),
+                devices=devices,
+                seq=next(self._seq),
+            )
+            self._jobs[job.job_id] = job
+            for d in devices:
+                heapq.heappush(self._queue(d).heap, (-priority, job.seq, job))
+        self._notify(job)
+        self._dispatch()
+        return job
+
+    def cancel(self, job_id: int, discard: bool = False) -> bool:
+        """
+        取消任务：排队中的直接标记为已取消；运行中的设置取消标志，由任务在下一个检查点退出。
+        discard=True 时同时丢弃已写入的部分，否则可续传的拷贝保留断点
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job.control.cancel(discard)
+            if job.status != QUEUED:
+                return True
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            # 多设备任务可能已占了部分设备的名额，归还
+            for d in job.reserved:
+                self._queue(d).running -= 1
+            job.reserved.clear()
+        self._notify(job)
+        if job.on_done:
+            job.on_done(job)
+        self._dispatch()
+        return True
+
+    def pause(self, job_id: int) -> bool:
+        job = self._get_unfinished(job_id)
+        if job is None:
+            return False
+        job.control.pause()
+        self._notify(job)
+        return True
+
+    def resume(self, job_id: int) -> bool:
+        job = self._get_unfinished(job_id)
+        if job is None:
+            return False
+        job.control.resume()
+        self._notify(job)
+        return True
+
+    def set_job_rate(self, job_id: int, rate_bps: Optional[float]) -> bool:
+        """
+        调整单个任务的限速（字节/秒），None 或 0 表示不限速，立即对运行中的任务生效
+        """
+        job = self._get_unfinished(job_id)
+        if job is None:
+            return False
+        job.control.set_rate(rate_bps)
+        return True
+
+    def set_global_rate(self, rate_bps: Optional[float]) -> None:
+        """
+        调整所有任务共享的总限速（字节/秒），None 或 0 表示不限速
+        """
+        self.global_limiter.set_rate(rate_bps)
+
+    def _get_unfinished(self, job_id: int) -> Optional[TransferJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return None if job is None or job.finished else job
+
+    def jobs(self) -> List[TransferJob]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.job_id)
+
+    def pending(self, device: Optional[str] = None) -> List[TransferJob]:
+        """
+        按执行顺序返回排队中的任务
+        """
+        with self._lock:
+            items = [
+                j for j in self._jobs.values()
+                if j.status == QUEUED and (device is None or device in j.devices)
+            ]
+        items.sort(key=lambda j: (-j.priority, j.seq))
+        return items
+
+    def clear_finished(self) -> None:
+        with self._lock:
+            for job_id in [j.job_id for j in self._jobs.values() if j.finished]:
+                del self._jobs[job_id]
+
+    def _dispatch(self) -> None:
+        """
+        按设备键顺序检查各队列，把空出的名额分给队首任务：
+        多设备任务只能按 devices 的顺序占用名额（占到前面的设备后才能占下一个），
+        还没轮到它占的设备上，它会一直留在队首，排在后面的任务也要等待，以免它被饿死。
+        """
+        ready = []
+        with self._lock:
+            progress = True
+            while progress:
+                progress = False
+                for device in sorted(self._queues):
+                    q = self._queues[device]
+                    while q.heap and q.running < q.limit:
+                        candidate = q.heap[0][2]
+                        if candidate.status != QUEUED:
+                            heapq.heappop(q.heap)
+                            continue
+                        if candidate.devices[len(candidate.reserved)] != device:
+                            break
+                        heapq.heappop(q.heap)
+                        q.running += 1
+                        candidate.reserved.append(device)
+                        progress = True
+                        if len(candidate.reserved) == len(candidate.devices):
+                            candidate.status = RUNNING
+                            candidate.started_at = time.time()
+                            ready.append(candidate)
+        for job in ready:
+            self._notify(job)
+            threading.Thread(
+                target=self._run, args=(job,), name=f"transfer-{job.device}-{job.job_id}", daemon=True
+            ).start()
+
+    def _run(self, job: TransferJob) -> None:
+        try:
+            job.result = job.fn(job)
+            status = DONE
+        except TransferCancelled:
+            status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            status = FAILED
+        with self._lock:
+            job.status = status
+            job.finished_at = time.time()
+            for d in job.reserved:
+                self._queue(d).running -= 1
+            job.reserved.clear()
+        self._notify(job)
+        if job.on_done:
+            try:
+                job.on_done(job)
+            except Exception:
+                pass
+        self._dispatch()
+
+    def _notify(self, job: TransferJob) -> None:
+        if self.on_change:
+            try:
+                self.on_change(job)
+            except Exception:
+                pass
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+Row = Tuple[str, ...]
+
+
+@dataclass
+class RowDiff:
+    added: Dict[str, Row] = field(default_factory=dict)
+    removed: List[str] = field(default_factory=list)
+    changed: Dict[str, Row] = field(default_factory=dict)
+    order: List[str] = field(default_factory=list)  # 新结果中的键顺序
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+def diff_rows(old: Dict[str, Row], new: Dict[str, Row]) -> RowDiff:
+    """
+    按键比较两组行（键 -> 列值），给出新增、删除与内容变化的行
+    """
+    diff = RowDiff(order=list(new))
+    for key, values in new.items():
+        prev = old.get(key)
+        if prev is None:
+            diff.added[key] = values
+        elif prev != values:
+            diff.changed[key] = values
+    diff.removed = [key for key in old if key not in new]
+    return diff
+
+
+def as_row(values: Sequence[Optional[Hashable]]) -> Row:
+    """
+    转成与 Treeview 显示一致的字符串元组，None 显示为空
+    """
+    return tuple("" if v is None else str(v) for v in values)
+
+
+class TreeviewSync:
+    """
+    把按键组织的行同步到 ttk.Treeview（行 iid 即键）：
+    - update() 只记录最新一份数据，并在空闲时统一应用，短时间内的多次刷新合并为一次；
+    - 应用时只删除/插入/修改有差异的行，必要时调整顺序；
+    - 保留选中项、焦点与滚动位置，不在 rows 中的其它行（如“加载中”占位）会被删除。
+    只能在 UI 线程中调用。
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self._rows: Dict[str, Row] = {}
+        self._pending: Optional[Dict[str, Row]] = None
+        self._after_id = None
+
+    @property
+    def rows(self) -> Dict[str, Row]:
+        return self._rows
+
+    def update(self, rows: Dict[str, Row]) -> None:
+        self._pending = rows
+        if self._after_id is None:
+            self._after_id = self.tree.after_idle(self.flush)
+
+    def flush(self) -> Optional[RowDiff]:
+        if self._after_id is not None:
+            try:
+                self.tree.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+        rows, self._pending = self._pending, None
+        if rows is None:
+            return None
+
+        tree = self.tree
+        diff = diff_rows(self._rows, rows)
+        children = list(tree.get_children())
+        stray = [iid for iid in children if iid not in self._rows]
+        if not diff and not stray:
+            if children != diff.order:
+                # 行内容都没变、只是顺序不同，也要调整顺序
+                for index, key in enumerate(diff.order):
+                    tree.move(key, "", index)
+                self._rows = dict(rows)
+            return diff
+
+        selection = tree.selection()
+        focus = tree.focus()
+        top = tree.yview()[0]
+
+        doomed = diff.removed + stray
+        if doomed:
+            tree.delete(*doomed)
+        for key, values in diff.changed.items():
+            tree.item(key, values=values)
+        for index, key in enumerate(diff.order):
+            if key in diff.added:
+                tree.insert("", index, iid=key, values=diff.added[key])
+        if list(tree.get_children()) != diff.order:
+            for index, key in enumerate(diff.order):
+                tree.move(key, "", index)
+        self._rows = dict(rows)
+
+        kept = [iid for iid in selection if iid in rows]
+        if list(kept) != list(tree.selection()):
+            tree.selection_set(kept)
+        if focus in rows:
+            tree.focus(focus)
+        tree.yview_moveto(top)
+        return diff
@@ -0,0 +1,407 @@
+from __future__ import annotations
+
+import argparse
+import errno
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from file_ops import UncachedReader, get_volume_info, invalidate_listing
+from transfer_control import TransferControl
+
+BENCH_FILE_NAME = ".usb_bench.tmp"
+BENCH_TESTS = ("seq_write", "seq_read", "rand4k_write", "rand4k_read")
+
+_RESULTS_PATH = os.path.join(os.path.expanduser("~"), ".usb_lab_gui", "bench_results.json")
+_RESULTS_KEEP = 50  # 每个型号保留的最近测试次数
+_results_lock = threading.Lock()
+
+
+@dataclass
+class BenchResult:
+    test: str  # BENCH_TESTS 之一
+    block_size: int
+    queue_depth: int
+    bytes: int
+    ops: int
+    elapsed_sec: float
+    mb_per_sec: float
+    iops: float
+    lat_p50_ms: float
+    lat_p95_ms: float
+    lat_p99_ms: float
+    lat_max_ms: float
+    io_mode: str  # 读："direct"/"dontneed"/"cached"；写："sync"（O_SYNC）或 "fsync"（每次写后 fsync）
+
+
+@dataclass
+class BenchProgress:
+    test: str
+    done: float  # 当前测试完成的比例 0~1
+    tests_done: int
+    tests_total: int
+
+
+@dataclass
+class BenchReport:
+    mount: str
+    model_key: Optional[str]  # "VID:PID"，按型号保存结果
+    product: Optional[str]
+    usb_version: Optional[str]
+    fs_type: Optional[str]
+    file_size: int
+    started_at: float
+    results: List[BenchResult] = field(default_factory=list)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def _summarize(test: str, block: int, qd: int, latencies: List[float], elapsed: float, mode: str) -> BenchResult:
+    latencies.sort()
+    ops = len(latencies)
+    nbytes = ops * block
+    elapsed = max(elapsed, 1e-9)
+    return BenchResult(
+        test=test,
+        block_size=block,
+        queue_depth=qd,
+        bytes=nbytes,
+        ops=ops,
+        elapsed_sec=elapsed,
+        mb_per_sec=nbytes / elapsed / (1024 * 1024),
+        iops=ops / elapsed,
+        lat_p50_ms=_percentile(latencies, 0.50) * 1000,
+        lat_p95_ms=_percentile(latencies, 0.95) * 1000,
+        lat_p99_ms=_percentile(latencies, 0.99) * 1000,
+        lat_max_ms=(latencies[-1] if latencies else 0.0) * 1000,
+        io_mode=mode,
+    )
+
+
+class _OffsetSource:
+    """
+    各线程共享的偏移来源：顺序模式按块递增直到文件末尾，随机模式在截止时间前不断给出随机对齐偏移
+    """
+
+    def __init__(self, file_size: int, block: int, sequential: bool, deadline: Optional[float], seed: int = 0):
+        self.blocks = file_size // block
+        self.block = block
+        self.sequential = sequential
+        self.deadline = deadline
+        self.issued = 0
+        self._lock = threading.Lock()
+        self._rnd = random.Random(seed)
+
+    def next(self) -> Optional[int]:
+        with self._lock:
+            if self.sequential:
+                if self.issued >= self.blocks:
+                    return None
+                i = self.issued
+            else:
+                if time.perf_counter() >= self.deadline or self.blocks == 0:
+                    return None
+                i = self._rnd.randrange(self.blocks)
+            self.issued += 1
+            return i * self.block
+
+    def fraction(self) -> float:
+        if self.sequential:
+            return self.issued / max(self.blocks, 1)
+        return 0.0
+
+
+def _open_for_write(path: str) -> tuple[int, str]:
+    """
+    以直写方式打开测试文件：有 O_SYNC 时使用（每次写返回即已落盘），否则每次写后 fsync
+    """
+    o_sync = getattr(os, "O_SYNC", 0)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0) | o_sync, 0o644)
+    return fd, ("sync" if o_sync else "fsync")
+
+
+def _pwrite(fd: int, data: memoryview, offset: int) -> None:
+    if hasattr(os, "pwrite"):
+        while data:
+            n = os.pwrite(fd, data, offset)
+            data, offset = data[n:], offset + n
+        return
+    # 没有 pwrite 的平台（Windows）：每个线程有自己的 fd，lseek + write 不会互相干扰
+    os.lseek(fd, offset, os.SEEK_SET)
+    while data:
+        n = os.write(fd, data)
+        data = data[n:]
+
+
+def _run_workers(qd: int, fn: Callable[[int], None]) -> float:
+    errors = []
+
+    def wrap(k: int) -> None:
+        try:
+            fn(k)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=wrap, args=(k,), daemon=True) for k in range(qd)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    if errors:
+        raise errors[0]
+    return elapsed
+
+
+def _write_test(
+        path: str, test: str, block: int, qd: int, source: _OffsetSource, control: Optional[TransferControl],
+) -> BenchResult:
+    payload = memoryview(os.urandom(block))  # 随机数据，避免主控压缩/去重影响结果
+    per_thread: List[List[float]] = [[] for _ in range(qd)]
+    mode = ["sync"]
+
+    def worker(k: int) -> None:
+        fd, mode[0] = _open_for_write(path)
+        lat = per_thread[k]
+        try:
+            while True:
+                if control is not None:
+                    control.checkpoint()
+                offset = source.next()
+                if offset is None:
+                    return
+                t = time.perf_counter()
+                _pwrite(fd, payload, offset)
+                if mode[0] == "fsync":
+                    os.fsync(fd)
+                lat.append(time.perf_counter() - t)
+        finally:
+            os.close(fd)
+
+    elapsed = _run_workers(qd, worker)
+    return _summarize(test, block, qd, [x for lat in per_thread for x in lat], elapsed, mode[0])
+
+
+def _read_test(
+        path: str, test: str, block: int, qd: int, source: _OffsetSource, control: Optional[TransferControl],
+) -> BenchResult:
+    per_thread: List[List[float]] = [[] for _ in range(qd)]
+    modes = [""] * qd
+
+    def worker(k: int) -> None:
+        # 每个线程一个绕过缓存的读句柄与对齐缓冲区
+        with UncachedReader(path, chunk_size=block) as reader:
+            modes[k] = reader.mode
+            lat = per_thread[k]
+            while True:
+                if control is not None:
+                    control.checkpoint()
+                offset = source.next()
+                if offset is None:
+                    return
+                t = time.perf_counter()
+                reader.read_at(offset, block)
+                lat.append(time.perf_counter() - t)
+
+    elapsed = _run_workers(qd, worker)
+    return _summarize(test, block, qd, [x for lat in per_thread for x in lat], elapsed, modes[0] or "cached")
+
+
+def run_benchmark(
+        mount: str,
+        file_size: int = 256 * 1024 * 1024,
+        seq_block: int = 1024 * 1024,
+        rand_block: int = 4096,
+        queue_depth: int = 1,
+        rand_sec: float = 5.0,
+        tests: tuple[str, ...] = BENCH_TESTS,
+        on_progress: Optional[Callable[[BenchProgress], None]] = None,
+        control: Optional[TransferControl] = None,
+        device: Optional[Dict] = None,
+) -> BenchReport:
+    """
+    在 mount 上创建测试文件并依次执行各项测试，结束后删除测试文件：
+    - seq_write/seq_read：按 seq_block 大块顺序写入/读取整个文件；
+    - rand4k_write/rand4k_read：在文件内随机对齐偏移写入/读取 rand_block 字节，持续 rand_sec 秒；
+    - queue_depth 个线程同时发起请求，模拟队列深度；
+    - 写入使用直写（O_SYNC 或每次 fsync），读取绕过页缓存（见 UncachedReader），测的是设备而不是内存。
+    随机测试需要测试文件，即使未选 seq_write 也会先写出文件（不计入结果）。
+    device 为 usb_info 给出的设备信息，用于按型号保存结果。
+    """
+    unknown = set(tests) - set(BENCH_TESTS)
+    if unknown:
+        raise ValueError(f"未知的测试项：{', '.join(sorted(unknown))}")
+    qd = max(1, queue_depth)
+    file_size -= file_size % seq_block
+    if file_size <= 0:
+        raise ValueError("测试文件大小必须不小于顺序块大小")
+    free, fs_type, _ = get_volume_info(mount)
+    # 留出 5% 余量，避免把 U 盘写满
+    if file_size > free * 0.95:
+        raise OSError(errno.ENOSPC, f"可用空间不足：需要 {file_size / (1024 * 1024):.0f} MB", mount)
+
+    dev = device or {}
+    vid, pid = dev.get("vendor_id"), dev.get("product_id")
+    report = BenchReport(
+        mount=mount,
+        model_key=f"{vid}:{pid}" if vid and pid else None,
+        product=dev.get("product"),
+        usb_version=dev.get("usb_version_bcd"),
+        fs_type=fs_type,
+        file_size=file_size,
+        started_at=time.time(),
+    )
+    path = os.path.join(mount, BENCH_FILE_NAME)
+    plan = [t for t in BENCH_TESTS if t in tests]
+    if "seq_write" not in plan:
+        plan.insert(0, "_prepare")
+    measured = [t for t in plan if t != "_prepare"]
+    stop_progress = threading.Event()
+
+    def report_progress(test: str, source: _OffsetSource, start: float) -> None:
+        if on_progress is None:
+            return
+        while not stop_progress.wait(0.25):
+            if source.sequential:
+                done = source.fraction()
+            else:
+                done = min(1.0, (time.perf_counter() - start) / max(rand_sec, 1e-9))
+            on_progress(BenchProgress(test, done, len(report.results), len(measured)))
+
+    try:
+        for test in plan:
+            sequential = test in ("seq_write", "seq_read", "_prepare")
+            block = seq_block if sequential else rand_block
+            start = time.perf_counter()
+            source = _OffsetSource(
+                file_size, block, sequential, None if sequential else start + rand_sec, seed=len(report.results),
+            )
+            stop_progress.clear()
+            ticker = threading.Thread(target=report_progress, args=(test, source, start), daemon=True)
+            ticker.start()
+            try:
+                if test in ("seq_write", "rand4k_write", "_prepare"):
+                    result = _write_test(path, test, block, qd, source, control)
+                else:
+                    result = _read_test(path, test, block, qd, source, control)
+            finally:
+                stop_progress.set()
+                ticker.join()
+            if test != "_prepare":
+                report.results.append(result)
+        if on_progress is not None:
+            on_progress(BenchProgress(measured[-1] if measured else "", 1.0, len(report.results), len(measured)))
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        invalidate_listing(path)
+    return report
+
+
+def _load_results(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_report(report: BenchReport, path: str = _RESULTS_PATH) -> None:
+    """
+    按型号 (VID:PID) 追加保存，每个型号只保留最近 _RESULTS_KEEP 次；型号未知时不保存
+    """
+    if not report.model_key:
+        return
+    with _results_lock:
+        data = _load_results(path)
+        runs = data.setdefault(report.model_key, [])
+        runs.append(asdict(report))
+        del runs[:-_RESULTS_KEEP]
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+
+def load_reports(model_key: Optional[str] = None, path: str = _RESULTS_PATH) -> Dict[str, List[BenchReport]]:
+    """
+    读取保存的测试结果：型号 -> 按时间先后排列的报告列表；给出 model_key 时只返回该型号
+    """
+    with _results_lock:
+        data = _load_results(path)
+    out = {}
+    for key, runs in data.items():
+        if model_key is not None and key != model_key:
+            continue
+        reports = []
+        for r in runs:
+            try:
+                results = [BenchResult(**x) for x in r.get("results", [])]
+                reports.append(BenchReport(**{**r, "results": results}))
+            except TypeError:
+                continue
+        out[key] = reports
+    return out
+
+
+def format_results(results: List[BenchResult]) -> List[str]:
+    lines = [f"{'test':<13} {'block':>7} {'QD':>3} {'MB/s':>9} {'IOPS':>9} {'p50 ms':>8} {'p99 ms':>8} {'mode':>8}"]
+    for r in results:
+        block = f"{r.block_size // 1024}K" if r.block_size < 1024 * 1024 else f"{r.block_size // (1024 * 1024)}M"
+        lines.append(
+            f"{r.test:<13} {block:>7} {r.queue_depth:>3} {r.mb_per_sec:>9.1f} {r.iops:>9.0f} "
+            f"{r.lat_p50_ms:>8.2f} {r.lat_p99_ms:>8.2f} {r.io_mode:>8}"
+        )
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="U 盘读写测速：顺序大块与随机 4K，支持队列深度与绕过缓存")
+    parser.add_argument("mount", help="U 盘挂载点，例如 E:\\")
+    parser.add_argument("--size-mb", type=int, default=256, help="测试文件大小 (MiB)")
+    parser.add_argument("--seq-kb", type=int, default=1024, help="顺序测试块大小 (KiB)")
+    parser.add_argument("--rand-kb", type=int, default=4, help="随机测试块大小 (KiB)")
+    parser.add_argument("--qd", type=int, default=1, help="队列深度（并发线程数）")
+    parser.add_argument("--rand-sec", type=float, default=5.0, help="每项随机测试持续时间 (秒)")
+    parser.add_argument("--tests", default=",".join(BENCH_TESTS), help="要运行的测试项，逗号分隔")
+    parser.add_argument("--model", default=None, help="按该型号键 (VID:PID) 保存结果")
+    args = parser.parse_args()
+
+    device = None
+    if args.model and ":" in args.model:
+        vid, pid = args.model.split(":", 1)
+        device = {"vendor_id": vid, "product_id": pid}
+    report = run_benchmark(
+        args.mount,
+        file_size=args.size_mb * 1024 * 1024,
+        seq_block=args.seq_kb * 1024,
+        rand_block=args.rand_kb * 1024,
+        queue_depth=args.qd,
+        rand_sec=args.rand_sec,
+        tests=tuple(t.strip() for t in args.tests.split(",") if t.strip()),
+        device=device,
+    )
+    save_report(report)
+    for line in format_results(report.results):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,45 +4,80 @@ import re
 import subprocess
 import time
 import threading
-from typing import Any, Dict, List, Optional
-import pythoncom
-import win32com.client
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 _VID_PID_RE = re.compile(r"VID_([0-9A-Fa-f]{4}).*PID_([0-9A-Fa-f]{4})")
 _SERIAL_FROM_PNP_RE = re.compile(r"^USB\\[^\\]+\\([^\\]+)$", re.IGNORECASE)
-
-# 缓存配置
-_CACHE_TTL_SEC = 3.0
-_cache_at = 0.0
-_cache_only_storage: Optional[bool] = None
-_cache_devices: List[Dict[str, Any]] = []
+_USBSTOR_SERIAL_RE = re.compile(r"^USBSTOR\\[^\\]+\\([^\\&]+)(?:&\d+)?$", re.IGNORECASE)
 
 # 用于从描述中提取 USB 版本的正则
 _USB_VER_EXTRACT_RE = re.compile(r"(3\.[0-2]|2\.0)", re.IGNORECASE)
 
-
-def _run_pnputil_direct() -> str:
+# 定向查询：设备数不超过该值时逐个用 /instanceid 查询，而不是枚举全部设备
+_PNPUTIL_TARGETED_MAX = 16
+_PNPUTIL_TARGETED_WORKERS = 4
+_PNPUTIL_TARGETED_TIMEOUT_SEC = 5.0
+_pnputil_targeted_ok = True  # pnputil 明确报告不认识 /instanceid（旧版系统）后置为 False
+# pnputil 不支持某个开关时的输出；只有这种确定的失败才停用定向查询，超时等偶发失败下一轮照常重试
+_PNP_BAD_SWITCH_RE = re.compile(
+    r"(?:invalid|unknown|unrecognized)\s+(?:argument|parameter|switch|option|command)"
+    r"|(?:无效|未知|无法识别)的?\s*(?:参数|开关|选项|命令)",
+    re.IGNORECASE,
+)
+_ERROR_INVALID_PARAMETER = 87
+
+# 采集截止时间：WMI 与 pnputil 各自计时，超时的数据源被放弃
+_WMI_TIMEOUT_SEC = 8.0
+_PNPUTIL_TIMEOUT_SEC = 10.0
+# pnputil 属性不全的结果也缓存，但只保留这么久，避免 pnputil 卡住时每次都等到截止时间
+_PARTIAL_CACHE_TTL_SEC = 15.0
+
+# pnputil 输出解析用的正则，模块加载时编译一次
+_PNP_INSTANCE_ID_RE = re.compile(r"^\s*(?:实例|Instance)\s*ID\s*:\s*(.+)", re.IGNORECASE)
+_PNP_DESC_RE = re.compile(r"^\s*(?:设备描述|Device Description)\s*:\s*(.+)", re.IGNORECASE)
+_PNP_PROP_RE = re.compile(r"DEVPKEY_Device_(Address|BusNumber|BusReportedDeviceDesc)", re.IGNORECASE)
+_PNP_PROP_KIND = {"address": "addr", "busnumber": "bus", "busreporteddevicedesc": "bus_desc"}
+_PNP_HEX_VAL_RE = re.compile(r"(0x[0-9A-Fa-f]+)", re.IGNORECASE)
+_PNP_DEC_VAL_RE = re.compile(r"\((\d+)\)", re.IGNORECASE)
+
+
+def _iter_pnputil_lines(on_start: Optional[Callable[[subprocess.Popen], None]] = None) -> Iterator[str]:
     """
-    调用 pnputil 获取系统连接设备属性
+    启动 pnputil 获取系统连接设备属性，边输出边逐行产出，不等待进程结束。
+    调用方提前停止迭代（生成器被关闭）时结束 pnputil 进程；
+    on_start 收到进程对象，供其他线程在 pnputil 卡住时直接结束它。
     """
     try:
-        p = subprocess.run(
+        proc = subprocess.Popen(
             ["pnputil", "/enum-devices", "/connected", "/properties"],
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
             text=True,
-            errors="replace"
+            errors="replace",
+            bufsize=1,
         )
-        if p.returncode != 0:
-            return ""
-        return p.stdout or ""
     except Exception:
-        return ""
+        return
+    if on_start:
+        on_start(proc)
+    try:
+        yield from proc.stdout
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        proc.wait()
 
 
 def _get_wmi_usb_devices() -> List[Dict[str, Any]]:
     """
     通过 WMI 接口查询 USB 实体设备信息
     """
+    import pythoncom
+    import win32com.client
+
     pythoncom.CoInitialize()
     try:
         wmi = win32com.client.GetObject("winmgmts:")
@@ -112,45 +147,46 @@ def _extract_usb_version(text: str) -> Optional[str]:
     return m.group(1) if m else None
 
 
-def _get_pnputil_properties_map() -> Dict[str, Dict[str, Any]]:
+def _parse_pnputil_lines(
+        lines: Iterable[str],
+        wanted: Optional[Set[str]] = None,
+        on_device: Optional[Callable[[str, Dict[str, Any]], bool]] = None,
+) -> Dict[str, Dict[str, Any]]:
     """
-    解析 pnputil 输出，获取 Address, BusNumber 以及从描述中提取版本。
+    单遍解析 pnputil 输出，获取 Address, BusNumber 以及从描述中提取版本，逐设备增量建立索引。
+    wanted 为需要的实例 ID（已规范化）集合时只保留这些设备，并在它们全部解析完
+    （即最后一个设备的属性块结束）后立即停止读取。
+    on_device 在每个设备的属性块结束时以 (实例 ID, 属性) 调用，返回 True 表示停止读取。
     """
-    text = _run_pnputil_direct()
-    if not text.strip():
-        return {}
-
     idx: Dict[str, Dict[str, Any]] = {}
-
-    # 匹配行
-    re_inst_id = re.compile(r"^\s*(?:实例|Instance)\s*ID\s*:\s*(.+)", re.IGNORECASE)
-    re_desc_line = re.compile(r"^\s*(?:设备描述|Device Description)\s*:\s*(.+)", re.IGNORECASE)
-
-    # 属性名
-    re_prop_addr = re.compile(r"DEVPKEY_Device_Address", re.IGNORECASE)
-    re_prop_bus = re.compile(r"DEVPKEY_Device_BusNumber", re.IGNORECASE)
-    re_prop_bus_desc = re.compile(r"DEVPKEY_Device_BusReportedDeviceDesc", re.IGNORECASE)
-
-    re_hex_val = re.compile(r"(0x[0-9A-Fa-f]+)", re.IGNORECASE)
-    re_dec_val = re.compile(r"\((\d+)\)", re.IGNORECASE)
+    remaining = set(wanted) if wanted is not None else None
+    if remaining is not None and not remaining:
+        return idx
 
     cur_id_norm: Optional[str] = None
     cur_data: Dict[str, Any] = {}
     expecting = None  # "addr", "bus", "bus_desc"
 
-    lines = text.splitlines()
     for line in lines:
         line_stripped = line.strip()
         if not line_stripped:
             continue
 
         # 1. 检查实例 ID
-        m_id = re_inst_id.match(line_stripped)
+        m_id = _PNP_INSTANCE_ID_RE.match(line_stripped)
         if m_id:
             if cur_id_norm:
                 idx[cur_id_norm] = cur_data
-            raw_id = m_id.group(1).strip()
-            cur_id_norm = _norm_instance_id(raw_id)
+                if on_device and on_device(cur_id_norm, cur_data):
+                    return idx
+                if remaining is not None:
+                    remaining.discard(cur_id_norm)
+                    if not remaining:
+                        return idx
+            cur_id_norm = _norm_instance_id(m_id.group(1).strip())
+            if remaining is not None and cur_id_norm not in remaining:
+                # 不需要的设备，跳过它的整个属性块
+                cur_id_norm = None
             cur_data = {"address": None, "bus": None, "usb_version_bcd": None}
             expecting = None
             continue
@@ -159,7 +195,7 @@ def _get_pnputil_properties_map() -> Dict[str, Dict[str, Any]]:
             continue
 
         # 2. 检查基本的设备描述
-        m_desc = re_desc_line.match(line_stripped)
+        m_desc = _PNP_DESC_RE.match(line_stripped)
         if m_desc:
             ver = _extract_usb_version(m_desc.group(1))
             if ver: cur_data["usb_version_bcd"] = ver
@@ -173,11 +209,11 @@ def _get_pnputil_properties_map() -> Dict[str, Dict[str, Any]]:
                 if ver: cur_data["usb_version_bcd"] = ver
             else:
                 val = None
-                m_hex = re_hex_val.search(line_stripped)
+                m_hex = _PNP_HEX_VAL_RE.search(line_stripped)
                 if m_hex:
                     val = _coerce_int(m_hex.group(1))
                 else:
-                    m_dec = re_dec_val.search(line_stripped)
+                    m_dec = _PNP_DEC_VAL_RE.search(line_stripped)
                     if m_dec:
                         val = _coerce_int(m_dec.group(1))
                 if val is not None:
@@ -189,33 +225,166 @@ def _get_pnputil_properties_map() -> Dict[str, Dict[str, Any]]:
             continue
 
         # 4. 识别属性名
-        if re_prop_addr.search(line_stripped):
-            expecting = "addr"
-        elif re_prop_bus.search(line_stripped):
-            expecting = "bus"
-        elif re_prop_bus_desc.search(line_stripped):
-            expecting = "bus_desc"
+        m_prop = _PNP_PROP_RE.search(line_stripped)
+        if m_prop:
+            expecting = _PNP_PROP_KIND[m_prop.group(1).lower()]
 
     if cur_id_norm:
         idx[cur_id_norm] = cur_data
+        if on_device:
+            on_device(cur_id_norm, cur_data)
 
     return idx
 
 
-def list_usb_devices(only_storage: bool = True) -> List[Dict[str, Any]]:
-    global _cache_at, _cache_only_storage, _cache_devices
-    now = time.time()
-    if _cache_only_storage == only_storage and (now - _cache_at) < _CACHE_TTL_SEC:
-        return list(_cache_devices)
-
-    rows = _get_wmi_usb_devices()
-
-    pnputil_map = {}
+def _query_pnputil_instance(instance_id: str, timeout: float) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    只查询单个设备的属性，返回 (属性, pnputil 是否明确不支持该查询)；失败或超时时属性为 None
+    """
     try:
-        pnputil_map = _get_pnputil_properties_map()
+        p = subprocess.run(
+            ["pnputil", "/enum-devices", "/instanceid", instance_id, "/properties"],
+            capture_output=True,
+            text=True,
+            errors="replace",
+            timeout=timeout,
+        )
     except Exception:
-        pass
+        return None, False
+    if p.returncode != 0:
+        unsupported = p.returncode == _ERROR_INVALID_PARAMETER or bool(
+            _PNP_BAD_SWITCH_RE.search((p.stdout or "") + (p.stderr or ""))
+        )
+        return None, unsupported
+    key = _norm_instance_id(instance_id)
+    return _parse_pnputil_lines((p.stdout or "").splitlines(), {key}).get(key), False
+
+
+def _query_pnputil_targeted(wanted: Set[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    在有界线程池中逐个查询 wanted 中的设备，每次调用单独超时；返回查到的部分
+    """
+    global _pnputil_targeted_ok
+    idx: Dict[str, Dict[str, Any]] = {}
+    if not wanted:
+        return idx
+    unsupported = False
+    with ThreadPoolExecutor(max_workers=min(_PNPUTIL_TARGETED_WORKERS, len(wanted))) as pool:
+        futures = {pool.submit(_query_pnputil_instance, i, _PNPUTIL_TARGETED_TIMEOUT_SEC): i for i in wanted}
+        for fut, instance_id in futures.items():
+            info, bad_switch = fut.result()
+            unsupported = unsupported or bad_switch
+            if info is not None:
+                idx[instance_id] = info
+    if unsupported and not idx:
+        # 旧版 pnputil 不认识 /instanceid，之后直接走全量枚举
+        _pnputil_targeted_ok = False
+    return idx
+
+
+class _PnputilCollector:
+    """
+    在后台线程中全量枚举 pnputil，边解析边写入共享索引。
+    得知需要哪些设备（want）后，找齐即结束 pnputil；定向查询的结果也可以并入（merge）。
+    stop 直接结束 pnputil 进程，因此卡住的 pnputil 不会拖住调用方。
+    """
 
+    def __init__(self):
+        self.index: Dict[str, Dict[str, Any]] = {}
+        self.done = threading.Event()  # 全量枚举线程已退出
+        self._lock = threading.Lock()
+        self._wanted: Optional[Set[str]] = None
+        self._proc: Optional[subprocess.Popen] = None
+        self._stopped = False
+        threading.Thread(target=self._run, name="usb-pnputil", daemon=True).start()
+
+    def _run(self) -> None:
+        try:
+            lines = _iter_pnputil_lines(self._on_start)
+            try:
+                _parse_pnputil_lines(lines, on_device=self._on_device)
+            finally:
+                lines.close()
+        except Exception:
+            pass
+        finally:
+            self.done.set()
+
+    def _on_start(self, proc: subprocess.Popen) -> None:
+        with self._lock:
+            self._proc = proc
+            stopped = self._stopped
+        if stopped:
+            self._kill(proc)
+
+    def _on_device(self, key: str, data: Dict[str, Any]) -> bool:
+        with self._lock:
+            self.index[key] = data
+            return self._stopped or self._satisfied()
+
+    def _satisfied(self) -> bool:
+        return self._wanted is not None and self._wanted <= self.index.keys()
+
+    def want(self, wanted: Set[str]) -> bool:
+        """
+        设置需要的设备；已全部拿到时结束枚举并返回 True
+        """
+        with self._lock:
+            self._wanted = set(wanted)
+            satisfied = self._satisfied()
+        if satisfied:
+            self.stop()
+        return satisfied
+
+    def merge(self, found: Dict[str, Dict[str, Any]]) -> None:
+        with self._lock:
+            for key, data in found.items():
+                self.index.setdefault(key, data)
+            satisfied = self._satisfied()
+        if satisfied:
+            self.stop()
+
+    def satisfied(self) -> bool:
+        with self._lock:
+            return self._satisfied()
+
+    def has(self, keys: Set[str]) -> bool:
+        with self._lock:
+            return keys <= self.index.keys()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return dict(self.index)
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stopped = True
+            proc = self._proc
+        if proc is not None:
+            self._kill(proc)
+
+    @staticmethod
+    def _kill(proc: subprocess.Popen) -> None:
+        try:
+            if proc.poll() is None:
+                proc.kill()
+        except Exception:
+            pass
+
+
+def _wanted_instance_ids(rows: List[Dict[str, Any]], only_storage: bool) -> Set[str]:
+    return {
+        _norm_instance_id(r.get("PNPDeviceID"))
+        for r in rows
+        if r.get("PNPDeviceID") and (not only_storage or (r.get("Service") or "").upper() == "USBSTOR")
+    }
+
+
+def _build_devices(
+        rows: List[Dict[str, Any]],
+        pnputil_map: Dict[str, Dict[str, Any]],
+        only_storage: bool,
+) -> List[Dict[str, Any]]:
     devices: List[Dict[str, Any]] = []
     for r in rows:
         service = (r.get("Service") or "").upper()
@@ -257,8 +426,331 @@ def list_usb_devices(only_storage: bool = True) -> List[Dict[str, Any]]:
                 "service": r.get("Service"),
             }
         )
+    return devices
+
+
+def _wait_pnputil(pnp: _PnputilCollector, wanted: Set[str], deadline: float) -> bool:
+    """
+    等待 wanted 中各设备的 pnputil 属性：缺少的设备不多时另起定向查询，与全量枚举竞速。
+    找齐、两路都已结束或到达 deadline 即返回；返回属性是否完整
+    （两路都正常结束而仍缺少的设备视为 pnputil 中确实没有，结果依然完整）。
+    """
+    missing = wanted - pnp.snapshot().keys()
+    if not missing:
+        return True
+    targeted_done = threading.Event()
+    if _pnputil_targeted_ok and len(missing) <= _PNPUTIL_TARGETED_MAX:
+        def run_targeted() -> None:
+            try:
+                pnp.merge(_query_pnputil_targeted(missing))
+            finally:
+                targeted_done.set()
+
+        threading.Thread(target=run_targeted, name="usb-pnputil-targeted", daemon=True).start()
+    else:
+        targeted_done.set()
+
+    while time.monotonic() < deadline and not pnp.has(wanted):
+        if pnp.done.is_set() and targeted_done.is_set():
+            break
+        time.sleep(0.02)
+    return pnp.has(wanted) or (pnp.done.is_set() and targeted_done.is_set())
+
+
+def _collect_usb_devices(
+        only_storage: bool,
+        on_partial: Optional[Callable[[List[Dict[str, Any]]], None]],
+        wmi_timeout: float,
+        pnputil_timeout: float,
+        on_rest: Optional[Callable[[List[Dict[str, Any]], bool], None]] = None,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    collect_usb_devices 的实现，另外返回 pnputil 属性是否已全部拿到。
+    给出 on_rest 时先只等存储设备（数量少，可走定向查询）的属性，拿到即返回；
+    其余设备的属性在后台继续采集，结束后以 (完整设备列表, 属性是否齐全) 调用 on_rest。
+    返回值已经完整时不会调用 on_rest。
+    """
+    t0 = time.monotonic()
+    pnp = _PnputilCollector()
+
+    wmi_done = threading.Event()
+    wmi_rows: List[List[Dict[str, Any]]] = []
+
+    def run_wmi() -> None:
+        try:
+            wmi_rows.append(_get_wmi_usb_devices())
+        finally:
+            wmi_done.set()
+
+    threading.Thread(target=run_wmi, name="usb-wmi", daemon=True).start()
+    if not wmi_done.wait(wmi_timeout) or not wmi_rows:
+        pnp.stop()
+        raise TimeoutError(f"WMI 查询超过 {wmi_timeout:.0f} 秒未返回")
+    rows = wmi_rows[0]
+
+    wanted = _wanted_instance_ids(rows, only_storage)
+    first = _wanted_instance_ids(rows, True) if on_rest is not None else wanted
+    deadline = t0 + pnputil_timeout
+    complete = pnp.want(wanted)
+    if not complete:
+        if on_partial and not pnp.has(first):
+            on_partial(_build_devices(rows, pnp.snapshot(), only_storage))
+        complete = _wait_pnputil(pnp, first, deadline)
+        if on_rest is None or (complete and first == wanted):
+            pnp.stop()
+        else:
+            complete = False
+
+            def run_rest() -> None:
+                done = False
+                try:
+                    done = _wait_pnputil(pnp, wanted, deadline)
+                finally:
+                    pnp.stop()
+                    # 无论如何都要回调，缓存靠它结束“补齐中”状态
+                    on_rest(_build_devices(rows, pnp.snapshot(), only_storage), done)
+
+            threading.Thread(target=run_rest, name="usb-pnputil-rest", daemon=True).start()
+
+    return _build_devices(rows, pnp.snapshot(), only_storage), complete
+
+
+def collect_usb_devices(
+        only_storage: bool = True,
+        on_partial: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        wmi_timeout: float = _WMI_TIMEOUT_SEC,
+        pnputil_timeout: float = _PNPUTIL_TIMEOUT_SEC,
+) -> List[Dict[str, Any]]:
+    """
+    并发采集 USB 设备信息：WMI 查询与 pnputil 全量枚举同时启动，各有自己的截止时间。
+    - WMI 返回后，若 pnputil 尚未给出所需设备的属性，先以 on_partial 回调不含 bus/address 的部分结果，
+      并对缺少的设备发起定向查询，与全量枚举竞速；
+    - 所需属性找齐或到达 pnputil 截止时间（从开始计时）即结束，pnputil 进程被终止，返回合并后的结果。
+    整体耗时约为各数据源中较慢者，而不是两者之和；卡住的数据源不会阻塞结果。
+    WMI 超时时没有设备行可显示，抛出 TimeoutError。
+    """
+    devices, _ = _collect_usb_devices(only_storage, on_partial, wmi_timeout, pnputil_timeout)
+    return devices
+
+
+def _filter_devices(devices: List[Dict[str, Any]], only_storage: bool) -> List[Dict[str, Any]]:
+    if not only_storage:
+        return list(devices)
+    return [d for d in devices if (d.get("service") or "").upper() == "USBSTOR"]
+
+
+@dataclass
+class DeviceCacheStats:
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    refreshes: int = 0  # 实际完成的采集次数
+    last_refresh_sec: Optional[float] = None
+    total_refresh_sec: float = 0.0
+
+    @property
+    def avg_refresh_sec(self) -> Optional[float]:
+        return self.total_refresh_sec / self.refreshes if self.refreshes else None
+
+
+class DeviceCache:
+    """
+    线程安全的 USB 设备缓存：
+    - 只缓存一份完整的设备列表，"仅存储设备"等筛选在内存中完成，切换筛选不会重新采集；
+    - 由插拔事件（WmiDriveEventWatcher）调用 invalidate 失效，而不是按固定时间过期；
+      max_age_sec 可以额外设置一个兜底的过期时间，默认不过期；
+    - 多个线程同时未命中时只采集一次，其余线程等待并共享结果；
+    - 采集时先等存储设备的 pnputil 属性（可走定向查询），拿到即返回并缓存，其余设备的属性在后台补齐；
+      要全部设备的调用方等后台补齐后再返回；
+    - pnputil 卡住导致属性不全的结果也缓存，但只保留 partial_ttl_sec 秒；
+    - stats() 给出命中/未命中次数与采集耗时；
+    - on_refresh 在每次采集（以及后台补齐）完成后以 (完整设备列表, pnputil 属性是否齐全) 调用，用于持久化。
+    """
+
+    def __init__(
+            self,
+            max_age_sec: Optional[float] = None,
+            on_refresh: Optional[Callable[[List[Dict[str, Any]], bool], None]] = None,
+            partial_ttl_sec: float = _PARTIAL_CACHE_TTL_SEC,
+    ):
+        self.max_age_sec = max_age_sec
+        self.on_refresh = on_refresh
+        self.partial_ttl_sec = partial_ttl_sec
+        self._cond = threading.Condition()
+        self._devices: Optional[List[Dict[str, Any]]] = None
+        self._complete = False
+        self._at = 0.0
+        self._generation = 0
+        self._refreshing = False
+        self._filling = False  # 后台正在补齐非存储设备的属性
+        self._stats = DeviceCacheStats()
+
+    def _fresh(self) -> bool:
+        if self._devices is None:
+            return False
+        age = time.monotonic() - self._at
+        if not self._complete:
+            return age < self.partial_ttl_sec
+        return self.max_age_sec is None or age < self.max_age_sec
+
+    def _store(self, devices: List[Dict[str, Any]], complete: bool) -> None:
+        self._devices = devices
+        self._complete = complete
+        self._at = time.monotonic()
+
+    def _notify_refresh(self, devices: List[Dict[str, Any]], complete: bool) -> None:
+        if self.on_refresh:
+            try:
+                self.on_refresh(devices, complete)
+            except Exception:
+                pass
+
+    def get(
+            self,
+            only_storage: bool = True,
+            on_partial: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        返回设备列表（按 only_storage 筛选）；未命中时采集完整列表，on_partial 同 collect_usb_devices
+        """
+        with self._cond:
+            while True:
+                fresh = self._fresh()
+                if fresh and (only_storage or not self._filling):
+                    self._stats.hits += 1
+                    return _filter_devices(self._devices, only_storage)
+                # 只有手上有未过期的部分结果时才等后台补齐；结果已过期就重新采集
+                if not self._refreshing and not (self._filling and fresh):
+                    break
+                self._cond.wait(self.partial_ttl_sec)
+            self._stats.misses += 1
+            self._refreshing = True
+            generation = self._generation
+
+        def filtered_partial(devs: List[Dict[str, Any]]) -> None:
+            on_partial(_filter_devices(devs, only_storage))
+
+        partial_cb = filtered_partial if on_partial else None
+
+        rest: List[Tuple[List[Dict[str, Any]], bool]] = []
+
+        def on_rest(devs: List[Dict[str, Any]], done: bool) -> None:
+            with self._cond:
+                rest.append((devs, done))
+                if generation == self._generation:
+                    self._store(devs, done)
+                    self._filling = False
+                self._cond.notify_all()
+            self._notify_refresh(devs, done)
+
+        devices: Optional[List[Dict[str, Any]]] = None
+        complete = False
+        t0 = time.perf_counter()
+        try:
+            devices, complete = _collect_usb_devices(
+                False, partial_cb, _WMI_TIMEOUT_SEC, _PNPUTIL_TIMEOUT_SEC, on_rest=on_rest
+            )
+        finally:
+            elapsed = time.perf_counter() - t0
+            with self._cond:
+                self._refreshing = False
+                if devices is not None:
+                    self._stats.refreshes += 1
+                    self._stats.last_refresh_sec = elapsed
+                    self._stats.total_refresh_sec += elapsed
+                    # 采集期间发生了插拔则不缓存；后台补齐已先一步完成时保留它的结果
+                    if generation == self._generation and not rest:
+                        self._store(devices, complete)
+                        self._filling = not complete
+                self._cond.notify_all()
+        self._notify_refresh(devices, complete)
+        if only_storage or complete:
+            return _filter_devices(devices, only_storage)
+
+        # 要全部设备：先把存储设备已齐的结果作为部分结果，再等后台补齐
+        if partial_cb:
+            partial_cb(devices)
+        with self._cond:
+            self._cond.wait_for(
+                lambda: rest or not self._filling or generation != self._generation, _PNPUTIL_TIMEOUT_SEC
+            )
+            if rest:
+                devices = rest[0][0]
+        return _filter_devices(devices, only_storage)
+
+    def invalidate(self) -> None:
+        """
+        设备可能发生变化时调用（插拔事件、手动刷新）；可在任意线程中调用
+        """
+        with self._cond:
+            self._devices = None
+            self._filling = False
+            self._generation += 1
+            self._stats.invalidations += 1
+            self._cond.notify_all()
+
+    def stats(self) -> DeviceCacheStats:
+        with self._cond:
+            return replace(self._stats)
+
+
+# 模块级共享缓存，app 与 get_drive_usb_device 共用
+device_cache = DeviceCache()
+
+
+def list_usb_devices(
+        only_storage: bool = True,
+        on_partial: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    通过共享的 device_cache 获取设备列表；命中缓存时不会回调 on_partial
+    """
+    return device_cache.get(only_storage, on_partial)
+
+
+def _get_drive_disk_serial(drive_letter: str) -> Optional[str]:
+    """
+    通过 WMI 关联查询 盘符 -> 分区 -> 磁盘，从 USBSTOR 设备 ID 中取出序列号
+    """
+    import pythoncom
+    import win32com.client
+
+    pythoncom.CoInitialize()
+    try:
+        wmi = win32com.client.GetObject("winmgmts:")
+        parts = wmi.ExecQuery(
+            f"ASSOCIATORS OF {{Win32_LogicalDisk.DeviceID='{drive_letter}'}} "
+            "WHERE AssocClass=Win32_LogicalDiskToPartition"
+        )
+        for part in parts:
+            disks = wmi.ExecQuery(
+                f"ASSOCIATORS OF {{Win32_DiskPartition.DeviceID='{part.DeviceID}'}} "
+                "WHERE AssocClass=Win32_DiskDriveToDiskPartition"
+            )
+            for disk in disks:
+                # e.g. USBSTOR\DISK&VEN_SANDISK&PROD_ULTRA&REV_1.00\4C530001230915117461&0
+                m = _USBSTOR_SERIAL_RE.match(disk.PNPDeviceID or "")
+                if m:
+                    return m.group(1)
+        return None
+    except Exception:
+        return None
+    finally:
+        pythoncom.CoUninitialize()
 
-    _cache_at = now
-    _cache_only_storage = only_storage
-    _cache_devices = list(devices)
-    return devices
\ No newline at end of file
+
+def get_drive_usb_device(drive_letter: str) -> Optional[Dict[str, Any]]:
+    """
+    根据盘符（如 "G:"）找到对应的 USB 存储设备信息，找不到时返回 None
+    """
+    serial = _get_drive_disk_serial(drive_letter)
+    if not serial:
+        return None
+    try:
+        devices = list_usb_devices(only_storage=True)
+    except TimeoutError:
+        return None
+    for d in devices:
+        if (d.get("serial_number") or "").upper() == serial.upper():
+            return d
+    return None